@@ -1,3 +1,9 @@
-from . import bfalParser, bfInterpreter
+import importlib
 
-__all__ = [bfalParser, bfInterpreter]
\ No newline at end of file
+# the subpackages are imported on first access, so e.g. compiling never loads the interpreter (and NumPy)
+__all__ = ['bfalParser', 'bfInterpreter']
+
+
+def __getattr__(name):
+  if name in __all__: return importlib.import_module('.' + name, __name__)
+  raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,12 @@
+'''
+Benchmarks for pyfck
+
+The benchmark modules are run as scripts and therefore not imported here, e.g.
+  python -m pyfck.benchmarks.comparison
+
+Marius Lambacher, 2018
+'''
+
+from . import measure
+
+__all__ = [measure]
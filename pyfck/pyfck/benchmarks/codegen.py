@@ -0,0 +1,253 @@
+'''
+Benchmark of the quality of the generated code, per opcode and type
+
+Every type of every opcode in opcodes.OPCODE_TYPES is compiled for a sweep of register choices (REGISTER_SETS)
+and operand values: arguments which are read take every value in VALUES (given as value, or preset in the register),
+conditions (RC) every value in CONDITIONS, array indices every one in INDICES and texts every one in TEXTS.
+Each combination is compiled as a program of its own and run by measure.run on prepared memory;
+the length of the code, the executed steps and the extent (highest cell the head reaches) are recorded.
+  - control flow blocks are measured as a whole: 'IF / ENDIF' and 'LOOP / FALSE / ENDLOOP'
+  - POP is measured together with the PUSH filling the stack, commands on arrays with the declaration of the array
+  - ALIAS and ARRAY generate no code and are not measured
+
+The results are printed as a table per opcode and type (number of combinations, maximum length, mean and maximum steps,
+maximum extent), written as JSON and compared with a baseline per combination: as the results are deterministic,
+every increase beyond the tolerance is flagged, e.g. a comparison whose steps grow with the square of the operands.
+The baseline stored next to this module (BASELINE) is updated with --save-baseline.
+
+  python -m pyfck.benchmarks.codegen [--opcodes ADD MUL] [--output results.json] [--save-baseline]
+
+Marius Lambacher, 2018
+'''
+
+import argparse
+import collections
+import itertools
+import json
+import os
+
+from ..bfalParser import Parser
+from ..bfalParser import memoryLayout
+from ..bfalParser import opcodes
+from ..bfalParser.errors import *
+from . import measure
+
+
+REGISTER_SETS = (('R0', 'R1', 'R2', 'R3'), ('R3', 'R2', 'R1', 'R0'))
+VALUES = (0, 1, 7, 100, 255)
+CONDITIONS = (0, 1)
+TEXTS = ('"A"', '"Hello"', '"Hello, World!"')
+
+###  array used by the commands on arrays, its indices and the argument which is the index (opcode -> position)
+ARRAY = 'A'
+ARRAY_SIZE = 16
+INDICES = (0, 5, 15)
+INDEX_ARGUMENTS = {opcodes.OPCODES.LOAD: 2, opcodes.OPCODES.STORE: 1}
+
+###  lines following a control flow command, closing its block (opcode -> lines)
+BLOCKS = {opcodes.OPCODES.IF: ['ENDIF'], opcodes.OPCODES.LOOP: ['FALSE', 'ENDLOOP']}
+
+###  opcodes generating no code
+NO_CODE = (opcodes.OPCODES.ALIAS, opcodes.OPCODES.ARRAY)
+
+###  maximum number of steps of a combination; combinations which do not terminate are recorded without steps
+MAX_STEPS = 10**6
+
+###  stored baseline and the relative increase tolerated by compare
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'codegen.baseline.json')
+TOLERANCE = 0.0
+
+METRICS = ('length', 'steps', 'extent')
+
+IDENTIFIERS = {opcode: identifier for identifier, opcode in opcodes.OPCODE_IDENTIFIERS.items()}
+
+
+Combination = collections.namedtuple('Combination', ('opcode', 'cmdType', 'lines', 'registers', 'inputs'))
+
+
+
+def combinations(opcode, cmdType):
+  '''
+  :param opcode: opcode
+  :param cmdType: one of its types
+  :return: generator of the combinations (Combination) of the type: lines of the program,
+           preset values of the registers (register -> value) and the input
+  '''
+
+  cmdClass = opcodes.OPCODE_TYPES[opcode][0]
+  if cmdClass == opcodes.OPCODE_CLASSES.CONTROLFLOW_END or opcode in NO_CODE: return
+
+  destinations = (opcode in opcodes.DESTINATION_VALUES) + (opcode in opcodes.SECOND_DESTINATION_VALUES)
+  if opcode in opcodes.SELF_REFERENCING: destinations = 0
+  conditions = CONDITIONS if opcode == opcodes.OPCODES.NOT or cmdClass == opcodes.OPCODE_CLASSES.CONTROLFLOW_START else (None,)
+  extras = VALUES if opcode in (opcodes.OPCODES.POP, opcodes.OPCODES.INPUT) else (None,)          # value pushed before / read
+  declare = ['ARRAY {} {}'.format(ARRAY, ARRAY_SIZE)] if 'T' in cmdType and opcode != opcodes.OPCODES.PRINT else []
+
+  for registers in REGISTER_SETS if 'R' in cmdType else REGISTER_SETS[:1]:
+    choices = []            # per argument: list of (argument, preset registers)
+    free = iter(registers)
+    for i, t in enumerate(cmdType):
+      values = INDICES if INDEX_ARGUMENTS.get(opcode) == i else VALUES
+      if t == 'R':
+        register = next(free)
+        if i < destinations: choices.append([(register, ())])
+        else: choices.append([(register, ((register, v),)) for v in values])
+
+      elif t == 'V': choices.append([(str(v), ()) for v in values])
+      elif opcode == opcodes.OPCODES.PRINT: choices.append([(text, ()) for text in TEXTS])
+      else: choices.append([(ARRAY, ())])
+
+    for args, condition, extra in itertools.product(itertools.product(*choices), conditions, extras):
+      lines = declare + (['PUSH {}'.format(extra)] if opcode == opcodes.OPCODES.POP else [])
+      lines += [' '.join([IDENTIFIERS[opcode]] + [arg for arg, preset in args])] + BLOCKS.get(opcode, [])
+
+      preset = tuple(p for arg, ps in args for p in ps) + ((('RC', condition),) if condition is not None else ())
+      inputs = bytes([extra]) if opcode == opcodes.OPCODES.INPUT else b''
+      yield Combination(opcode, cmdType, lines, preset, inputs)
+
+
+def name(combination):
+  '''
+  :param combination: Combination
+  :return: unique name of the combination, e.g. 'ADD R0 R1 7 | R1=100'
+  '''
+
+  res = ' / '.join(combination.lines)
+  if combination.registers: res += ' | ' + ' '.join('{}={}'.format(r, v) for r, v in combination.registers)
+  if combination.inputs: res += ' | input {}'.format(combination.inputs[0])
+  return res
+
+
+def measureCombination(combination):
+  '''
+  Compiles and runs a combination
+
+  :param combination: Combination
+  :return: dict with the length of the code, the executed steps (None if it did not terminate within MAX_STEPS) and the extent
+  '''
+
+  parser = Parser()
+  bf = parser.compile('\n'.join(combination.lines), initConstants=False)
+
+  cells = parser.PROGRAM_CELLS
+  memory = {cells.index(cell): val for cell, val in memoryLayout.CONSTANTS + combination.registers}
+  try: m = measure.run(bf, memory, combination.inputs, memorySize=len(cells), maxSteps=MAX_STEPS)
+  except ProfileError: return {'length': len(bf), 'steps': None, 'extent': None}
+
+  return {'length': len(bf), 'steps': m.steps, 'extent': m.extent}
+
+
+
+def benchmark(selected=None):
+  '''
+  :param selected: identifiers of the opcodes to measure, all if None
+  :return: dict name of the combination -> dict with the opcode identifier, the type and the measurements (see measureCombination)
+  '''
+
+  results = collections.OrderedDict()
+  for opcode, (cmdClass, types) in opcodes.OPCODE_TYPES.items():
+    if selected is not None and IDENTIFIERS[opcode] not in selected: continue
+
+    for cmdType in types:
+      for combination in combinations(opcode, cmdType):
+        result = {'opcode': IDENTIFIERS[opcode], 'type': cmdType}
+        result.update(measureCombination(combination))
+        results[name(combination)] = result
+
+  return results
+
+
+def summary(results):
+  '''
+  :param results: results, as returned by benchmark
+  :return: list of rows per opcode and type: (opcode, type, combinations, max length, mean steps, max steps, max extent)
+  '''
+
+  groups = collections.OrderedDict()
+  for r in results.values(): groups.setdefault((r['opcode'], r['type']), []).append(r)
+
+  rows = []
+  for (opcode, cmdType), rs in groups.items():
+    steps = [r['steps'] for r in rs if r['steps'] is not None]
+    rows.append((opcode, cmdType, len(rs), max(r['length'] for r in rs), sum(steps) / len(steps) if steps else None,
+                 max(steps, default=None), max((r['extent'] for r in rs if r['extent'] is not None), default=None)))
+
+  return rows
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+  '''
+  Compares results with a baseline; combinations missing in either are not compared
+
+  :param results: results, as returned by benchmark
+  :param baseline: earlier results
+  :param tolerance: tolerated relative increase
+  :return: list of regressions: (name of the combination, list of descriptions)
+  '''
+
+  regressions = []
+  for key, r in results.items():
+    b = baseline.get(key)
+    if b is None: continue
+
+    problems = []
+    for metric in METRICS:
+      if r[metric] is None and b[metric] is not None: problems.append('{} {} -> did not terminate'.format(metric, b[metric]))
+      elif None not in (r[metric], b[metric]) and r[metric] > b[metric] * (1 + tolerance):
+        problems.append('{} {} -> {}'.format(metric, b[metric], r[metric]))
+
+    if problems: regressions.append((key, problems))
+
+  return regressions
+
+
+def save(results, path, fields=None):
+  '''
+  Writes results as JSON, one combination per line
+
+  :param results: results, as returned by benchmark
+  :param path: file to write
+  :param fields: fields of the results to write, all if None
+  '''
+
+  with open(path, 'w') as f:
+    f.write('{\n')
+    f.write(',\n'.join('{}: {}'.format(json.dumps(key), json.dumps({k: v for k, v in r.items() if fields is None or k in fields}, sort_keys=True))
+                        for key, r in results.items()))
+    f.write('\n}\n')
+
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description='Benchmark of the generated code per opcode and type')
+  ap.add_argument('--opcodes', nargs='+', type=str.upper, help='identifiers of the opcodes to measure (default: all)')
+  ap.add_argument('--output', help='file to write the results to (JSON)')
+  ap.add_argument('--baseline', default=BASELINE, help='file with earlier results to compare with (default: %(default)s)')
+  ap.add_argument('--save-baseline', dest='saveBaseline', action='store_true', help='write the results to the baseline file instead of comparing')
+  ap.add_argument('--tolerance', type=float, default=TOLERANCE, help='tolerated relative increase (default: %(default)s)')
+  args = ap.parse_args(argv)
+
+  results = benchmark(args.opcodes)
+
+  print('{:<8}{:<6}{:>8}{:>10}{:>12}{:>12}{:>8}'.format('opcode', 'type', 'count', 'length', 'mean steps', 'max steps', 'extent'))
+  for opcode, cmdType, n, length, meanSteps, maxSteps, extent in summary(results):
+    print('{:<8}{:<6}{:>8}{:>10}{:>12}{:>12}{:>8}'.format(
+      opcode, cmdType or '-', n, length, '{:.1f}'.format(meanSteps) if meanSteps is not None else '-',
+      maxSteps if maxSteps is not None else '-', extent if extent is not None else '-'))
+
+  if args.output: save(results, args.output)
+  if args.saveBaseline:
+    save(results, args.baseline, METRICS)
+    return 0
+
+  if not os.path.exists(args.baseline):
+    print('No baseline at {}'.format(args.baseline))
+    return 0
+
+  with open(args.baseline) as f: regressions = compare(results, json.load(f), args.tolerance)
+  for key, problems in regressions: print('REGRESSION {}: {}'.format(key, ', '.join(problems)))
+  return 1 if regressions else 0
+
+
+
+if __name__ == '__main__': raise SystemExit(main())
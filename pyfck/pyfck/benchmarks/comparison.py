@@ -0,0 +1,102 @@
+'''
+Benchmark of the comparison macros (GT, GE, LT and LE)
+
+For every mode and type, the comparison is compiled once and run for all pairs of operands in VALUES;
+the code size and the mean and maximum number of steps are reported for the comparison used by the parser
+(MacroContext.comparison) and for the counting comparison (MacroContext.comparisonCounting) it replaced.
+Every result is checked (the flag in RC, the operands have to be restored and CB and CA cleared); the counting comparison gives wrong results for some operands (e.g. 0 > 255), they are counted as errors.
+
+  python -m pyfck.benchmarks.comparison
+
+Marius Lambacher, 2018
+'''
+
+import operator
+
+from ..bfalParser import macros
+from ..bfalParser import memoryLayout
+from . import measure
+
+
+MODES = {'GT': operator.gt, 'GE': operator.ge, 'LT': operator.lt, 'LE': operator.le}
+TYPES = ('RR', 'RV')
+VALUES = (0, 1, 2, 3, 7, 15, 31, 63, 64, 100, 127, 128, 129, 200, 254, 255)
+
+IMPLEMENTATIONS = ('comparison', 'comparisonCounting')
+
+
+
+def compileComparison(implementation, compType, mode, b=None):
+  '''
+  Compiles a comparison of R0 with R1 (type 'RR') or with the value b (type 'RV')
+
+  :param implementation: name of the MacroContext method
+  :param compType: 'RR' or 'RV'
+  :param mode: one of MODES
+  :param b: value for the type 'RV'
+  :return: brainfuck code
+  '''
+
+  with macros.MacroContext() as mc:
+    return getattr(mc, implementation)(compType, 'R0', 'R1' if compType == 'RR' else b, mode)
+
+
+
+def measureComparison(implementation, compType, mode, values=VALUES):
+  '''
+  Runs a comparison for all pairs of values and checks the results
+
+  :param implementation: name of the MacroContext method
+  :param compType: 'RR' or 'RV'
+  :param mode: one of MODES
+  :param values: operands
+  :return: dict with the code size, the mean and maximum number of steps and the number of wrong results (or clobbered cells)
+  '''
+
+  layout = memoryLayout.getLayout()
+  memory = {layout.index(cell): val for cell, val in memoryLayout.CONSTANTS}
+
+  sizes = []
+  steps = []
+  errors = 0
+  for b in values:
+    bf = compileComparison(implementation, compType, mode, b)
+    sizes.append(len(bf))
+
+    for a in values:
+      memory[layout.index('R0')] = a
+      memory[layout.index('R1')] = b
+      m = measure.run(bf, memory, memorySize=len(layout.cells))
+
+      registers = [m.memory[layout.index(cell)] for cell in ('RC', 'R0', 'R1', 'CB', 'CA')]
+      if registers != [MODES[mode](a, b), a, b, 0, 0]: errors += 1
+      steps.append(m.steps)
+
+  return {'size': max(sizes), 'meanSteps': sum(steps) / len(steps), 'maxSteps': max(steps), 'errors': errors}
+
+
+
+def benchmark(values=VALUES):
+  '''
+  :param values: operands
+  :return: dict (implementation, mode, type) -> measurement, see measureComparison
+  '''
+
+  return {(impl, mode, t): measureComparison(impl, t, mode, values) for impl in IMPLEMENTATIONS for mode in MODES for t in TYPES}
+
+
+
+def main():
+  results = benchmark()
+  print('{:<8}{:>8}{:>12}{:>12}{:>8}{:>10}'.format('', 'size', 'mean steps', 'max steps', 'errors', 'speedup'))
+  for mode in MODES:
+    for t in TYPES:
+      new = results[(IMPLEMENTATIONS[0], mode, t)]
+      old = results[(IMPLEMENTATIONS[1], mode, t)]
+      row = '{:<8}{:>8}{:>12.1f}{:>12}{:>8}'
+      print((row + '{:>10.1f}').format(mode + ' ' + t, new['size'], new['meanSteps'], new['maxSteps'], new['errors'], old['meanSteps'] / new['meanSteps']))
+      print(row.format('  old', old['size'], old['meanSteps'], old['maxSteps'], old['errors']))
+
+
+
+if __name__ == '__main__': main()
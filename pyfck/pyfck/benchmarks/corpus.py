@@ -0,0 +1,190 @@
+'''
+Corpus of programs for the interpreter benchmarks (see throughput)
+
+Each program is given as brainfuck or as BFAL, which is compiled for the cell width benchmarked,
+together with its expected output; none of them reads input.
+  - hello     the classic 'Hello World!' (from the esolangs.org wiki)
+  - squares   prints the squares from 0 to 10000 (by Daniel B. Cristofani), loop heavy
+  - numbers   BFAL: prints 0 to 119 in decimal, exercising DIVMOD and the comparisons
+  - sieve     BFAL: sieve of Eratosthenes for the primes below 60, on an array
+  - hanoi     BFAL: towers of Hanoi with 4 discs, recursion emulated with PUSH and POP
+  - sort      BFAL: bubble sort of 12 letters in an array, exercising GT, LOAD and STORE
+
+Marius Lambacher, 2018
+'''
+
+import collections
+
+
+Program = collections.namedtuple('Program', ('language', 'source', 'output'))
+
+BF = 'bf'
+BFAL = 'bfal'
+
+
+HELLO = '++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<.+++.------.--------.>>+.>++.'
+
+SQUARES = (
+  '++++[>+++++<-]>[<+++++>-]+<+[>[>+>+<<-]++>>[<<+>>-]>>>[-]++>[-]+>>>+[[-]++++++>>>]<<<[[<++++++++<++>>-]+<.<[>----<-]<]<<'
+  '[>>>>>[>>>[-]+++++++++<[>-<-]+++++++++>[-[<->-]+[<<<]]<[>+<-]>]<<-]<<-]'
+)
+
+NUMBERS = '''
+SET R0 0
+TRUE
+LOOP
+  DIVMOD R2 R3 R0 10
+  DIVMOD R1 R2 R2 10
+  NZ R1
+  IF
+    INC R1 48
+    OUT R1
+  ENDIF
+  GT R0 9
+  IF
+    INC R2 48
+    OUT R2
+  ENDIF
+  INC R3 48
+  OUT R3
+  PRT " "
+  INC R0
+  LT R0 120
+ENDLOOP
+'''
+
+SIEVE = '''
+ARRAY S 60
+SET R0 2
+LT R0 60
+LOOP
+  LOAD R1 S R0
+  ZR R1
+  IF
+    DIVMOD R2 R3 R0 10
+    NZ R2
+    IF
+      INC R2 48
+      OUT R2
+    ENDIF
+    INC R3 48
+    OUT R3
+    PRT " "
+    ADD R4 R0 R0
+    LT R4 60
+    LOOP
+      STORE S R4 1
+      ADD R4 R4 R0
+      LT R4 60
+    ENDLOOP
+  ENDIF
+  INC R0
+  LT R0 60
+ENDLOOP
+'''
+
+HANOI = '''
+SET R7 1
+PUSH 4
+PUSH 1
+PUSH 3
+PUSH 2
+NZ R7
+LOOP
+  POP R3
+  POP R2
+  POP R1
+  POP R0
+  DEC R7
+  EQ R0 1
+  IF
+    ADD R4 R1 48
+    OUT R4
+    PRT ">"
+    ADD R4 R2 48
+    OUT R4
+    PRT " "
+  ENDIF
+  NE R0 1
+  IF
+    DEC R0
+    PUSH R0
+    PUSH R3
+    PUSH R2
+    PUSH R1
+    PUSH 1
+    PUSH R1
+    PUSH R2
+    PUSH R3
+    PUSH R0
+    PUSH R1
+    PUSH R3
+    PUSH R2
+    INC R7 3
+  ENDIF
+  NZ R7
+ENDLOOP
+'''
+
+SORT = '''
+ARRAY A 12
+STORE A 0 80
+STORE A 1 89
+STORE A 2 70
+STORE A 3 67
+STORE A 4 75
+STORE A 5 66
+STORE A 6 69
+STORE A 7 78
+STORE A 8 67
+STORE A 9 72
+STORE A 10 77
+STORE A 11 65
+SET R0 11
+NZ R0
+LOOP
+  SET R1 0
+  LT R1 R0
+  LOOP
+    LOAD R2 A R1
+    ADD R3 R1 1
+    LOAD R4 A R3
+    GT R2 R4
+    IF
+      STORE A R1 R4
+      STORE A R3 R2
+    ENDIF
+    INC R1
+    LT R1 R0
+  ENDLOOP
+  DEC R0
+  NZ R0
+ENDLOOP
+SET R1 0
+LT R1 12
+LOOP
+  LOAD R2 A R1
+  OUT R2
+  INC R1
+  LT R1 12
+ENDLOOP
+'''
+
+
+
+def _hanoi(n, a, b, c):
+  """Moves of the towers of Hanoi, as printed by HANOI"""
+
+  if n == 0: return []
+  return _hanoi(n - 1, a, c, b) + ['{}>{} '.format(a, b)] + _hanoi(n - 1, c, b, a)
+
+
+
+PROGRAMS = collections.OrderedDict((
+  ('hello', Program(BF, HELLO, b'Hello World!\n')),
+  ('squares', Program(BF, SQUARES, ''.join('{}\n'.format(i * i) for i in range(101)).encode())),
+  ('numbers', Program(BFAL, NUMBERS, ''.join('{} '.format(i) for i in range(120)).encode())),
+  ('sieve', Program(BFAL, SIEVE, ''.join('{} '.format(i) for i in range(2, 60) if all(i % d for d in range(2, i))).encode())),
+  ('hanoi', Program(BFAL, HANOI, ''.join(_hanoi(4, 1, 3, 2)).encode())),
+  ('sort', Program(BFAL, SORT, bytes(sorted(b'PYFCKBENCHMA')))),
+))
@@ -0,0 +1,88 @@
+'''
+Measuring brainfuck programs for the benchmarks
+
+run() executes a program and counts the executed commands (steps); unlike the Interpreter,
+it can start on prepared memory, stops after a maximum number of steps and keeps track of the cells used.
+
+Marius Lambacher, 2018
+'''
+
+import collections
+
+from ..bfalParser import memoryLayout
+from ..bfalParser.errors import *
+
+
+Measurement = collections.namedtuple('Measurement', ('steps', 'memory', 'output', 'extent'))
+
+
+def run(bf, memory=None, inputs=b'', memorySize=30000, maxSteps=10**8, cellBits=None):
+  '''
+  Runs a brainfuck program and counts its steps, every executed command being one step.
+  Runs of moves and increments are executed at once, but counted per command.
+
+  :param bf: brainfuck code (or interpreter commands, see ir.lower())
+  :param memory: initial memory, mapping position -> value
+  :param inputs: input of the program (bytes); after the end, reading yields 0
+  :param memorySize: number of cells
+  :param maxSteps: maximum number of steps
+  :param cellBits: width of the cells in bits, memoryLayout.CELL_BITS if None
+  :return: Measurement: steps, memory (list), output, extent (highest position the head was at);
+           the output is bytes for 8-bit cells and a tuple of ints for wider ones
+  '''
+
+  ops = []                # [command, argument, number of commands]
+  stack = []
+  for c in bf:
+    if c in '<>+-':
+      kind = '>' if c in '<>' else '+'
+      d = 1 if c in '>+' else -1
+      if ops and ops[-1][0] == kind:
+        ops[-1][1] += d
+        ops[-1][2] += 1
+
+      else: ops.append([kind, d, 1])
+
+    elif c == '[':
+      stack.append(len(ops))
+      ops.append(['[', None, 1])
+
+    elif c == ']':
+      if not stack: raise ProfileError('Too many ]\'s')
+      start = stack.pop()
+      ops[start][1] = len(ops) + 1
+      ops.append([']', start + 1, 1])
+
+    elif c in '0.,': ops.append([c, None, 1])
+
+  if stack: raise ProfileError('Too many [\'s')
+
+  cellSize = 1 << (memoryLayout.CELL_BITS if cellBits is None else cellBits)
+  cells = [0] * memorySize
+  for pos, val in (memory or {}).items(): cells[pos] = val % cellSize
+
+  inputs = iter(inputs)
+  output = []
+  ptr = extent = steps = i = 0
+  while i < len(ops):
+    kind, arg, n = ops[i]
+    i += 1
+    steps += n
+    if steps > maxSteps: raise ProfileError('Program did not terminate within {} steps'.format(maxSteps))
+
+    if kind == '>':
+      ptr += arg
+      if ptr > extent: extent = ptr
+
+    elif kind == '+': cells[ptr] = (cells[ptr] + arg) % cellSize
+    elif kind == '0': cells[ptr] = 0
+    elif kind == '[':
+      if not cells[ptr]: i = arg
+
+    elif kind == ']':
+      if cells[ptr]: i = arg
+
+    elif kind == '.': output.append(cells[ptr])
+    elif kind == ',': cells[ptr] = next(inputs, 0)
+
+  return Measurement(steps, cells, bytes(output) if cellSize <= 256 else tuple(output), extent)
@@ -0,0 +1,117 @@
+'''
+Benchmark of the parallel compilation (Parser.compileParallel)
+
+A large program is generated from a mix of commands (COMMANDS; see program) and compiled serially and with every number
+of worker processes in WORKERS. For each run, the best wall time of a number of repetitions and the speedup over the serial
+compilation are recorded; the code has to be identical to the serial one.
+The speedup is bounded by the processors of the machine (os.cpu_count) and by the parts compiled serially:
+preprocessing, the scan for the segments (see Parser.splitSegments) and joining the optimised segments (see peephole.join).
+
+  python -m pyfck.benchmarks.parallel [--lines 50000] [--workers 2 4 8] [--output results.json]
+
+Marius Lambacher, 2018
+'''
+
+import argparse
+import json
+import os
+import random
+import time
+
+from ..bfalParser import Parser
+
+
+###  commands of the generated programs; {} are replaced by register numbers
+COMMANDS = ('SET R{} 17', 'INC R{} 3', 'STZ R{}', 'SET R{} R{}', 'ADD R{} R{} 3', 'MUL R{} R{} R{}', 'DIV R{} R{} 7', 'EQ R{} 5',
+            'GT R{} R{}', 'OUT R{}', 'PRT "hi"', 'PUSH R{}', 'POP R{}', 'NZ R{}\nIF\nINC R{}\nENDIF', 'NZ R{}\nLOOP\nDEC R{}\nNZ R{}\nENDLOOP')
+
+REGISTERS = 4
+LINES = 50000
+WORKERS = (2, 4, 8)
+
+
+
+def program(lines=LINES, seed=0):
+  '''
+  :param lines: number of commands
+  :param seed: seed of the random choice of the commands
+  :return: BFAL program of randomly chosen commands
+  '''
+
+  rnd = random.Random(seed)
+  res = []
+  for i in range(lines):
+    cmd = rnd.choice(COMMANDS)
+    res.append(cmd.format(*(rnd.randrange(REGISTERS) for j in range(cmd.count('{}')))))
+
+  return '\n'.join(res)
+
+
+def measureCompile(bfal, workers=None, repeat=3, minLines=None):
+  '''
+  Compiles a program repeatedly
+
+  :param bfal: BFAL program
+  :param workers: number of worker processes (see Parser.workers), None to compile serially
+  :param repeat: number of compilations; the fastest one counts
+  :param minLines: parallelMinLines of the parser, its default if None
+  :return: (brainfuck code, best wall time in seconds)
+  '''
+
+  seconds = []
+  for i in range(repeat):
+    parser = Parser()
+    parser.workers = workers
+    if minLines is not None: parser.parallelMinLines = minLines
+    start = time.perf_counter()
+    bf = parser.compile(bfal)
+    seconds.append(time.perf_counter() - start)
+
+  return bf, min(seconds)
+
+
+
+def benchmark(lines=LINES, workers=WORKERS, repeat=3, minLines=None):
+  '''
+  :param lines: number of commands of the program
+  :param workers: numbers of worker processes to compare with the serial compilation
+  :param repeat: number of compilations of each run (see measureCompile)
+  :param minLines: parallelMinLines of the parsers, the default if None
+  :return: list of results, each a dict with the number of workers (None: serial), best wall time, speedup and whether the code was identical
+  '''
+
+  bfal = program(lines)
+  serial, serialSeconds = measureCompile(bfal, None, repeat)
+  results = [{'workers': None, 'seconds': serialSeconds, 'speedup': 1.0, 'identical': True}]
+
+  for n in workers:
+    bf, seconds = measureCompile(bfal, n, repeat, minLines)
+    results.append({'workers': n, 'seconds': seconds, 'speedup': serialSeconds / seconds, 'identical': bf == serial})
+
+  return results
+
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description='Benchmark of the parallel compilation')
+  ap.add_argument('--lines', type=int, default=LINES, help='commands of the generated program (default: %(default)s)')
+  ap.add_argument('--workers', nargs='+', type=int, default=WORKERS, help='numbers of worker processes (default: %(default)s)')
+  ap.add_argument('--repeat', type=int, default=3, help='compilations of each run, the fastest one counts (default: %(default)s)')
+  ap.add_argument('--output', help='file to write the results to (JSON)')
+  args = ap.parse_args(argv)
+
+  print('{} lines, {} processors'.format(args.lines, os.cpu_count()))
+  results = benchmark(args.lines, args.workers, args.repeat)
+
+  print('{:<10}{:>10}{:>10}{:>8}'.format('workers', 'seconds', 'speedup', 'code'))
+  for r in results:
+    print('{:<10}{:>10.3f}{:>10.2f}{:>8}'.format(r['workers'] or 'serial', r['seconds'], r['speedup'], 'ok' if r['identical'] else 'WRONG'))
+
+  if args.output:
+    with open(args.output, 'w') as f: json.dump(results, f, indent=1)
+
+  return 0 if all(r['identical'] for r in results) else 1
+
+
+
+if __name__ == '__main__': raise SystemExit(main())
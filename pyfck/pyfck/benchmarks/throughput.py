@@ -0,0 +1,217 @@
+'''
+Benchmark of the interpreters' throughput
+
+Every program of the corpus (see corpus) is run by every engine, for every cell width in CELL_BITS;
+BFAL programs are compiled for that width first (not measured). The output is checked against the expected one.
+For each run, the number of executed commands (steps, counted by measure.run), the best wall time of a number of repetitions,
+the steps per second and the peak of the memory allocated while running (tracemalloc) are recorded.
+  - interpreter   the Interpreter of bfInterpreter
+  - measure       measure.run, the interpreter of the benchmarks, which executes runs of moves and increments at once
+
+The results are written as JSON and compared with a baseline (results of an earlier run, e.g. stored with --save-baseline):
+runs which got slower or use more memory than the tolerance allows, or execute a different number of steps, are flagged.
+Timings depend on the machine, so the baseline should be recorded on the same one.
+
+  python -m pyfck.benchmarks.throughput [--programs hello squares] [--output results.json] [--baseline baseline.json]
+
+Marius Lambacher, 2018
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+
+from ..bfalParser import Parser
+from ..bfInterpreter import Interpreter
+from . import corpus
+from . import measure
+
+
+CELL_BITS = (8, 16, 32)
+
+###  relative change of the steps per second and the peak memory tolerated by compare
+TOLERANCE = 0.1
+
+
+
+def runInterpreter(bf, cellBits):
+  '''
+  Runs brainfuck code with the Interpreter
+
+  :param bf: brainfuck code
+  :param cellBits: width of the cells in bits
+  :return: output, bytes for 8-bit cells and a tuple of ints for wider ones (see measure.run)
+  '''
+
+  interpreter = Interpreter(cellBits=cellBits)
+  interpreter.load(bf)
+  with contextlib.redirect_stdout(io.StringIO()) as out: interpreter.run()
+  output = tuple(map(ord, out.getvalue()))
+  return bytes(output) if cellBits <= 8 else output
+
+
+def runMeasure(bf, cellBits):
+  '''
+  Runs brainfuck code with measure.run
+
+  :param bf: brainfuck code
+  :param cellBits: width of the cells in bits
+  :return: output, bytes for 8-bit cells and a tuple of ints for wider ones (see measure.run)
+  '''
+
+  return measure.run(bf, cellBits=cellBits, maxSteps=float('inf')).output
+
+
+###  engines: name -> function running brainfuck code (bf, cell width) and returning its output
+ENGINES = {'interpreter': runInterpreter, 'measure': runMeasure}
+
+
+
+def programCode(program, cellBits):
+  '''
+  :param program: corpus.Program
+  :param cellBits: width of the cells in bits
+  :return: brainfuck code of the program
+  '''
+
+  if program.language == corpus.BF: return program.source
+
+  parser = Parser()
+  parser.cellBits = cellBits
+  return parser.compile(program.source)
+
+
+def measureRun(engine, bf, cellBits, output, repeat=3, memory=True):
+  '''
+  Runs brainfuck code repeatedly and measures the runs; the peak memory is measured by an additional run,
+  as tracing the allocations slows the engines down
+
+  :param engine: name of the engine (see ENGINES)
+  :param bf: brainfuck code
+  :param cellBits: width of the cells in bits
+  :param output: expected output (bytes or a sequence of ints)
+  :param repeat: number of timed runs; the fastest one counts
+  :param memory: if False, the peak memory is not measured (None)
+  :return: dict with the best wall time in seconds, the peak memory in bytes and whether the output was correct
+  '''
+
+  run = ENGINES[engine]
+  seconds = []
+  correct = True
+  for i in range(repeat):
+    start = time.perf_counter()
+    result = run(bf, cellBits)
+    seconds.append(time.perf_counter() - start)
+    correct = correct and tuple(result) == tuple(output)
+
+  peak = None
+  if memory:
+    tracemalloc.start()
+    try: run(bf, cellBits)
+    finally:
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+
+  return {'seconds': min(seconds), 'peakMemory': peak, 'correct': correct}
+
+
+
+def benchmark(programs=None, engines=None, cellBits=CELL_BITS, repeat=3, memory=True):
+  '''
+  :param programs: names of the programs of the corpus to run, all if None
+  :param engines: names of the engines, all if None
+  :param cellBits: cell widths
+  :param repeat: number of runs of each program (see measureRun)
+  :param memory: if False, the peak memory is not measured
+  :return: list of results, each a dict with the program, engine, cell width, steps, best wall time,
+           steps per second, peak memory and whether the output was correct
+  '''
+
+  results = []
+  for name in programs or corpus.PROGRAMS:
+    program = corpus.PROGRAMS[name]
+    for bits in cellBits:
+      bf = programCode(program, bits)
+      steps = measure.run(bf, cellBits=bits, maxSteps=float('inf')).steps
+
+      for engine in engines or ENGINES:
+        result = {'program': name, 'engine': engine, 'cellBits': bits, 'steps': steps}
+        result.update(measureRun(engine, bf, bits, program.output, repeat, memory))
+        result['stepsPerSecond'] = steps / result['seconds'] if result['seconds'] else float('inf')
+        results.append(result)
+
+  return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+  '''
+  Compares results with a baseline; results without a counterpart in the baseline are not compared
+
+  :param results: results, as returned by benchmark
+  :param baseline: earlier results
+  :param tolerance: tolerated relative change
+  :return: list of regressions: (result, baseline result, list of descriptions)
+  '''
+
+  def key(r): return r['program'], r['engine'], r['cellBits']
+
+  old = {key(r): r for r in baseline}
+  regressions = []
+  for r in results:
+    b = old.get(key(r))
+    if b is None: continue
+
+    problems = []
+    if not r['correct']: problems.append('wrong output')
+    if r['steps'] != b['steps']: problems.append('steps {} -> {}'.format(b['steps'], r['steps']))
+    if r['stepsPerSecond'] < b['stepsPerSecond'] * (1 - tolerance):
+      problems.append('steps/s {:.0f} -> {:.0f}'.format(b['stepsPerSecond'], r['stepsPerSecond']))
+    if None not in (r['peakMemory'], b['peakMemory']) and r['peakMemory'] > b['peakMemory'] * (1 + tolerance): problems.append('peak memory {} -> {}'.format(b['peakMemory'], r['peakMemory']))
+
+    if problems: regressions.append((r, b, problems))
+
+  return regressions
+
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description='Benchmark of the interpreters\' throughput on the corpus')
+  ap.add_argument('--programs', nargs='+', choices=list(corpus.PROGRAMS), help='programs to run (default: all)')
+  ap.add_argument('--engines', nargs='+', choices=list(ENGINES), help='engines to run (default: all)')
+  ap.add_argument('--cell-bits', dest='cellBits', nargs='+', type=int, choices=CELL_BITS, default=CELL_BITS)
+  ap.add_argument('--repeat', type=int, default=3, help='runs of each program, the fastest one counts (default: %(default)s)')
+  ap.add_argument('--no-memory', dest='memory', action='store_false', help='do not measure the peak memory, which takes an additional, slow run')
+  ap.add_argument('--output', help='file to write the results to (JSON)')
+  ap.add_argument('--baseline', help='file with earlier results to compare with (JSON)')
+  ap.add_argument('--save-baseline', dest='saveBaseline', action='store_true', help='write the results to the baseline file instead of comparing')
+  ap.add_argument('--tolerance', type=float, default=TOLERANCE, help='tolerated relative change (default: %(default)s)')
+  args = ap.parse_args(argv)
+
+  results = benchmark(args.programs, args.engines, args.cellBits, args.repeat, args.memory)
+
+  print('{:<10}{:<13}{:>5}{:>11}{:>10}{:>13}{:>12}{:>8}'.format('program', 'engine', 'bits', 'steps', 'seconds', 'steps/s', 'peak KiB', 'output'))
+  for r in results:
+    peak = '{:.1f}'.format(r['peakMemory'] / 1024) if r['peakMemory'] is not None else '-'
+    print('{:<10}{:<13}{:>5}{:>11}{:>10.3f}{:>13.0f}{:>12}{:>8}'.format(
+      r['program'], r['engine'], r['cellBits'], r['steps'], r['seconds'], r['stepsPerSecond'], peak, 'ok' if r['correct'] else 'WRONG'))
+
+  if args.output:
+    with open(args.output, 'w') as f: json.dump(results, f, indent=1)
+
+  failed = not all(r['correct'] for r in results)
+  if args.baseline and args.saveBaseline:
+    with open(args.baseline, 'w') as f: json.dump(results, f, indent=1)
+
+  elif args.baseline:
+    with open(args.baseline) as f: regressions = compare(results, json.load(f), args.tolerance)
+    for r, b, problems in regressions: print('REGRESSION {} {} {} bits: {}'.format(r['program'], r['engine'], r['cellBits'], ', '.join(problems)))
+    failed = failed or bool(regressions)
+
+  return 1 if failed else 0
+
+
+
+if __name__ == '__main__': raise SystemExit(main())
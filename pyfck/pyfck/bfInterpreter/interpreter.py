@@ -3,7 +3,7 @@ Brainfuck interpreter implemented in Python3.
 
 Based on language description as found in https://esolangs.org/wiki/Brainfuck (9/2017)
 As for the key implementation details mentioned there:
-  - memory consists of 8bit cells
+  - memory consists of 8bit cells (or 16 / 32bit ones, see CELL_DTYPES)
   - memory cells wrap on under- and overflow
   - negative memory addresses do not exist
   - user input consists either of the first typed character, or the line is buffered (and ended with \x0A)
@@ -13,12 +13,21 @@ Marius Lambacher, 2017
 
 import numpy as np
 
+from ..bfalParser import memoryLayout
+
+
+### numpy types of the memory cells, by their width in bits
+CELL_DTYPES = {8: 'u1', 16: 'u2', 32: 'u4'}
+
+
 class Interpreter():
-  def __init__(self, memorySize=30000, bufferInput=True, debugging=False, createTrace=False, traceWidth=-1):
+  def __init__(self, memorySize=30000, bufferInput=True, debugging=False, createTrace=False, traceWidth=-1, cellBits=None):
     """
     Creates a new brainfuck interpreter
 
     :param dataSize: size of the memory field
+    :param cellBits: width of the cells in bits (one of CELL_DTYPES), memoryLayout.CELL_BITS if None;
+                     has to match the setting the program was compiled with
     :param bufferInput: If True, a line of input is buffered and then delivered to bf character-wise.
                         If the buffer is empty, a new line of input is requested
 
@@ -31,6 +40,10 @@ class Interpreter():
     self.memorySize = memorySize
     self.bufferInput = bufferInput
 
+    if cellBits is None: cellBits = memoryLayout.CELL_BITS
+    if cellBits not in CELL_DTYPES: raise ValueError('Unsupported cell width: {} bits'.format(cellBits))
+    self.cellDtype = CELL_DTYPES[cellBits]
+
     self.debugging = debugging
     self.running = False
 
@@ -44,7 +57,7 @@ class Interpreter():
     self.cmdPtr = 0                                               # index of current command
 
     self.jmps = np.zeros(0, dtype='u4')                           # jumps to be made when encountering parentheses '[...]'
-    self.memory = np.zeros(self.memorySize, dtype='u1')           # memory cells
+    self.memory = np.zeros(self.memorySize, dtype=self.cellDtype) # memory cells
     self.memoryPtr = 0                                            # pointer to current memory cell
 
     self.bufferedLine = iter([])
@@ -69,7 +82,7 @@ class Interpreter():
 
     if len(addrs) != 0: raise SyntaxError('Parentheses in source do not match (too many [\'s)')
 
-    self.memory = np.zeros(self.memorySize, dtype='u1')         # memory cells
+    self.memory = np.zeros(self.memorySize, dtype=self.cellDtype) # memory cells
     self.memoryPtr = 0                                            # pointer to current memory cell
 
     self.bufferedLine = iter([])
@@ -95,6 +108,18 @@ class Interpreter():
     self.cmds = np.array(list(cmdStr), dtype='U1')
 
 
+  def loadCmds(self, cmds):
+    """
+    Load a string of commands in the internal format (bf commands, plus '0' for setting a cell to 0),
+    e.g. as created by bfalParser.ir.lower(). The commands are not filtered.
+
+    :param cmds: string containing internal commands
+    :return:
+    """
+
+    self.cmds = np.array(list(cmds), dtype='U1')
+
+
   def run(self):
     """
     Starts the interpreter.
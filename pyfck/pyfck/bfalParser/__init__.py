@@ -1,4 +1,4 @@
-from . import macros, opcodes, memoryLayout
+from . import macros, opcodes, memoryLayout, ir, cache, layoutOptimiser, handlers
 from .parser import *
 
-__all__ = [macros, Parser, opcodes, memoryLayout]
\ No newline at end of file
+__all__ = [macros, Parser, opcodes, memoryLayout, ir, cache, layoutOptimiser, handlers]
\ No newline at end of file
@@ -0,0 +1,185 @@
+'''
+On-disk compile cache for the Brainfuck Assembly Language (BFAL)
+
+Compiled programs are stored content-addressed: the name of an entry is a hash over everything the output depends on,
+i.e. the source, the compile options, the memory layout, the opcode tables and the compiler itself.
+Entries are never updated, a change of any of those simply leads to a different entry.
+The source is hashed as written, before it is preprocessed; the files it includes are recorded in the entry by the hashes
+of their contents and checked on loading (see Parser.validCacheEntry), so an entry is only used if they did not change either.
+
+Entries are written atomically (to a temporary file, which is then renamed), so concurrent workers can share a cache.
+The cache is bounded in size; if it grows too big, the least recently used entries are removed.
+
+  parser = Parser(cache=CompileCache('~/.cache/pyfck'))
+  bf = parser.compile(bfal)       # compiles and stores the result
+  bf = parser.compile(bfal)       # loads the result
+
+
+Marius Lambacher, 2018
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+ENTRY_SUFFIX = '.bfc'
+
+_fingerprint = None
+
+def compilerFingerprint():
+  '''
+  Hash over the sources of the bfalParser package; changes to the compiler invalidate all cache entries.
+  Computed once per process.
+
+  :return: hex digest
+  '''
+
+  global _fingerprint
+  if _fingerprint is None:
+    h = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+      if name.endswith('.py'):
+        with open(os.path.join(directory, name), 'rb') as f: h.update(f.read())
+
+    _fingerprint = h.hexdigest()
+
+  return _fingerprint
+
+
+
+def digest(text):
+  '''
+  :param text: text, e.g. of an included file
+  :return: hash of the text (hex digest)
+  '''
+
+  return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+
+class CompileCache:
+  def __init__(self, directory, maxSize=64 * 2**20):
+    """
+    Creates a compile cache in the given directory
+
+    :param directory: directory to store the entries in, created if necessary
+    :param maxSize: maximum size of all entries in bytes
+    """
+
+    self.directory = os.path.abspath(os.path.expanduser(directory))
+    self.maxSize = maxSize
+
+    self.hits = 0
+    self.misses = 0
+
+    os.makedirs(self.directory, exist_ok=True)
+
+
+  def key(self, *parts):
+    """
+    Create the key of an entry: a hash over the given parts (converted by repr) and the compiler fingerprint
+
+    :param parts: everything the entry depends on
+    :return: key (hex digest)
+    """
+
+    h = hashlib.sha256(compilerFingerprint().encode())
+    for p in parts:
+      if not isinstance(p, bytes): p = repr(p).encode('utf-8')
+      h.update(hashlib.sha256(p).digest())         # hashing the parts separately keeps their boundaries unambiguous
+
+    return h.hexdigest()
+
+
+  def path(self, key):
+    return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+
+  def get(self, key, valid=None):
+    """
+    Load an entry; its access time is updated for the eviction policy
+
+    :param key: key of the entry
+    :param valid: function checking the entry (entry -> bool), e.g. whether the files it depends on are unchanged; invalid entries are not used
+    :return: entry (dict), None if there is no such (valid) entry
+    """
+
+    path = self.path(key)
+    try:
+      with open(path, 'r', encoding='utf-8') as f: entry = json.load(f)
+      os.utime(path)
+
+    except (OSError, ValueError):           # missing, or removed / corrupted concurrently
+      self.misses += 1
+      return None
+
+    if valid is not None and not valid(entry):
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    return entry
+
+
+  def put(self, key, entry):
+    """
+    Store an entry atomically and evict old entries, if the cache grew too big
+
+    :param key: key of the entry
+    :param entry: entry (dict, must be JSON-serialisable)
+    """
+
+    fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as f: json.dump(entry, f)
+      os.replace(tmp, self.path(key))
+
+    except BaseException:
+      os.unlink(tmp)
+      raise
+
+    self.evict()
+
+
+  def entries(self):
+    """
+    :return: list of (last access time, size, path) of all entries
+    """
+
+    res = []
+    for name in os.listdir(self.directory):
+      if not name.endswith(ENTRY_SUFFIX): continue
+
+      path = os.path.join(self.directory, name)
+      try: st = os.stat(path)
+      except OSError: continue
+
+      res.append((st.st_mtime, st.st_size, path))
+
+    return res
+
+
+  def evict(self):
+    """Remove the least recently used entries until the cache fits into maxSize"""
+
+    entries = self.entries()
+    size = sum(e[1] for e in entries)
+    if size <= self.maxSize: return
+
+    for mtime, entrySize, path in sorted(entries):
+      try: os.unlink(path)
+      except OSError: continue
+
+      size -= entrySize
+      if size <= self.maxSize: break
+
+
+  def clear(self):
+    """Remove all entries"""
+
+    for mtime, size, path in self.entries():
+      try: os.unlink(path)
+      except OSError: pass
@@ -35,12 +35,24 @@ class ComparisonMacroModeError(InternalError):
 class ComparisonMacroTypeError(InternalError):
   """Unable to determine type for comparison macro"""
 
+class CostModelError(InternalError):
+  """Unknown cost model"""
+
 class MulMacroTypeError(InternalError):
   """Unable to determine type for mul macro"""
 
 class DivMacroTypeError(InternalError):
   """Unable to determine type for div macro"""
 
+class IRParseError(InternalError):
+  """Unable to lift brainfuck code to the IR"""
+
+class UnknownIROpError(InternalError):
+  """An unknown IR operation was encountered"""
+
+class MissingHandlerError(InternalError):
+  """An opcode type has no handler"""
+
 
 # class InternalWarning(Warning):
 #   """Internal warning of the parser"""
@@ -76,3 +88,8 @@ class AssemblySyntaxError(AssemblyError):
   def __init__(self, *args):
     AssemblyError.__init__(self, *args, name='SyntaxError')
 
+class LayoutError(InternalError):
+  """Invalid memory layout"""
+
+class ProfileError(InternalError):
+  """Unable to profile the program"""
@@ -0,0 +1,443 @@
+'''
+Opcode handlers for the Brainfuck Assembly Language (BFAL)
+
+A handler compiles the commands of one opcode and type (see Parser.compileCommand):
+
+  handler(parser, mc, args, dead) -> brainfuck commands
+
+    parser: the Parser, whose state (e.g. KNOWN, DEPTH, ALIASES) the handler may use and update
+    mc:     MacroContext to compile in
+    args:   arguments, as returned by Parser.parseCommand (at least three, padded with None)
+    dead:   registers which are dead after the command (see Parser.deadRegisters)
+
+HANDLERS maps (opcode, type) to the handlers; Parser.compileCommand looks them up there.
+Other modules can register handlers for their own opcodes, in HANDLERS or in a registry of their own (set as Parser.HANDLERS):
+
+  @handlers.register(OPCODES.FOO, 'R', 'RV')
+  def foo(parser, mc, args, dead): ...
+
+Handlers are plain functions (or partials of them), so parsers can be sent to worker processes.
+validate() checks, that every type of every opcode has a handler; opcodes.OPCODE_TYPES is validated on import.
+
+
+Marius Lambacher, 2018
+'''
+
+import functools
+
+from . import memoryLayout
+from . import opcodes
+from .errors import *
+from .opcodes import OPCODES
+
+
+HANDLERS = {}
+
+
+
+def register(opcode, *types, registry=None):
+  '''
+  Decorator, registers a handler for the given types of an opcode
+
+  :param opcode: opcode to handle
+  :param types: types to handle
+  :param registry: dict to register the handler in, HANDLERS if None
+  :return: decorator, returning the handler unchanged
+  '''
+
+  if registry is None: registry = HANDLERS
+
+  def decorator(handler):
+    for t in types: registry[(opcode, t)] = handler
+    return handler
+
+  return decorator
+
+
+def validate(opcodeTypes, registry=None):
+  '''
+  Checks that every type of every opcode has a handler
+
+  :param opcodeTypes: opcode types, as in opcodes.OPCODE_TYPES
+  :param registry: handlers, HANDLERS if None
+  '''
+
+  if registry is None: registry = HANDLERS
+
+  for opcode, (cmdClass, types) in opcodeTypes.items():
+    for t in types:
+      if (opcode, t) not in registry: raise MissingHandlerError('{} {!r}'.format(opcode.name, t))
+
+
+def names(registry=None):
+  '''
+  :param registry: handlers, HANDLERS if None
+  :return: sorted list of (opcode, type, handler name, bound arguments) of the handlers; independent of the process, e.g. for cache keys
+  '''
+
+  if registry is None: registry = HANDLERS
+
+  result = []
+  for (opcode, t), handler in registry.items():
+    bound = ()
+    while isinstance(handler, functools.partial):
+      bound = tuple(str(a) for a in handler.args) + bound
+      handler = handler.func
+
+    result.append((str(opcode), t, '{}.{}'.format(handler.__module__, handler.__qualname__), bound))
+
+  return sorted(result)
+
+
+
+### moving values
+
+@register(OPCODES.SET, 'RV')
+def _setRV(parser, mc, args, dead):
+  return parser.setKnown(mc, args[0], int(args[1]))
+
+@register(OPCODES.SET, 'RR')
+def _setRR(parser, mc, args, dead):
+  a, b = args[:2]
+  return mc.copyCell(a, b, clear=parser.KNOWN.get(a) != 0, destructive=b in dead)
+
+@register(OPCODES.STZ, 'R')
+def _stz(parser, mc, args, dead):
+  return parser.setKnown(mc, args[0], 0)
+
+
+### stack
+
+@register(OPCODES.PUSH, 'V')
+def _pushV(parser, mc, args, dead):
+  if parser.DEPTH is not None: return mc.inc(parser.stackSlot(parser.DEPTH), int(args[0]))         # popped slots are left 0
+  return mc.atStackEnd('+>{}<'.format(mc.addConstRelative(int(args[0]), 1)))                        # the next stack cell is still 0
+
+@register(OPCODES.PUSH, 'R')
+def _pushR(parser, mc, args, dead):
+  a = args[0]
+  if parser.DEPTH is not None: return mc.copyCell(parser.stackSlot(parser.DEPTH), a, clear=False, destructive=a in dead)
+
+  bf = mc.doCellTimes(a, lambda s: s.atStackEnd('>+<<<'), destructive=a in dead)
+  bf += mc.atStackEnd('+')
+  return bf
+
+@register(OPCODES.POP, 'R')
+def _pop(parser, mc, args, dead):
+  a = args[0]
+  if parser.DEPTH is not None: return mc.copyCell(a, parser.stackSlot(parser.DEPTH - 1), clear=parser.KNOWN.get(a) != 0, destructive=True)
+
+  bf = mc.set(a, 0)
+  bf += mc.atStackEnd('<[-<') + mc.atCell(a, mc.inc()) + mc.atStackEnd('<]<-<<')
+  return bf
+
+
+### arrays
+
+@register(OPCODES.LOAD, 'RTV')
+def _loadRTV(parser, mc, args, dead):
+  a, array, i = args[:3]
+  return mc.copyCell(a, memoryLayout.arrayValue(array, parser.arrayIndex(array, i)), clear=parser.KNOWN.get(a) != 0)
+
+@register(OPCODES.LOAD, 'RTR')
+def _loadRTR(parser, mc, args, dead):
+  a, array, i = args[:3]
+  parser.arrayIndex(array)
+  return mc.arrayLoad(a, array, parser.ARRAYS[array], i, clear=parser.KNOWN.get(a) != 0, dead=dead)
+
+@register(OPCODES.STORE, 'TVV')
+def _storeTVV(parser, mc, args, dead):
+  array, i, val = args[:3]
+  return mc.atCell(memoryLayout.arrayValue(array, parser.arrayIndex(array, i)), '[-]' + mc.addConstRelative(int(val), -1))     # the carry cell is 0
+
+@register(OPCODES.STORE, 'TVR')
+def _storeTVR(parser, mc, args, dead):
+  array, i, b = args[:3]
+  return mc.copyCell(memoryLayout.arrayValue(array, parser.arrayIndex(array, i)), b, destructive=b in dead)
+
+@register(OPCODES.STORE, 'TRV')
+def _storeTRV(parser, mc, args, dead):
+  array, i, val = args[:3]
+  parser.arrayIndex(array)
+  return mc.arrayStore(array, parser.ARRAYS[array], i, val=int(val), dead=dead)
+
+@register(OPCODES.STORE, 'TRR')
+def _storeTRR(parser, mc, args, dead):
+  array, i, b = args[:3]
+  parser.arrayIndex(array)
+  return mc.arrayStore(array, parser.ARRAYS[array], i, source=b, dead=dead)
+
+@register(OPCODES.FILL, 'TV')
+def _fillTV(parser, mc, args, dead):
+  array, val = args[:2]
+  parser.arrayIndex(array)
+  return mc.arrayFill(array, parser.ARRAYS[array], val=int(val))
+
+@register(OPCODES.FILL, 'TR')
+def _fillTR(parser, mc, args, dead):
+  array, b = args[:2]
+  parser.arrayIndex(array)
+  return mc.arrayFill(array, parser.ARRAYS[array], source=b, destructive=b in dead)
+
+@register(OPCODES.CLEAR, 'T')
+def _clear(parser, mc, args, dead):
+  parser.arrayIndex(args[0])
+  return mc.arrayFill(args[0], parser.ARRAYS[args[0]])
+
+
+### input / output
+
+@register(OPCODES.INPUT, 'R')
+def _input(parser, mc, args, dead):
+  return mc.atCell(args[0], ',')
+
+@register(OPCODES.OUTPUT, 'R')
+def _output(parser, mc, args, dead):
+  return mc.atCell(args[0], '.')
+
+
+### arithmetic
+
+@register(OPCODES.INC, 'R')
+def _incR(parser, mc, args, dead):
+  return mc.inc(dest=args[0])
+
+@register(OPCODES.INC, 'RV')
+def _incRV(parser, mc, args, dead):
+  return mc.inc(dest=args[0], val=int(args[1]))
+
+@register(OPCODES.INC, 'RR')
+def _incRR(parser, mc, args, dead):
+  a, b = args[:2]
+  return mc.addCell(a, b, destructive=b in dead and b != a)
+
+@register(OPCODES.DEC, 'R')
+def _decR(parser, mc, args, dead):
+  return mc.dec(dest=args[0])
+
+@register(OPCODES.DEC, 'RV')
+def _decRV(parser, mc, args, dead):
+  return mc.dec(dest=args[0], val=int(args[1]))
+
+@register(OPCODES.DEC, 'RR')
+def _decRR(parser, mc, args, dead):
+  a, b = args[:2]
+  return mc.subCell(a, b, destructive=b in dead and b != a)
+
+
+def _valueVV(opcode, parser, mc, args, dead):
+  '''Handler for arithmetic on two values: the result is known at compile time'''
+
+  return parser.setKnown(mc, args[0], parser.DESTINATION_VALUES[opcode](None, int(args[1]), int(args[2])))
+
+for _opcode in (OPCODES.ADD, OPCODES.SUB, OPCODES.MUL, OPCODES.DIV, OPCODES.MOD):
+  register(_opcode, 'RVV')(functools.partial(_valueVV, _opcode))
+
+
+@register(OPCODES.ADD, 'RRV')
+def _addRRV(parser, mc, args, dead):
+  a, b, val = args[:3]
+  return mc.copyCell(a, b, clear=parser.KNOWN.get(a) != 0, destructive=b in dead) + mc.inc(a, int(val))
+
+@register(OPCODES.ADD, 'RRR')
+def _addRRR(parser, mc, args, dead):
+  a, b, c = args[:3]
+  bf = mc.copyCell(a, b, clear=parser.KNOWN.get(a) != 0, destructive=b in dead and b != c)
+  bf += mc.addCell(a, c, destructive=c in dead and c != a)
+  return bf
+
+@register(OPCODES.SUB, 'RRV')
+def _subRRV(parser, mc, args, dead):
+  a, b, val = args[:3]
+  return mc.copyCell(a, b, clear=parser.KNOWN.get(a) != 0, destructive=b in dead) + mc.dec(a, int(val))
+
+@register(OPCODES.SUB, 'RRR')
+def _subRRR(parser, mc, args, dead):
+  a, b, c = args[:3]
+  bf = mc.copyCell(a, b, clear=parser.KNOWN.get(a) != 0, destructive=b in dead and b != c)
+  bf += mc.subCell(a, c, destructive=c in dead and c != a)
+  return bf
+
+@register(OPCODES.MUL, 'RRV')
+def _mulRRV(parser, mc, args, dead):
+  a, b, val = args[:3]
+  return mc.mulCell(a, 'RV', b, int(val), clear=parser.KNOWN.get(a) != 0, dead=dead)
+
+@register(OPCODES.MUL, 'RRR')
+def _mulRRR(parser, mc, args, dead):
+  a, b, c = args[:3]
+  return mc.mulCell(a, 'RR', b, c, clear=parser.KNOWN.get(a) != 0, dead=dead)
+
+@register(OPCODES.DIV, 'RRV')
+def _divRRV(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  return mc.divCell(args[0], 'RV', args[1], int(args[2]), dead=dead)
+
+@register(OPCODES.DIV, 'RRR')
+def _divRRR(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  return mc.divCell(args[0], 'RR', args[1], args[2], dead=dead)
+
+@register(OPCODES.MOD, 'RRV')
+def _modRRV(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  return mc.divModCell(None, args[0], 'RV', args[1], int(args[2]), dead=dead)
+
+@register(OPCODES.MOD, 'RRR')
+def _modRRR(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  return mc.divModCell(None, args[0], 'RR', args[1], args[2], dead=dead)
+
+
+def _divMod(cmdType, parser, mc, args, dead):
+  '''Handler for DIVMOD (of type cmdType)'''
+
+  q, r, a, b = args[:4]
+  if q == r: raise AssemblyValueError('Quotient and remainder have to be written to different registers')
+
+  if cmdType == 'RRVV':
+    values = (None, None, int(a), int(b))
+    bf = parser.setKnown(mc, q, parser.DESTINATION_VALUES[OPCODES.DIVMOD](*values))
+    bf += parser.setKnown(mc, r, parser.SECOND_DESTINATION_VALUES[OPCODES.DIVMOD](*values))
+    return bf
+
+  parser.ensureCompInit = True
+  if cmdType == 'RRRV': return mc.divModCell(q, r, 'RV', a, int(b), dead=dead)
+  return mc.divModCell(q, r, 'RR', a, b, dead=dead)
+
+for _type in ('RRVV', 'RRRV', 'RRRR'):
+  register(OPCODES.DIVMOD, _type)(functools.partial(_divMod, _type))
+
+
+### conditions
+
+@register(OPCODES.TRUE, '')
+def _true(parser, mc, args, dead):
+  return parser.setKnown(mc, 'RC', 1)
+
+@register(OPCODES.FALSE, '')
+def _false(parser, mc, args, dead):
+  return parser.setKnown(mc, 'RC', 0)
+
+@register(OPCODES.NOT, '')
+def _not(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  bf = mc.copyCell('CB', 'RC', destructive=True)
+  bf += mc.inc('RC')
+  bf += mc.ifCB(lambda s: s.dec('RC'))
+  bf += mc.set('CB', 0)
+  return bf
+
+
+def _conditionValues(opcode, parser, mc, args, dead):
+  '''Handler for conditions on values only: the result is known at compile time'''
+
+  values = [int(a) for a in args if a is not None]
+  return parser.setKnown(mc, 'RC', parser.CONDITION_VALUES[opcode](*values))
+
+register(OPCODES.ZERO, 'V')(functools.partial(_conditionValues, OPCODES.ZERO))
+register(OPCODES.NOT_ZERO, 'V')(functools.partial(_conditionValues, OPCODES.NOT_ZERO))
+for _opcode in (OPCODES.EQUAL, OPCODES.NOT_EQUAL, OPCODES.GREATER, OPCODES.GREATER_EQUAL, OPCODES.LESS, OPCODES.LESS_EQUAL):
+  register(_opcode, 'VV')(functools.partial(_conditionValues, _opcode))
+
+
+@register(OPCODES.NOT_ZERO, 'R')
+def _notZeroR(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  bf = parser.setKnown(mc, 'RC', 0)
+  bf += mc.addCell('CB', args[0], destructive=args[0] in dead)
+  bf += mc.ifCB(lambda s: s.inc('RC'))
+  bf += mc.set('CB', 0)
+  return bf
+
+@register(OPCODES.ZERO, 'R')
+def _zeroR(parser, mc, args, dead):
+  parser.ensureCompInit = True
+  bf = parser.setKnown(mc, 'RC', 1)
+  bf += mc.addCell('CB', args[0], destructive=args[0] in dead)
+  bf += mc.ifCB(lambda s: s.dec('RC'))
+  bf += mc.set('CB', 0)
+  return bf
+
+
+def _equality(equal, cmdType, parser, mc, args, dead):
+  '''Handler for EQ (if equal) and NE (else) of type cmdType: the difference of the arguments is tested in CB'''
+
+  a, b = args[:2]
+  parser.ensureCompInit = True
+  bf = parser.setKnown(mc, 'RC', int(equal))
+  if a == b: return bf          # if registers are equal, their values are
+
+  bf += mc.addCell('CB', a, destructive=a in dead)
+  if cmdType == 'RV': bf += mc.dec('CB', int(b))
+  else: bf += mc.subCell('CB', b, destructive=b in dead)
+
+  bf += mc.ifCB(lambda s: s.dec('RC') if equal else s.inc('RC'))
+  bf += mc.set('CB', 0)
+  return bf
+
+for _type in ('RV', 'RR'):
+  register(OPCODES.EQUAL, _type)(functools.partial(_equality, True, _type))
+  register(OPCODES.NOT_EQUAL, _type)(functools.partial(_equality, False, _type))
+
+
+def _comparison(mode, cmdType, parser, mc, args, dead):
+  '''Handler for GT, GE, LT and LE (mode) of type cmdType, see MacroContext.comparison'''
+
+  a, b = args[:2]
+  parser.ensureCompInit = True
+  if cmdType == 'RV': return mc.comparison('RV', a, int(b), mode, dead=dead)
+  return mc.comparison('RR', a, b, mode, dead=dead)
+
+for _opcode, _mode in ((OPCODES.GREATER, 'GT'), (OPCODES.GREATER_EQUAL, 'GE'), (OPCODES.LESS, 'LT'), (OPCODES.LESS_EQUAL, 'LE')):
+  for _type in ('RV', 'RR'): register(_opcode, _type)(functools.partial(_comparison, _mode, _type))
+
+
+### control flow
+
+def _blockStart(opcode, parser, mc, args, dead):
+  '''Handler for LOOP and IF (opcode): the block itself is opened by Parser.buildProgram'''
+
+  parser.cfBlockEnds.append(parser.CONTROLFLOW_BLOCK_ENDS[opcode])
+  return mc.moveToCell('RC')
+
+register(OPCODES.LOOP, '')(functools.partial(_blockStart, OPCODES.LOOP))
+register(OPCODES.IF, '')(functools.partial(_blockStart, OPCODES.IF))
+
+@register(OPCODES.END_LOOP, '')
+def _endLoop(parser, mc, args, dead):
+  parser.cfBlockEnds.pop()
+  return mc.moveToCell('RC')     # the loop itself is closed by Parser.buildProgram
+
+@register(OPCODES.END_IF, '')
+def _endIf(parser, mc, args, dead):
+  parser.cfBlockEnds.pop()
+  return mc.moveToCell('RC') + parser.setKnown(mc, 'RC', 0)     # the block is closed on RC by Parser.buildProgram
+
+
+### special commands
+
+@register(OPCODES.ALIAS, 'TV', 'TR')
+def _alias(parser, mc, args, dead):
+  parser.ALIASES[args[0]] = args[1]
+  parser._aliasState = None
+  return ''
+
+@register(OPCODES.PRINT, 'T')
+def _print(parser, mc, args, dead):
+  text = args[0]
+  if text in parser.STRINGS: return mc.printData(*parser.STRINGS[text])
+  return mc.printTextOptimised(text)
+
+@register(OPCODES.ARRAY, 'TV')
+def _array(parser, mc, args, dead):
+  # the cells are placed by Parser.arrayTable
+  name, size = args[:2]
+  if parser.ARRAYS.get(name) != int(size):
+    raise AssemblyValueError('Invalid declaration of array {}: the size has to be between 1 and {}, '
+                             'the name unique and not used by other cells'.format(name, parser.MAX_ARRAY_SIZE))
+  return ''
+
+
+
+validate(opcodes.OPCODE_TYPES)
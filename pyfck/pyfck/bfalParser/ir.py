@@ -0,0 +1,319 @@
+'''
+Intermediate representation (IR) for the Brainfuck Assembly Language (BFAL)
+
+The IR sits between the macros and the final brainfuck text.
+It consists of a small set of typed operations:
+  - Move      : move the head by dist cells (negative: to the left)
+  - Add       : add val to the current cell (negative: subtract)
+  - Clear     : set the current cell to 0 ('[-]')
+  - Loop      : loop over body while the current cell is not 0
+  - Input     : read one character into the current cell
+  - Output    : print the current cell
+  - MacroCall : a block of operations generated by a single macro / command
+
+Every operation knows the head position it is executed at (pos), as far as it can be determined statically;
+if the position is unknown (e.g. after an unbalanced loop such as '[<]'), pos is None.
+
+A list of operations is called a program. Programs are created from brainfuck text with parse(),
+optimised by passes (functions taking and returning a program) and lowered with emit() (brainfuck text)
+or lower() (the command format used internally by the interpreter).
+Passes marked with localPass transform the body of every macro call on its own; the parser runs them on each command
+as soon as it is compiled (see Parser.emitCall), the others over the whole program.
+
+Marius Lambacher, 2018
+'''
+
+import re
+
+from .errors import *
+
+
+class Op:
+  """Base class of all IR operations"""
+
+  def __init__(self, pos=None):
+    self.pos = pos
+
+  def __eq__(self, other):
+    return type(self) is type(other) and self._key() == other._key()
+
+  def __repr__(self):
+    return '{}({})'.format(self.__class__.__name__, ', '.join(map(repr, self._key())))
+
+  def _key(self):
+    return ()
+
+
+class Move(Op):
+  """Move the head by dist cells"""
+
+  def __init__(self, dist, pos=None):
+    Op.__init__(self, pos)
+    self.dist = dist
+
+  def _key(self):
+    return (self.dist,)
+
+
+class Add(Op):
+  """Add val to the current cell"""
+
+  def __init__(self, val, pos=None):
+    Op.__init__(self, pos)
+    self.val = val
+
+  def _key(self):
+    return (self.val,)
+
+
+class Clear(Op):
+  """Set the current cell to 0"""
+
+
+class Input(Op):
+  """Read one character into the current cell"""
+
+
+class Output(Op):
+  """Print the current cell"""
+
+
+class Loop(Op):
+  """Execute body while the current cell is not 0"""
+
+  def __init__(self, body, pos=None):
+    Op.__init__(self, pos)
+    self.body = body
+
+  def _key(self):
+    return (self.body,)
+
+
+class MacroCall(Op):
+  """
+  Operations generated by one macro (or assembly command); startPos and endPos are the head positions known to the MacroContext.
+  A MacroCall can also be created from brainfuck text (bf); it is only lifted to operations when its body is accessed,
+  so programs which are not optimised on the IR level do not pay for lifting.
+  """
+
+  def __init__(self, name, body=None, startPos=None, endPos=None, bf=None):
+    Op.__init__(self, startPos)
+    self.name = name
+    self._body = body
+    self.bf = bf
+    self.startPos = startPos
+    self.endPos = endPos
+
+  @property
+  def body(self):
+    if self._body is None:
+      self._body = parse(self.bf, self.startPos)
+      self.bf = None
+
+    return self._body
+
+  @body.setter
+  def body(self, body):
+    self._body = body
+    self.bf = None
+
+  def _key(self):
+    return (self.name, self.body)
+
+
+
+_TOKENS = re.compile(r'[<>]+|[+-]+|\[-\]|[][.,]')
+
+
+def _netMove(s):
+  return s.count('>') - s.count('<')
+
+def _netAdd(s):
+  return s.count('+') - s.count('-')
+
+
+def parse(bf, pos=None):
+  '''
+  Lifts brainfuck text to a program; characters which are not bf commands are ignored.
+  Runs of moves and increments are merged into a single operation each.
+
+  :param bf: brainfuck text
+  :param pos: head position at the start of bf, None if unknown
+  :return: program (list of operations)
+  '''
+
+  stack = []
+  ops = []
+  for m in _TOKENS.finditer(bf):
+    s = m.group()
+    c = s[0]
+
+    if c in '<>':
+      dist = _netMove(s)
+      if dist: ops.append(Move(dist, pos))
+      if pos is not None: pos += dist
+
+    elif c in '+-':
+      val = _netAdd(s)
+      if val: ops.append(Add(val, pos))
+
+    elif s == '[-]': ops.append(Clear(pos))
+    elif c == '.': ops.append(Output(pos))
+    elif c == ',': ops.append(Input(pos))
+
+    elif c == '[':
+      stack.append((ops, pos))
+      ops = []
+
+    else:
+      if not stack: raise IRParseError('Too many ]\'s')
+      outer, start = stack.pop()
+      loop = Loop(ops, start)
+      outer.append(loop)
+      ops = outer
+
+      if start is None or pos != start: pos = None      # unbalanced loop: head position is unknown afterwards
+
+  if stack: raise IRParseError('Too many [\'s')
+  return ops
+
+
+
+def emit(ops):
+  '''
+  Lowers a program to brainfuck text.
+  Each MacroCall is terminated by a newline, so every assembly command ends up in its own line.
+
+  :param ops: program
+  :return: brainfuck text
+  '''
+
+  parts = []
+  _emit(ops, parts, '[-]')
+  return ''.join(parts)
+
+
+def lower(ops):
+  '''
+  Lowers a program to the command format used by the interpreter (see Interpreter.loadCmds()).
+  This is plain brainfuck, except that Clear is lowered to the single command '0'.
+
+  :param ops: program
+  :return: string of interpreter commands
+  '''
+
+  parts = []
+  _emit(ops, parts, '0', newlines=False)
+  return ''.join(parts)
+
+
+def _emit(ops, parts, clear, newlines=True):
+  for op in ops:
+    t = type(op)
+    if t is Move: parts.append('>' * op.dist if op.dist > 0 else '<' * -op.dist)
+    elif t is Add: parts.append('+' * op.val if op.val > 0 else '-' * -op.val)
+    elif t is Clear: parts.append(clear)
+    elif t is Output: parts.append('.')
+    elif t is Input: parts.append(',')
+
+    elif t is Loop:
+      parts.append('[')
+      _emit(op.body, parts, clear, newlines)
+      parts.append(']')
+
+    elif t is MacroCall:
+      n = len(parts)
+      if op._body is None:
+        if op.bf: parts.append(op.bf if clear == '[-]' else op.bf.replace('[-]', clear))
+
+      else: _emit(op.body, parts, clear, newlines)
+      if newlines and len(parts) > n: parts.append('\n')
+
+    else: raise UnknownIROpError(t.__name__)
+
+
+
+def localPass(p):
+  '''
+  Marks a pass as local: applied to a program, it gives the same result as applied to the body of each macro call on its own,
+  i.e. it never merges operations of different macro calls
+
+  :param p: pass
+  :return: p
+  '''
+
+  p.local = True
+  return p
+
+
+def isLocal(p):
+  '''
+  :param p: pass
+  :return: True, if the pass is marked as local (see localPass)
+  '''
+
+  return getattr(p, 'local', False)
+
+
+
+@localPass
+def foldRuns(ops):
+  '''
+  Pass: merges adjacent moves and adjacent increments, drops those which cancel out and repeated clears.
+  Blocks (loops and macro calls) are folded recursively, but never merged with their neighbours.
+
+  :param ops: program
+  :return: folded program
+  '''
+
+  res = []
+  for op in ops:
+    t = type(op)
+    last = res[-1] if res else None
+
+    if t in (Loop, MacroCall):
+      if t is Loop: op = Loop(foldRuns(op.body), op.pos)
+      else: op = MacroCall(op.name, foldRuns(op.body), op.startPos, op.endPos)
+      res.append(op)
+
+    elif t is Move and type(last) is Move:
+      dist = last.dist + op.dist
+      res.pop()
+      if dist: res.append(Move(dist, last.pos))
+
+    elif t is Add and type(last) is Add:
+      val = last.val + op.val
+      res.pop()
+      if val: res.append(Add(val, last.pos))
+
+    elif t is Clear and type(last) is Clear: pass
+
+    else: res.append(op)
+
+  return res
+
+
+def runPasses(ops, passes):
+  '''
+  Runs the given optimisation passes over a program, in order
+
+  :param ops: program
+  :param passes: iterable of passes
+  :return: optimised program
+  '''
+
+  for p in passes: ops = p(ops)
+  return ops
+
+
+def walk(ops):
+  '''
+  Iterates over all operations of a program, descending into loops and macro calls (pre-order)
+
+  :param ops: program
+  :return: generator of operations
+  '''
+
+  for op in ops:
+    yield op
+    if type(op) in (Loop, MacroCall): yield from walk(op.body)
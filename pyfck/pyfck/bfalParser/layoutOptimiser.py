@@ -0,0 +1,180 @@
+'''
+Memory layout optimiser for the Brainfuck Assembly Language (BFAL)
+
+Every access to a cell costs as many head moves as the cell is away from the previous one.
+The optimiser counts transitions of the head between cells (co-accesses) and reorders the cells,
+so that cells which are frequently accessed after each other are close together.
+
+Transitions can be counted
+  - statically, while compiling: every move of the MacroContext counts once,
+    moves inside of LOOP blocks are weighted by STATIC_LOOP_WEIGHT per nesting level
+  - from a profile: the compiled program is run and every executed move is counted
+
+Not all cells can be moved, as the macros rely on parts of the layout:
+  - the comparison block (C0, C1, C2, CB, CA) stays at the start; ifCB relies on C0, C1, C2 and CB being adjacent,
+    the comparison macro needs a zero cell right after CA, so RC stays there
+  - the stack stays at the end, as it grows to the right
+
+  parser = Parser()
+  parser.optimiseLayout(bfal)     # sets parser.CELLS
+  bf = parser.compile(bfal)
+
+
+Marius Lambacher, 2018
+'''
+
+import collections
+
+from . import memoryLayout
+from .errors import *
+
+
+###  assumed number of iterations of a LOOP block when counting transitions statically
+STATIC_LOOP_WEIGHT = 8
+
+
+
+def normalise(transitions):
+  '''
+  Merges the transitions a -> b and b -> a (which cost the same) and drops transitions from a cell to itself
+
+  :param transitions: mapping (from cell, to cell) -> count
+  :return: Counter (cell, cell) -> count, with the cells of a key sorted
+  '''
+
+  res = collections.Counter()
+  for (a, b), n in transitions.items():
+    if a != b: res[tuple(sorted((a, b)))] += n
+
+  return res
+
+
+
+def travelCost(transitions, cells):
+  '''
+  Total number of head moves needed for the given transitions in a layout
+
+  :param transitions: mapping (from cell, to cell) -> count
+  :param cells: layout (list of cells)
+  :return: total distance
+  '''
+
+  index = {c: i for i, c in enumerate(cells)}
+  return sum(n * abs(index[a] - index[b]) for (a, b), n in transitions.items() if a in index and b in index)
+
+
+
+def profileTransitions(cmds, cells, inputs=b'', maxSteps=10**7, cellBits=None):
+  '''
+  Runs a program and counts the executed transitions of the head between cells.
+  If the program does not terminate within maxSteps, the transitions counted so far are returned.
+
+  :param cmds: program in the interpreter command format (see ir.lower())
+  :param cells: layout the program was compiled with
+  :param inputs: input of the program (bytes); after the end, reading yields 0
+  :param maxSteps: maximum number of commands to execute
+  :param cellBits: width of the cells in bits, memoryLayout.CELL_BITS if None
+  :return: Counter (from cell, to cell) -> count
+  '''
+
+  ops = []                # (command, argument); runs of moves and increments are merged
+  stack = []
+  for c in cmds:
+    if c in '<>+-':
+      kind = '>' if c in '<>' else '+'
+      d = 1 if c in '>+' else -1
+      if ops and ops[-1][0] == kind: ops[-1][1] += d
+      else: ops.append([kind, d])
+
+    elif c == '[':
+      stack.append(len(ops))
+      ops.append(['[', None])
+
+    elif c == ']':
+      if not stack: raise ProfileError('Too many ]\'s')
+      start = stack.pop()
+      ops[start][1] = len(ops) + 1
+      ops.append([']', start + 1])
+
+    elif c in '0.,': ops.append([c, None])
+
+  if stack: raise ProfileError('Too many [\'s')
+
+  cellSize = 1 << (memoryLayout.CELL_BITS if cellBits is None else cellBits)
+  moves = collections.Counter()
+  memory = collections.defaultdict(int)
+  inputs = iter(inputs)
+  ptr = 0
+  i = 0
+  for step in range(maxSteps):
+    if i >= len(ops): break
+    kind, arg = ops[i]
+    i += 1
+
+    if kind == '>':
+      if arg: moves[(ptr, ptr + arg)] += 1
+      ptr += arg
+
+    elif kind == '+': memory[ptr] = (memory[ptr] + arg) % cellSize
+    elif kind == '0': memory[ptr] = 0
+    elif kind == '[' and not memory[ptr]: i = arg
+    elif kind == ']' and memory[ptr]: i = arg
+    elif kind == ',': memory[ptr] = next(inputs, 0)
+
+  transitions = collections.Counter()
+  for (a, b), n in moves.items():
+    if 0 <= a < len(cells) and 0 <= b < len(cells): transitions[(cells[a], cells[b])] += n
+
+  return transitions
+
+
+
+def optimiseLayout(transitions, cells, head=memoryLayout.COMPARISON + ['RC'], tail=memoryLayout.STACK):
+  '''
+  Reorders the cells between head and tail, minimising the travel cost of the transitions.
+  The cells are placed greedily (each next cell being the one with the most transitions to the cells placed already),
+  the result is then improved by swapping pairs of cells, as long as this lowers the cost.
+
+  :param transitions: mapping (from cell, to cell) -> count
+  :param cells: current layout; it has to start with head and end with tail
+  :param head: cells which stay at the start
+  :param tail: cells which stay at the end
+  :return: optimised layout (list of cells)
+  '''
+
+  head = list(head)
+  tail = list(tail)
+  if cells[:len(head)] != head or cells[len(cells)-len(tail):] != tail:
+    raise LayoutError('Layout has to start with {} and end with {}'.format(head, tail))
+
+  weights = normalise(transitions)
+  neighbours = collections.defaultdict(collections.Counter)
+  for (a, b), n in weights.items():
+    neighbours[a][b] += n
+    neighbours[b][a] += n
+
+  movable = cells[len(head):len(cells)-len(tail)]
+  order = head[:]
+  remaining = movable[:]
+  while remaining:
+    nxt = max(remaining, key=lambda c: sum(neighbours[c][p] for p in order))     # on ties, the first one (in the current layout) is taken
+    remaining.remove(nxt)
+    order.append(nxt)
+
+  layout = order + tail
+  cost = travelCost(weights, layout)
+
+  improved = True
+  while improved:
+    improved = False
+    for i in range(len(head), len(layout) - len(tail)):
+      for j in range(i+1, len(layout) - len(tail)):
+        layout[i], layout[j] = layout[j], layout[i]
+        c = travelCost(weights, layout)
+        if c < cost:
+          cost = c
+          improved = True
+
+        else: layout[i], layout[j] = layout[j], layout[i]
+
+  return layout
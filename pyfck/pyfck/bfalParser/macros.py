@@ -17,14 +17,164 @@ Marius Lambacher, 2017
 """
 
 
-from contextlib import contextmanager
+import collections
+import functools
+import math
+from contextlib import contextmanager, ExitStack
 
 from . import memoryLayout
+from . import ir
 from .errors import *
 
 
+###  cost models for generating constants: 'size' minimises the length of the code, 'steps' the number of executed commands
+COST_MODELS = ('size', 'steps')
+
+
+###  character classes (ranges of characters), to whose bases cells are primed for printing text
+CHAR_CLASSES = ((0x41, 0x5a), (0x61, 0x7a), (0x30, 0x39), (0x20, 0x20))       # upper case, lower case, digits, space
+
+###  maximum number of cells used for printing text (see printTextPrimed)
+MAX_PRINT_CELLS = 4
+
+###  default number of entries of the memo of a MacroContext (see memoized)
+MEMO_SIZE = 16384
+
+###  statistics of the memo of a MacroContext; uncached: calls which could not be memoized (e.g. callable arguments capturing objects)
+MemoInfo = collections.namedtuple('MemoInfo', 'hits misses uncached maxSize size')
+
+
+def _increments(val):
+  return '+' * val if val > 0 else '-' * -val
+
+
+def textBytes(text):
+  '''
+  :param text: text as given to PRT, escape sequences (e.g. '\\n') are resolved
+  :return: characters of text (bytearray)
+  '''
+
+  return bytearray(text.encode('Latin-1').decode('unicode-escape'), 'Latin-1')
+
+
+def primingBases(chars, n):
+  '''
+  Bases for printing chars: for each of the (at most n) most frequent character classes in chars, the median of its characters
+
+  :param chars: characters to be printed
+  :param n: maximum number of bases
+  :return: list of bases
+  '''
+
+  classes = [sorted(c for c in chars if lo <= c <= hi) for lo, hi in CHAR_CLASSES]
+  classes = sorted((c for c in classes if c), key=len, reverse=True)[:n]
+  return [c[len(c) // 2] for c in classes]
+
+
+@functools.lru_cache(maxsize=4096)
+def constantPlan(val, toTemp, dist, toDest, costModel='size', cellSize=256):
+  '''
+  Chooses how to add val to a cell: with plain increments, or with a loop adding b to the cell a times
+  (counted down in a temp cell), followed by adding c; so that val = a*b + c (modulo cellSize).
+  The loop costs at least 9 commands, so for |val| <= 9 increments are always cheaper.
+  For wider cells, the loop may run up to sqrt(cellSize / 2) times (at most 256), so that a and b stay balanced.
+
+  :param val: value to add
+  :param toTemp: distance from the current position to the temp cell
+  :param dist: distance from the temp cell to the cell
+  :param toDest: distance from the current position to the cell
+  :param costModel: one of COST_MODELS
+  :param cellSize: number of values of a cell
+  :return: cost, (a, b, c) or cost, None if plain increments are cheaper
+  '''
+
+  if costModel not in COST_MODELS: raise CostModelError(costModel)
+
+  best = None
+  bestCost = toDest + abs(val)
+  for a in range(2, min(max(32, int(math.sqrt(cellSize // 2))), 256) + 1):
+    for target in (val - cellSize, val, val + cellSize):
+      q = round(target / a)
+      for b in (q-1, q, q+1):
+        if not b: continue
+        c = target - a*b
+
+        if costModel == 'size': cost = toTemp + a + 3 + 3*dist + abs(b) + abs(c)
+        else: cost = toTemp + a + 1 + a*(2 + 2*dist + abs(b)) + dist + abs(c)
+
+        if cost < bestCost: best, bestCost = (a, b, c), cost
+
+  return bestCost, best
+
+
+
+_PLAIN = {str, int, bool, float, type(None)}
+
+def _memoKey(val):
+  """
+  :param val: argument of a macro
+  :return: hashable key of val; functions by their code and the keys of the values they capture
+  :raise TypeError: if val can not be keyed (e.g. a function capturing an object, whose state it may depend on)
+  """
+
+  t = type(val)
+  if t in _PLAIN: return val
+  if t in (tuple, list):
+    if t is tuple and _PLAIN.issuperset(map(type, val)): return val
+    return (t.__name__,) + tuple(_memoKey(v) for v in val)
+
+  if t in (set, frozenset):
+    if t is frozenset and _PLAIN.issuperset(map(type, val)): return val
+    return frozenset(_memoKey(v) for v in val)
+
+  if t is type(_memoKey):
+    closure = tuple(_memoKey(c.cell_contents) for c in val.__closure__ or ())
+    return (val.__code__, closure, _memoKey(val.__defaults__))
+
+  raise TypeError('Unable to key {!r}'.format(val))
+
+
+def memoized(macro):
+  """
+  Decorator for macros, whose commands only depend on their arguments, the head position and the locked temps:
+  those and the head position after the commands are kept in the memo of the MacroContext (least recently used entries are dropped).
+  Macros are not memoized while transitions are counted, as those are counted for the generated moves.
+
+  :param macro: MacroContext method
+  :return: memoized method
+  """
+
+  name = macro.__name__
+
+  @functools.wraps(macro)
+  def wrapper(self, *args, **kwargs):
+    if self.memo is None or self.transitions is not None: return macro(self, *args, **kwargs)
+
+    try: key = (name, _memoKey(args), _memoKey(tuple(kwargs.items())) if kwargs else (), self._curPos, frozenset(self.LOCKED))
+    except TypeError:
+      self.memoUncached += 1
+      return macro(self, *args, **kwargs)
+
+    entry = self.memo.get(key)
+    if entry is not None:
+      self.memo.move_to_end(key)
+      self.memoHits += 1
+      bf, self._curPos = entry
+      return bf
+
+    self.memoMisses += 1
+    bf = macro(self, *args, **kwargs)
+    self.memo[key] = (bf, self._curPos)
+    if len(self.memo) > self.memoSize: self.memo.popitem(last=False)
+
+    return bf
+
+  return wrapper
+
+
+
 class MacroContext():
-  def __init__(self, startPos=0, cells=None, temps=None):
+  def __init__(self, startPos=0, cells=None, temps=None, costModel='size', cellBits=None, memoSize=MEMO_SIZE):
     self._curPos = startPos
 
     if cells is None: self.CELLS = memoryLayout.CELLS
@@ -33,7 +183,22 @@ class MacroContext():
     if temps is None: self.TEMPS = memoryLayout.TEMPS
     else: self.TEMPS = temps
 
-    self.LOCKED = []        # locked temp cells
+    self.layout = memoryLayout.getLayout(self.CELLS, self.TEMPS)
+
+    self.LOCKED = collections.Counter()        # locked temp cells (number of locks)
+
+    self.transitions = None         # if set to a Counter, moves of the head are counted as (from cell, to cell) -> weight
+    self.transitionWeight = 1
+
+    self.costModel = costModel      # cost model for generating constants (see COST_MODELS), None: always use increments
+
+    if cellBits is None: cellBits = memoryLayout.CELL_BITS
+    self.cellSize = 1 << cellBits   # number of values of a cell; they wrap around modulo cellSize
+
+    # memo of the generated commands (see memoized), None if memoSize is 0 or None
+    self.memo = collections.OrderedDict() if memoSize else None
+    self.memoSize = memoSize
+    self.memoHits = self.memoMisses = self.memoUncached = 0
 
 
   def __enter__(self):
@@ -45,13 +210,47 @@ class MacroContext():
 
   @contextmanager
   def lockTemp(self, cell):
-    self.LOCKED.append(cell)
-    yield cell
-    self.LOCKED.remove(cell)
+    self.LOCKED[cell] += 1
+    try: yield cell
+    finally:
+      self.LOCKED[cell] -= 1
+      if not self.LOCKED[cell]: del self.LOCKED[cell]
 
   def getCurPos(self):
     return self._curPos
 
+  def memoInfo(self):
+    """
+    :return: MemoInfo, statistics of the memo
+    """
+
+    return MemoInfo(self.memoHits, self.memoMisses, self.memoUncached, self.memoSize, len(self.memo) if self.memo is not None else 0)
+
+  def wrap(self, val):
+    """
+    :param val: value (or difference of values)
+    :return: val modulo the cell size, as the value closest to 0 (e.g. 255 -> -1 for 8 bit cells)
+    """
+
+    half = self.cellSize // 2
+    return (val + half) % self.cellSize - half
+
+
+  def emit(self, name, cmds):
+    """
+    Wraps cmds into an IR MacroCall, recording the head positions before and after them.
+    The commands can be either a string of bf code, or another macro
+
+    :param name: name of the MacroCall (usually the macro or opcode name)
+    :param cmds: cmds to wrap
+    :return: ir.MacroCall
+    """
+
+    startPos = self._curPos
+    if callable(cmds): cmds = cmds(self)
+
+    return ir.MacroCall(name, startPos=startPos, endPos=self._curPos, bf=cmds)
+
 
   def repeat(self, cmds, repeats):
     """
@@ -63,10 +262,8 @@ class MacroContext():
     :return: bf command
     """
 
-    cmdsOrg = cmds
-    if not callable(cmds): cmds = lambda s: cmdsOrg
-
     if repeats < 0: raise RepeatMacroRepeatsError(repeats)
+    elif not callable(cmds): return cmds * repeats
     else:
       bf = ''
       for i in range(repeats):
@@ -85,6 +282,7 @@ class MacroContext():
     """
 
     dist = pos - self._curPos
+    if dist and self.transitions is not None: self.transitions[(self.CELLS[self._curPos], self.CELLS[pos])] += self.transitionWeight
     self._curPos = pos
 
     if dist < 0: cmdString = '<'
@@ -101,7 +299,7 @@ class MacroContext():
     :return: brainfuck commands to move the head
     """
 
-    pos = self.CELLS.index(cell)
+    pos = self.layout.index(cell)
     return self.moveToPos(pos)
 
 
@@ -149,18 +347,7 @@ class MacroContext():
 
 
 
-    if direction >= 0:
-      step = 1
-      stop = len(self.CELLS)
-
-    else:
-      step = -1
-      stop = 0
-
-    index = next((i for i in range(self.CELLS.index(cell)+step, stop, step) if (self.CELLS[i] in self.TEMPS and not self.CELLS[i] in self.LOCKED)), None)
-
-    if index: return self.CELLS[index]
-    else: return None
+    return self.layout.findTemp(self.layout.index(cell), direction, self.LOCKED)
 
 
   def getClosestTemp(self, cell=None, directionCell=None):
@@ -180,13 +367,13 @@ class MacroContext():
       c = self._curPos
       cell = self.CELLS[c]
 
-    else: c = self.CELLS.index(cell)
+    else: c = self.layout.index(cell)
 
     if not directionCell:
       d = c+1
       directionCell = self.CELLS[d]
 
-    else:  d = self.CELLS.index(directionCell)
+    else:  d = self.layout.index(directionCell)
 
     direction = d-c
 
@@ -209,10 +396,11 @@ class MacroContext():
     """
 
     diff = toVal - fromVal
+    half = self.cellSize // 2
 
     if diff == 0: return ''
-    elif diff > 128: diff -= 256
-    elif diff < -128: diff += 256
+    elif diff > half: diff -= self.cellSize
+    elif diff < -half: diff += self.cellSize
 
     if diff > 0: return self.inc(dest=dest, val=diff)
     elif diff < 0: return self.dec(dest=dest, val=abs(diff))
@@ -228,7 +416,7 @@ class MacroContext():
     """
 
     if not dest: return '[-]' + self.setFromTo(0, val)
-    return self.atCell(cell=dest, cmds='[-]' + self.setFromTo(0, val))
+    return self.atCell(dest, '[-]') + self.setFromTo(0, val, dest=dest)
 
 
   def inc(self, dest=None, val=1):
@@ -241,10 +429,8 @@ class MacroContext():
     :return: brainfuck commands
     """
 
-    cmds = self.repeat('+', val)
-
-    if not dest: return cmds
-    else: return self.atCell(dest, cmds)
+    if not dest: return self.repeat('+', val)
+    else: return self.addConst(dest, val)
 
 
   def dec(self, dest=None, val=1):
@@ -257,9 +443,67 @@ class MacroContext():
     :return: brainfuck commands
     """
 
-    cmds = self.repeat('-', val)
-    if not dest: return cmds
-    else: return self.atCell(dest, cmds)
+    if not dest: return self.repeat('-', val)
+    else: return self.addConst(dest, -val)
+
+
+  @memoized
+  def addConst(self, dest, val):
+    """
+    Add val (can be negative) to dest.
+    Depending on the cost model, this is done with increments / decrements or with a multiplication loop
+    using a free temp cell next to dest, e.g. '++++++++[>+++++++++++<-]>' (see constantPlan)
+
+    :param dest: cell to add to
+    :param val: value to add
+    :return: brainfuck commands
+    """
+
+    val = self.wrap(val)
+    best = None
+    if self.costModel is not None and abs(val) > 9:
+      d = self.layout.index(dest)
+      for direction in (1, -1):                   # closest free temp cells on both sides; the cheaper one is used
+        temp = self.findTemp(dest, direction)
+        if temp is None: continue
+
+        t = self.layout.index(temp)
+        cost, plan = constantPlan(val, abs(t - self._curPos), abs(t - d), abs(d - self._curPos), self.costModel, self.cellSize)
+        if plan is not None and (best is None or cost < best[0]): best = cost, plan, temp
+
+    if best is None: return self.atCell(dest, _increments(val))
+
+    cost, (a, b, c), temp = best
+    with self.lockTemp(temp):
+      bf = self.atCell(temp, self.repeat('+', a))
+      bf += self.loop(lambda s: '-' + s.atCell(dest, _increments(b)) + s.moveToCell(temp))
+      bf += self.atCell(dest, _increments(c))
+
+    return bf
+
+
+  def addConstRelative(self, val, tempOffset):
+    """
+    Add val (can be negative) to the current cell, like addConst; the cell tempOffset cells away is used as temp cell
+    and has to be 0. The head position is neither used nor changed, so this can be used where it is unknown (e.g. atStackEnd)
+
+    :param val: value to add
+    :param tempOffset: position of the temp cell, relative to the current cell
+    :return: brainfuck commands
+    """
+
+    val = self.wrap(val)
+    plan = None
+    if self.costModel is not None and abs(val) > 9:
+      cost, plan = constantPlan(val, abs(tempOffset), abs(tempOffset), 0, self.costModel, self.cellSize)
+
+    if plan is None: return _increments(val)
+
+    a, b, c = plan
+    there = ('>' if tempOffset > 0 else '<') * abs(tempOffset)
+    back = ('<' if tempOffset > 0 else '>') * abs(tempOffset)
+
+    return there + '+' * a + '[-' + back + _increments(b) + there + ']' + back + _increments(c)
 
 
   def loop(self, cmds):
@@ -276,6 +520,7 @@ class MacroContext():
 
   
 
+  @memoized
   def doCellTimes(self, count, cmds, dest=None, destructive=False, **kwargs):
     """
     Repeat cmds at dest as often as determined by the contents of cell count.
@@ -335,7 +580,8 @@ class MacroContext():
 
     return self.doCellTimes(source, self.dec(), dest=dest, **kwargs)
 
-  def mulCell(self, dest, type, a, b):
+  @memoized
+  def mulCell(self, dest, type, a, b, clear=True, dead=()):
     """
     Multiply a and b, write result into dest
     a is a cell, b can be either a cell or a value
@@ -344,6 +590,8 @@ class MacroContext():
     :param type: type of a and b, can be either 'RR' or 'RV'
     :param a: factor 1
     :param b: factor 2
+    :param clear: whether dest has to be cleared first (False if it is known to be 0)
+    :param dead: cells whose contents need not be preserved; a is moved destructively, if it is one of them
     :return: brainfuck commands
     """
 
@@ -360,99 +608,243 @@ class MacroContext():
     if dest == a or a == b:
       with self.lockTemp(self.getClosestTemp(dest, directionCell=directionCell)) as t:
         bf = self.addCell(t, a, destructive=False)
-        bf += self.set(dest, 0)
+        if clear: bf += self.set(dest, 0)
         bf += self.doCellTimes(t, cmds, destructive=True)
 
-    else: bf = self.set(dest, 0) + self.doCellTimes(a, cmds, destructive=False)
+    else:
+      bf = self.set(dest, 0) if clear else ''
+      bf += self.doCellTimes(a, cmds, destructive=a in dead)
 
     return bf
 
 
-  def divCell(self, dest, type, a, b):
+  def divCell(self, dest, type, a, b, dead=()):
     """
     Divide a by b, write the result into dest
 
     NOTE: a/0 is 0!
 
     :param dest: destination to write the result to
+    :param type: type of a and b, can be either 'RR' or 'RV'
     :param a: dividend
     :param b: divisor
-    :param kwargs: destructive
+    :param dead: cells whose contents need not be preserved
     :return: brainfuck commands
     """
 
-    if type not in ('RV', 'RR'): raise DivMacroTypeError(type)
+    return self.divModCell(dest, None, type, a, b, dead)
 
-    if type=='RV' and b == 0: return self.set(dest, 0)      # division by 0
 
-    with self.lockTemp(self.getClosestTemp('CA')) as t:
-      bf = ''
-      if dest == a: bf += self.copyCell(t, a)
-      bf += self.set(dest, 0)
-
-
-      if type == 'RV':
-        bf += self.set('RC', 1)
-        if dest == a: bf += self.copyCell('CB', t, destructive=True)
-        else: bf += self.copyCell('CB', a)
-        bf += self.inc('CA', b)
+  @memoized
+  def divModCell(self, quotient, remainder, type, a, b, dead=()):
+    """
+    Divide a by b, write the quotient and the remainder into the given destinations (either of them can be None)
 
-        bf += self.dec(dest) + self.inc('CB', b)           # compensating for executing loop at least once, cheaper than evaluating the condition beforehand
+    The division runs in the comparison block, which is used as D R Q 0 0 (C0 C1 C2 CB CA):
+    a is counted down once; every step, D (the divisor) is counted down and R (1 + the current remainder) up,
+    when D gets 0, R is moved back to D, set to 1 again and Q is incremented:
+      -[>+>>]>[[-<+>]+>+>>]
+    The zero test '[>+>>]' ends at CB if D is not 0, and the head ends at CA either way.
+    So the code size does not depend on the divisor, it takes a iterations of a short loop and RC is not touched.
 
-        bf += self.moveToCell('RC') + '['
+    NOTE: a/0 is 0 and a%0 is a (the divisor 0 counts as the cell size)!
 
-        bf += self.inc(dest) + self.dec('CB', b)
-        bf += self.repeat(lambda s: s.ifCB(lambda s: s.inc('RC')) + s.dec('RC') + s.dec('CB') + s.inc(t), repeats=b)
-        bf += self.doCellTimes(t, lambda s: s.inc('CB'), destructive=True)
+    :param quotient: destination of the quotient
+    :param remainder: destination of the remainder
+    :param type: type of a and b, can be either 'RR' or 'RV'
+    :param a: dividend
+    :param b: divisor
+    :param dead: cells whose contents need not be preserved; a is counted down in place, if it is one of them
+    :return: brainfuck commands
+    """
 
-        bf += self.moveToCell('RC') + ']'
+    if type not in ('RV', 'RR'): raise DivMacroTypeError(type)
 
-        bf += self.set('CA', 0)
+    dests = (quotient, remainder)
+    with ExitStack() as stack:
+      if type == 'RV': bf = self.inc('C0', b)
+      else: bf = self.addCell('C0', b, destructive=(b in dead or b in dests) and b != a)
 
+      # the dividend is counted down in place, if it is not needed any more; otherwise it is moved to a temp and restored while counting
+      restore = a not in dead and a not in dests
+      if restore:
+        count = stack.enter_context(self.lockTemp(self.getClosestTemp('C0', directionCell=a)))
+        bf += self.addCell(count, a, destructive=True)
 
-      else:
-        bf += self.set('RC', 0)                   # division by 0
-        bf += self.addCell('CB', b)
-        bf += self.ifCB(lambda s: s.inc('RC'))
-        bf += self.moveToCell('RC')
-        bf += '['
+      else: count = a
 
-        if a == b: bf += self.dec() + self.inc(dest)
-        else:
-          if dest == a: bf += self.copyCell('CB', t, destructive=True)
-          else: bf += self.copyCell('CB', a)
+      bf += self.moveToCell(count) + '[-'
+      if restore: bf += self.atCell(a, '+')
+      bf += self.moveToCell('C0') + '-[>+>>]>[[-<+>]+>+>>]'
+      self._curPos = self.layout.index('CA')
+      bf += self.moveToCell(count) + ']'
 
-          bf += self.addCell('CA', b)
-          bf += self.dec(dest) + self.addCell('CB', 'CA')   # compensating for executing loop at least once, cheaper than evaluating the condition beforehand
+      bf += self.set('C0', 0)
 
-          bf += self.moveToCell('RC')
-          bf += '[' + self.inc(dest) + self.subCell('CB', 'CA')
-          bf += self.doCellTimes('CA', lambda s: s.ifCB(lambda s: s.inc('RC')) + s.dec('RC') + s.dec('CB') + s.inc(t), destructive=True)
-          bf += self.doCellTimes(t, lambda s: s.inc('CA') + s.inc('CB'), destructive=True)
-          bf += self.moveToCell('RC') + ']'
-          bf += self.set('CA', 0)
+      if quotient is None: bf += self.set('C2', 0)
+      else:
+        if quotient != a or restore: bf += self.set(quotient, 0)
+        bf += self.addCell(quotient, 'C2', destructive=True)
 
-        bf += self.moveToCell('RC') + ']'
-      bf += self.set('CB', 0) + self.set(t, 0)
+      bf += self.dec('C1')
+      if remainder is not None:
+        if remainder != a or restore: bf += self.set(remainder, 0)
+        bf += self.addCell(remainder, 'C1', destructive=True)
 
+      else: bf += self.set('C1', 0)
+      bf += self.inc('C1')
 
     return bf
 
 
-  def copyCell(self, dest, source, **kwargs):
+  @memoized
+  def copyCell(self, dest, source, clear=True, **kwargs):
     """
     Copies content of source to dest
 
     :param dest: cell to be copied to
     :param source: cell to be copied
+    :param clear: whether dest has to be cleared first (False if it is known to be 0)
     :param kwargs: destructive
     :return: brainfuck commands
     """
 
     if dest == source: return ''
+    elif not clear: return self.addCell(dest, source, **kwargs)
     else: return self.atCell(dest, '[-]') + self.addCell(dest, source, **kwargs)
 
 
+  def arrayWalk(self, array, size, index, carry=None, dead=()):
+    """
+    Moves the head to the entry of array at the index given by a cell, in O(index * log(size)) steps:
+    the index is copied to the first marker and travels along with the head, taking the bits of the index from the lowest one on.
+    At level j, the index left (the bits from j on) is halved, using the markers of the next two entries and the carry of the next one as temps;
+    if the bit was set, the index jumps 2^j entries ahead and the markers of the skipped entries are set to 1, so that the way back
+    can be found (see arrayReturn). The index left is at most index / 2^j, so carrying it costs O(index) per level;
+    at the last level, it is the bit itself. The temps never lie beyond the array, as the entry reached so far is below 2^j.
+    If carry is given, it is copied to the spare cell before the first marker and carried along, staying 2 cells before the current marker.
+    Afterwards, the head is at the marker of the entry; its position is not known at compile time.
+
+    :param array: name of the array
+    :param size: number of entries
+    :param index: cell containing the index
+    :param carry: cell to carry along, None for none
+    :param dead: cells which need not be preserved; they are moved instead of copied
+    :return: brainfuck commands
+    """
+
+    marker = memoryLayout.arrayMarker(array, 0)
+    bf = self.copyCell(marker, index, clear=False, destructive=index in dead and index != carry)
+    if carry is not None: bf += self.copyCell('{}.H1'.format(array), carry, clear=False, destructive=carry in dead)
+
+    bf += self.moveToCell(marker)
+    levels = (size - 1).bit_length()
+    for j in range(levels):
+      hop = '>' * (memoryLayout.ARRAY_STRIDE << j)
+      back = '<' * (memoryLayout.ARRAY_STRIDE << j)
+      jump = '<<[-' + hop + '+' + back + ']>>' if carry is not None else ''        # the carried cell is 2 before the marker
+      jump += '+' + '>>>+' * ((1 << j) - 1)                                     # markers left behind
+
+      if j == levels - 1: bf += '[-' + jump + '>>>]'            # the index left is the bit; the head ends at the marker
+      else:
+        # halving, 2 per round (marker of the next entry 1 as long as it runs): the bit to the carry cell, the half to the next carry cell
+        bf += '>>>+<<<[-[->>>>+<-]>>>[<<+>>->>>]<<<+<<<]>>>-'
+        bf += '>[-<<<<+>>>>]<<<'                                 # index = half, at the carry cell (the bit)
+        bf += '[-<[-' + hop + '+' + back + ']' + jump + '>>>>]<'  # bit set: the index jumps ahead; the head ends at the marker
+
+    return bf
+
+
+  def arrayReturn(self, array, carry=False):
+    """
+    Moves the head from the marker of an entry (see arrayWalk) back to the header of array, clearing the markers;
+    if carry is set, the carry cell of the entry is taken along to the first carry cell.
+
+    :param array: name of the array
+    :param carry: whether to carry the carry cell back
+    :return: brainfuck commands
+    """
+
+    if carry: bf = '<<<[->>>>[-<<<+>>>]<<<<<<<]'
+    else: bf = '<<<[-<<<]'
+
+    self._curPos = self.layout.index(array)       # the loop ends at the header, the only 0 before the markers
+    return bf
+
+
+  @memoized
+  def arrayLoad(self, dest, array, size, index, clear=True, dead=()):
+    """
+    Loads the entry of array at the index in a cell to dest: the head travels to the entry with the index (see arrayWalk),
+    copies the entry to the carry cell (using the marker as temp) and travels back, carrying the copy along.
+    The index is not checked; getting to the entry takes O(index * log(size)) steps, carrying the copy back O(index * entry).
+
+    :param dest: destination
+    :param array: name of the array
+    :param size: number of entries
+    :param index: cell containing the index
+    :param clear: whether dest has to be cleared first (False if it is known to be 0)
+    :param dead: cells which need not be preserved
+    :return: brainfuck commands
+    """
+
+    bf = self.arrayWalk(array, size, index, dead=dead)
+    bf += '>>[-<+<+>>]<<[->>+<<]'
+    bf += self.arrayReturn(array, carry=True)
+
+    if clear: bf += self.set(dest, 0)
+    bf += self.addCell(dest, memoryLayout.arrayCarry(array, 0), destructive=True)
+
+    return bf
+
+
+  @memoized
+  def arrayStore(self, array, size, index, source=None, val=0, dead=()):
+    """
+    Stores the contents of source (or val, if source is None) to the entry of array at the index in a cell:
+    the head travels to the entry, carrying the value along (see arrayWalk), writes it and travels back.
+    The index is not checked; getting to the entry takes O(index * log(size)) steps, carrying the value O(index * value).
+
+    :param array: name of the array
+    :param size: number of entries
+    :param index: cell containing the index
+    :param source: cell containing the value, None to store val
+    :param val: value to store
+    :param dead: cells which need not be preserved
+    :return: brainfuck commands
+    """
+
+    bf = self.arrayWalk(array, size, index, carry=source, dead=dead)
+    if source is not None: bf += '>>[-]<<<<[->>>>+<<<<]>>'         # the value is carried right before the marker
+    else: bf += '>>[-]{}<<'.format(self.addConstRelative(val, -1))          # the carry cell is 0
+    bf += self.arrayReturn(array)
+
+    return bf
+
+
+  @memoized
+  def arrayFill(self, array, size, source=None, val=0, destructive=False):
+    """
+    Sets all entries of array to the contents of source (or val, if source is None).
+    The entries are addressed directly; a source is added to all of them in a single loop.
+
+    :param array: name of the array
+    :param size: number of entries
+    :param source: cell containing the value, None to set val
+    :param val: value to set
+    :param destructive: if True, source will be set to 0
+    :return: brainfuck commands
+    """
+
+    values = [memoryLayout.arrayValue(array, i) for i in range(size)]
+    if source is None: return ''.join(self.atCell(cell, '[-]' + self.addConstRelative(val, -1)) for cell in values)
+
+    bf = ''.join(self.atCell(cell, '[-]') for cell in values)
+    bf += self.doCellTimes(source, lambda s: ''.join(s.atCell(cell, '+') for cell in values), destructive=destructive)
+
+    return bf
+
+
   def printText(self, text):
     """
     Prints given text by converting its characters to unicode literals, setting a temp cell to each of them and calling the out command
@@ -463,24 +855,139 @@ class MacroContext():
 
     bf = ''
     cur = 0
-    for nxt in bytearray(text.encode('Latin-1').decode('unicode-escape'), 'Latin-1'):
+    for nxt in textBytes(text):
       bf += self.setFromTo(cur, nxt) + '.'
       cur = nxt
 
     bf += '[-]'
 
     return bf
+
+
+  def initData(self, data):
+    """
+    Writes data into cells, which have to be 0. The cells are written from left to right, using the right neighbour
+    of each cell as temp cell (see addConstRelative); so it has to be 0 until it is written itself
+
+    :param data: list of (cell, value)
+    :return: brainfuck commands
+    """
+
+    bf = ''
+    for cell, val in data:
+      if val: bf += self.atCell(cell, self.addConstRelative(val, 1))
+
+    return bf
+
+
+  def printData(self, start, end):
+    """
+    Prints the zero terminated string stored from cell start on, by a loop
+
+    :param start: first cell of the string
+    :param end: terminating cell of the string
+    :return: brainfuck commands
+    """
+
+    bf = self.atCell(start, '[.>]')
+    self._curPos = self.layout.index(end)      # the loop ends at the terminating 0
+
+    return bf
+
+
+  def printTextPrimed(self, text, cells, counter):
+    """
+    Prints text using several cells, which are first primed to the bases of the character classes in text (see primingBases)
+    by a single multiplication loop, counted down in counter. Each character is then printed from the cell for which
+    moving there and adjusting its value is cheapest. All cells have to be 0, and are 0 afterwards.
+
+    :param text: text to be printed
+    :param cells: cells to print with
+    :param counter: cell to count the priming loop in
+    :return: brainfuck commands, loop body of the priming loop
+    """
+
+    chars = textBytes(text)
+    bases = primingBases(chars, len(cells))
+    cells = cells[:len(bases)]
+
+    a = min(range(2, 17), key=lambda a: a + sum(abs(round(base / a)) + abs(base - a * round(base / a)) for base in bases))
+    factors = [round(base / a) for base in bases]
+    values = {c: a * f for c, f in zip(cells, factors)}
+
+    bf = self.atCell(counter, self.repeat('+', a))
+    body = '-' + ''.join(self.atCell(c, _increments(f)) for c, f in zip(cells, factors)) + self.moveToCell(counter)
+    bf += self.loop(body)
+
+    for ch in chars:
+      cell = min(cells, key=lambda c: abs(self.layout.index(c) - self._curPos) + abs(self.wrap(ch - values[c])))
+      bf += self.atCell(cell, self.setFromTo(values[cell], ch) + '.')
+      values[cell] = ch
+
+    cells = sorted(cells, key=self.layout.index)
+    if abs(self.layout.index(cells[-1]) - self._curPos) < abs(self.layout.index(cells[0]) - self._curPos): cells.reverse()
+    for c in cells:
+      if values[c]: bf += self.atCell(c, '[-]')
+
+    return bf, body
+
+
+  @memoized
+  def printTextOptimised(self, text):
+    """
+    Prints text at the closest temp cells: depending on the cost model, either using a single cell (printText)
+    or several primed cells (printTextPrimed)
+
+    :param text: text to be printed
+    :return: brainfuck commands
+    """
+
+    start = self._curPos
+    bf = self.moveToCell(self.getClosestTemp()) + self.printText(text)
+    if self.costModel is None or not primingBases(textBytes(text), MAX_PRINT_CELLS): return bf
+
+    end = self._curPos
+    self._curPos = start
+
+    with ExitStack() as locks:
+      temps = []
+      for i in range(MAX_PRINT_CELLS + 1):
+        t = self.getClosestTemp(temps[-1] if temps else None)
+        if t is None: break
+        temps.append(locks.enter_context(self.lockTemp(t)))
+
+      if len(temps) < 2:
+        self._curPos = end
+        return bf
+
+      temps.sort(key=self.layout.index)
+      if abs(self.layout.index(temps[-1]) - start) < abs(self.layout.index(temps[0]) - start): temps.reverse()
+      primed, body = self.printTextPrimed(text, temps[1:], temps[0])
+
+    if self.costModel == 'steps':
+      a = primed.count('+', 0, primed.index('['))
+      cost, primedCost = len(bf), len(primed) + (a - 1) * (len(body) + 1)
+
+    else: cost, primedCost = len(bf), len(primed)
+
+    if primedCost < cost: return primed
+
+    self._curPos = end
+    return bf
   
-  def comparison(self, compType, a, b, mode, **kwargs):
+  @memoized
+  def comparison(self, compType, a, b, mode, dead=()):
     """
     Perform a comparison of given registers
     Mode has to be in ('LT', 'LE', 'GT', 'GE)
+    Both operands are counted down at once in CB and CA, so this takes O(min(a, b)) iterations of a short loop;
+    if the layout does not allow for it (see comparisonZeroCell), comparisonCounting is used
     
     :param a: first register to compare
     :param b: second register or value to compare
     :param compType: type of comparison, either 'RR' or 'RV'
     :param mode: comparison mode
-    :param kwargs: destructive
+    :param dead: cells whose contents need not be preserved; registers among them are moved destructively
     :return: brainfuck commands
     """
 
@@ -488,6 +995,81 @@ class MacroContext():
       if mode in ('LT', 'GT'): return self.set('RC', 0)
       if mode in ('LE', 'GE'): return self.set('RC', 1)
 
+    if compType not in ('RR', 'RV'): raise ComparisonMacroTypeError(compType)
+
+    zero = self.comparisonZeroCell()
+    if zero is None: return self.comparisonCounting(compType, a, b, mode, dead)
+
+    # every mode is computed as CB <= CA-1, possibly negated: a <= b, b <= a, not a <= b (a > b) or not b <= a (a < b)
+    if mode in ('LE', 'GT'): x, y = (a, False), (b, compType == 'RV')
+    else: x, y = (b, compType == 'RV'), (a, False)
+    negate = mode in ('LT', 'GT')
+
+    # registers are moved into CB and CA and moved back while counting down (and afterwards, what is left);
+    # dead registers and RC (which is overwritten anyway) are not restored
+    restoreX = not x[1] and x[0] not in dead and x[0] != 'RC'
+    restoreY = not y[1] and y[0] not in dead and y[0] != 'RC'
+
+    with ExitStack() as stack:
+      if zero != 'RC': stack.enter_context(self.lockTemp(zero))
+
+      if x[1]: bf = self.inc('CB', x[0])
+      else: bf = self.addCell('CB', x[0], destructive=True)
+
+      if y[1]: bf += self.inc('CA', y[0] + 1)      # CA = y+1; for the maximum y it is 0, which counts as the cell size below
+      else: bf += self.addCell('CA', y[0], destructive=True) + self.inc('CA')
+
+      bf += self.set('RC', 0)                       # after loading, RC may be compared itself
+
+      # count both down, until one of them gets 0: the zero test '[>]' stops at the 0 right of CA while CA is not 0,
+      # so the loop ends at CB if CB gets 0 first (x < y+1), and at C2 if CA does (x >= y+1)
+      bf += self.moveToCell('CB') + '[-'
+      if restoreX: bf += self.atCell(x[0], '+')
+      bf += self.atCell('CA', '-')
+      if restoreY: bf += self.atCell(y[0], '+') + self.moveToCell('CA')
+      bf += '[>]<<]'
+
+      # from C2, '<' leads to C1 (which is 1): the result is marked and the loop left at C2; from CB, '<' leads to C2 (which is 0)
+      self._curPos = self.layout.index('C1')
+      bf += '<[' + (self.inc('RC') if negate else self.dec('RC')) + self.moveToCell('C2') + ']'
+      self._curPos = self.layout.index('C2')
+
+      if not negate: bf += self.inc('RC')
+
+      if restoreY: bf += self.addCell(y[0], 'CA', destructive=True) + self.dec(y[0])
+      else: bf += self.set('CA', 0)
+
+      if restoreX: bf += self.addCell(x[0], 'CB', destructive=True)
+      else: bf += self.set('CB', 0)
+
+    return bf
+
+
+  def comparisonZeroCell(self):
+    """
+    The fast comparison needs C1, C2, CB and CA to be adjacent and a cell right of CA which can be cleared: RC or a free temp
+
+    :return: that cell, None if the layout does not allow for the fast comparison
+    """
+
+    try: positions = [self.layout.index(c) for c in ('C1', 'C2', 'CB', 'CA')]
+    except ValueError: return None
+
+    if positions != list(range(positions[0], positions[0] + 4)) or positions[3] + 1 >= len(self.layout.cells): return None
+
+    zero = self.layout.cells[positions[3] + 1]
+    if zero == 'RC' or (zero in self.TEMPS and not self.LOCKED[zero]): return zero
+    return None
+
+
+  def comparisonCounting(self, compType, a, b, mode, dead=()):
+    """
+    Comparison for layouts which do not allow for the fast one (see comparison):
+    counts CA down and tests CB in every step, so it needs O(a) iterations
+
+    :return: brainfuck commands
+    """
+
     bf = self.set('RC', 1)
 
     if mode[0] == 'L':
@@ -499,10 +1081,9 @@ class MacroContext():
       destA = 'CB'
       destB = 'CA'
 
-    bf += self.addCell(destA, a, **kwargs)
-    if   compType == 'RR': bf += self.addCell(destB, b, **kwargs)
+    bf += self.addCell(destA, a, destructive=a in dead)
+    if   compType == 'RR': bf += self.addCell(destB, b, destructive=b in dead)
     elif compType == 'RV': bf += self.inc(destB, b)
-    else: raise ComparisonMacroTypeError(compType)
 
     if mode[1] == 'T': bf += self.inc('CA')   # the test is for CA <= CB; for CA < CB, add 1 to CA
 
@@ -514,6 +1095,7 @@ class MacroContext():
     return bf
 
 
+  @memoized
   def ifCB(self, cmds):
     """
     Execute cmds if CB is not 0
@@ -526,7 +1108,7 @@ class MacroContext():
     if callable(cmds): cmds = cmds(self)
 
     bf += '[{}]<<[<]'.format(cmds + self.moveToCell('C2'))   # note: this has an undefined position in it
-    self._curPos = self.CELLS.index('C0')
+    self._curPos = self.layout.index('C0')
 
     return bf
 
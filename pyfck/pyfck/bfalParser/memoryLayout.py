@@ -5,14 +5,21 @@ This file defines the memory on which the assembly operates:
   - REGISTERS : cells which function as registers
   - TEMPS     : cells which are internally used for temporary storage (for algorithms)
   - RESERVED  : other cells which are reserved for the system
+  - arrays    : declared by the program (see arrayCells); placed before the stack by the parser
 
 The final layout is determined by the CELLS list; corresponding to the memory as seen by the brainfuck interpreter
 
-This file also defines the initial value for the memory pointer - usually 0 (first cell)
+This file also defines the initial value for the memory pointer - usually 0 (first cell),
+and the width of the cells (CELL_BITS), which is shared by the parser, the macros and the interpreter
+
+A Layout indexes a list of cells, to look up positions and the closest temp cells quickly.
 
 Marius Lambacher, 2017
 '''
 
+import bisect
+import functools
+
 
 COMPARISON = ['C0', 'C1', 'C2', 'CB', 'CA']
 REGISTERS = ['RC', 'R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7']
@@ -32,4 +39,103 @@ CELLS += STACK
 
 
 ### starting position of memory pointer
-START_POS = 0
\ No newline at end of file
+START_POS = 0
+
+### width of a cell in bits (8, 16 or 32); values wrap around modulo 2**CELL_BITS
+CELL_BITS = 8
+
+
+### arrays: a header cell and two spare cells (the first one starts the value carried by MacroContext.arrayWalk), followed by a (marker, carry, value) triple per entry;
+### the header, markers and carries are 0 between instructions, so the head can travel along the markers (see MacroContext.arrayLoad)
+ARRAY_STRIDE = 3
+
+
+def arrayCells(name, size):
+  '''
+  :param name: name of the array
+  :param size: number of entries
+  :return: cells of the array, in the order they are placed in
+  '''
+
+  cells = [name, '{}.H1'.format(name), '{}.H2'.format(name)]
+  for i in range(size): cells += [arrayMarker(name, i), arrayCarry(name, i), arrayValue(name, i)]
+  return cells
+
+
+def arrayMarker(name, i): return '{}.M{}'.format(name, i)
+def arrayCarry(name, i): return '{}.C{}'.format(name, i)
+def arrayValue(name, i): return '{}.{}'.format(name, i)
+
+
+
+class Layout:
+  def __init__(self, cells, temps):
+    """
+    Creates an index over a layout: the position of each cell, and the sorted positions of the temp cells
+
+    :param cells: cells of the layout, as in CELLS
+    :param temps: temp cells, as in TEMPS
+    """
+
+    self.cells = tuple(cells)
+    self.positions = {}
+    for i, cell in enumerate(self.cells): self.positions.setdefault(cell, i)
+
+    temps = set(temps)
+    self.tempPositions = [i for i, cell in enumerate(self.cells) if cell in temps]
+
+
+  def index(self, cell):
+    """
+    :param cell: cell to find
+    :return: position of cell (the first one, if it occurs multiple times)
+    """
+
+    try: return self.positions[cell]
+    except KeyError: raise ValueError('{!r} is not in the layout'.format(cell))
+
+
+  def findTemp(self, pos, direction=1, locked=()):
+    """
+    Find the closest temp cell to pos, which is not locked.
+    If direction >= 0, it is searched to the right of pos; else to the left (excluding the first cell).
+    The search is a bisection over the temp positions, followed by skipping the locked ones; so it is fast with few locked cells.
+
+    :param pos: position to start the search at (excluded)
+    :param direction: direction in which the cells are searched
+    :param locked: cells to be excluded
+    :return: temp cell if found, None if none is found
+    """
+
+    temps = self.tempPositions
+    if direction >= 0:
+      i = bisect.bisect_right(temps, pos)
+      while i < len(temps) and self.cells[temps[i]] in locked: i += 1
+      if i < len(temps): return self.cells[temps[i]]
+
+    else:
+      i = bisect.bisect_left(temps, pos) - 1
+      while i >= 0 and self.cells[temps[i]] in locked: i -= 1
+      if i >= 0 and temps[i] > 0: return self.cells[temps[i]]
+
+    return None
+
+
+
+@functools.lru_cache(maxsize=32)
+def _getLayout(cells, temps):
+  return Layout(cells, temps)
+
+
+def getLayout(cells=None, temps=None):
+  """
+  Layout for the given cells and temps; layouts are cached, so that they are only built once
+
+  :param cells: cells of the layout, CELLS if None
+  :param temps: temp cells, TEMPS if None
+  :return: Layout
+  """
+
+  if cells is None: cells = CELLS
+  if temps is None: temps = TEMPS
+  return _getLayout(tuple(cells), tuple(temps))
@@ -6,6 +6,7 @@ An opcode consists of the following:
   - an integer entry in the OPCODES enum; loosely sorted by type
   - an identifier defined in the OPCODE_IDENTIFIERS dict; used for for calling it in the assembly code
   - a type definition in OPCODE_TYPES; consisting of the corresponding opcode class and a tuple of possible argument types
+  - a handler for each of its types, compiling it to brainfuck; registered in handlers.HANDLERS
 
 For a condition, the definition is rather similar.
 
@@ -43,6 +44,10 @@ class OPCODES(Enum):
 
   PUSH = 102
   POP = 103
+  LOAD = 104
+  STORE = 105
+  FILL = 106
+  CLEAR = 107
 
   INC = 110
   DEC = 111
@@ -50,6 +55,8 @@ class OPCODES(Enum):
   SUB = 113
   MUL = 114
   DIV = 115
+  MOD = 116
+  DIVMOD = 117
 
   TRUE = 120
   FALSE = 121
@@ -74,6 +81,7 @@ class OPCODES(Enum):
 
   ALIAS = 400
   PRINT = 401
+  ARRAY = 402
 
 
 OPCODE_IDENTIFIERS = {
@@ -82,6 +90,10 @@ OPCODE_IDENTIFIERS = {
 
   'PUSH': OPCODES.PUSH,
   'POP': OPCODES.POP,
+  'LOAD': OPCODES.LOAD,
+  'STORE': OPCODES.STORE,
+  'FILL': OPCODES.FILL,
+  'CLR': OPCODES.CLEAR,
 
   'INC': OPCODES.INC,
   'DEC': OPCODES.DEC,
@@ -89,6 +101,8 @@ OPCODE_IDENTIFIERS = {
   'SUB': OPCODES.SUB,
   'MUL': OPCODES.MUL,
   'DIV': OPCODES.DIV,
+  'MOD': OPCODES.MOD,
+  'DIVMOD': OPCODES.DIVMOD,
 
   'TRUE': OPCODES.TRUE,
   'FALSE': OPCODES.FALSE,
@@ -112,7 +126,8 @@ OPCODE_IDENTIFIERS = {
   'ENDIF': OPCODES.END_IF,
 
   'ALIAS': OPCODES.ALIAS,
-  'PRT': OPCODES.PRINT
+  'PRT': OPCODES.PRINT,
+  'ARRAY': OPCODES.ARRAY
 }
 
 OPCODE_TYPES = {
@@ -121,6 +136,10 @@ OPCODE_TYPES = {
 
   OPCODES.PUSH: (OPCODE_CLASSES.INSTRUCTION, ('V', 'R')),
   OPCODES.POP: (OPCODE_CLASSES.INSTRUCTION, ('R',)),
+  OPCODES.LOAD: (OPCODE_CLASSES.INSTRUCTION, ('RTV', 'RTR')),                  # destination, array, index
+  OPCODES.STORE: (OPCODE_CLASSES.INSTRUCTION, ('TVV', 'TVR', 'TRV', 'TRR')),   # array, index, value
+  OPCODES.FILL: (OPCODE_CLASSES.INSTRUCTION, ('TV', 'TR')),
+  OPCODES.CLEAR: (OPCODE_CLASSES.INSTRUCTION, ('T',)),
 
   OPCODES.INC: (OPCODE_CLASSES.INSTRUCTION, ('R', 'RV', 'RR')),
   OPCODES.DEC: (OPCODE_CLASSES.INSTRUCTION, ('R', 'RV', 'RR')),
@@ -128,6 +147,8 @@ OPCODE_TYPES = {
   OPCODES.SUB: (OPCODE_CLASSES.INSTRUCTION, ('RVV', 'RRV', 'RRR')),
   OPCODES.MUL: (OPCODE_CLASSES.INSTRUCTION, ('RVV', 'RRV', 'RRR')),
   OPCODES.DIV: (OPCODE_CLASSES.INSTRUCTION, ('RVV', 'RRV', 'RRR')),
+  OPCODES.MOD: (OPCODE_CLASSES.INSTRUCTION, ('RVV', 'RRV', 'RRR')),
+  OPCODES.DIVMOD: (OPCODE_CLASSES.INSTRUCTION, ('RRVV', 'RRRV', 'RRRR')),     # quotient, remainder, dividend, divisor
 
   OPCODES.TRUE: (OPCODE_CLASSES.INSTRUCTION, ('',)),
   OPCODES.FALSE: (OPCODE_CLASSES.INSTRUCTION, ('',)),
@@ -151,5 +172,99 @@ OPCODE_TYPES = {
   OPCODES.END_IF: (OPCODE_CLASSES.CONTROLFLOW_END, ('',)),
 
   OPCODES.ALIAS: (OPCODE_CLASSES.SPECIAL, ('TV', 'TR')),
-  OPCODES.PRINT: (OPCODE_CLASSES.SPECIAL, ('T',))
+  OPCODES.PRINT: (OPCODE_CLASSES.SPECIAL, ('T',)),
+  OPCODES.ARRAY: (OPCODE_CLASSES.SPECIAL, ('TV',))                             # name, size
+}
+
+
+### ends of the control flow blocks, by their start
+
+CONTROLFLOW_BLOCK_ENDS = {
+  OPCODES.LOOP: OPCODES.END_LOOP,
+  OPCODES.IF: OPCODES.END_IF
+}
+
+### compile time semantics of instructions, used to track the values of registers (see Parser.trackValues)
+### (plain functions instead of lambdas, so parsers can be sent to worker processes)
+
+def _set(a, b): return b
+def _zero(a): return 0
+def _inc(a, b=1): return a + b
+def _dec(a, b=1): return a - b
+def _add(a, b, c): return b + c
+def _sub(a, b, c): return b - c
+def _mul(a, b, c): return b * c
+def _div(a, b, c): return b // c if c != 0 else 0          # a/0 is 0, as in macros.divModCell
+def _mod(a, b, c): return b % c if c != 0 else b           # a%0 is a, as in macros.divModCell
+def _divModQuotient(q, r, a, b): return _div(q, a, b)
+def _divModRemainder(q, r, a, b): return _mod(r, a, b)
+
+def _true(): return 1
+def _false(): return 0
+def _not(rc): return int(rc == 0)                           # computed from the condition register itself
+def _isZero(a): return int(a == 0)
+def _notZero(a): return int(a != 0)
+def _equal(a, b): return int(a == b)
+def _notEqual(a, b): return int(a != b)
+def _greater(a, b): return int(a > b)
+def _greaterEqual(a, b): return int(a >= b)
+def _less(a, b): return int(a < b)
+def _lessEqual(a, b): return int(a <= b)
+
+# instructions writing their first argument: value of the destination, computed from the values of all arguments
+DESTINATION_VALUES = {
+  OPCODES.SET: _set,
+  OPCODES.STZ: _zero,
+  OPCODES.INC: _inc,
+  OPCODES.DEC: _dec,
+  OPCODES.ADD: _add,
+  OPCODES.SUB: _sub,
+  OPCODES.MUL: _mul,
+  OPCODES.DIV: _div,
+  OPCODES.MOD: _mod,
+  OPCODES.DIVMOD: _divModQuotient,
+  OPCODES.POP: None,                                      # not known at compile time
+  OPCODES.LOAD: None,
+  OPCODES.INPUT: None
+}
+
+# instructions writing their second argument as well: its value, computed from the values of all arguments
+SECOND_DESTINATION_VALUES = {
+  OPCODES.DIVMOD: _divModRemainder
+}
+
+# instructions changing the depth of the stack: by how much
+STACK_EFFECTS = {
+  OPCODES.PUSH: 1,
+  OPCODES.POP: -1
+}
+
+# instructions depending on the old value of their destination
+SELF_REFERENCING = (OPCODES.INC, OPCODES.DEC)
+
+# instructions writing the condition register: its value, computed from the values of all arguments
+CONDITION_VALUES = {
+  OPCODES.TRUE: _true,
+  OPCODES.FALSE: _false,
+  OPCODES.NOT: _not,
+  OPCODES.ZERO: _isZero,
+  OPCODES.NOT_ZERO: _notZero,
+  OPCODES.EQUAL: _equal,
+  OPCODES.NOT_EQUAL: _notEqual,
+  OPCODES.GREATER: _greater,
+  OPCODES.GREATER_EQUAL: _greaterEqual,
+  OPCODES.LESS: _less,
+  OPCODES.LESS_EQUAL: _lessEqual
+}
+
+# instructions whose (first two) source arguments can be swapped: opcode to use for the swapped arguments
+SWAPPED_OPCODES = {
+  OPCODES.ADD: OPCODES.ADD,
+  OPCODES.MUL: OPCODES.MUL,
+  OPCODES.EQUAL: OPCODES.EQUAL,
+  OPCODES.NOT_EQUAL: OPCODES.NOT_EQUAL,
+  OPCODES.GREATER: OPCODES.LESS,
+  OPCODES.GREATER_EQUAL: OPCODES.LESS_EQUAL,
+  OPCODES.LESS: OPCODES.GREATER,
+  OPCODES.LESS_EQUAL: OPCODES.GREATER_EQUAL
 }
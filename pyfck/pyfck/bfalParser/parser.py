@@ -6,19 +6,66 @@ The Parser is the main class to convert BFAL code to brainfuck.
 
 Marius Lambacher, 2017
 '''
-import re
+import collections
+import concurrent.futures
+import copy
+import functools
+import os
 import sys
 
 from ..util import *
+from . import cache
 from . import macros
 from . import memoryLayout
 from . import opcodes
+from . import ir
+from . import peephole
+from . import layoutOptimiser
+from . import handlers
+from . import tokenizer
+from . import preprocessor
 from .errors import *
 
 
 
+def _compileSegment(parser, lines, entry, dead):
+  """
+  Compiles a segment of lines starting at entry (a state), emits and optimises its code (see peephole.optimisePart);
+  run in the worker processes of Parser.compileParallel, so only code and the exit state travel back, no units
+  """
+
+  parser.TOKENS = dict(zip(lines, tokenizer.tokenize('\n'.join(lines))))
+  with parser.macroContext(entry[0]) as mc:
+    parser.restoreState(mc, entry)
+    units = parser.compileUnits(mc, lines, dead=dead)
+
+  bf = parser.emitUnits(units)
+  return (bf,) + peephole.optimisePart(bf) + (units[-1].exit if units else entry,)
+
+
+
+def _readLines(path):
+  """Reads the lines of a file one by one; rescans the source of Parser.compileFile"""
+
+  with open(path, encoding='utf-8') as f: yield from f
+
+
+
+class CompileUnit:
+  """A compiled line of assembly, together with the states before (entry) and after (exit) it and the registers dead after it"""
+
+  def __init__(self, line, entry, exit, cmdClass=None, call=None, dead=frozenset()):
+    self.line = line
+    self.entry = entry
+    self.exit = exit
+    self.cmdClass = cmdClass
+    self.call = call
+    self.dead = dead
+
+
+
 class Parser:
-  def __init__(self):
+  def __init__(self, cache=None):
     ###  aliases as defined with the 'ALIAS' command
     self.ALIASES = {}
 
@@ -28,6 +75,16 @@ class Parser:
     self.OPCODES = opcodes.OPCODES
     self.OPCODE_IDENTIFIERS = opcodes.OPCODE_IDENTIFIERS
     self.OPCODE_TYPES = opcodes.OPCODE_TYPES
+    self.CONTROLFLOW_BLOCK_ENDS = opcodes.CONTROLFLOW_BLOCK_ENDS
+    self.DESTINATION_VALUES = opcodes.DESTINATION_VALUES
+    self.SECOND_DESTINATION_VALUES = opcodes.SECOND_DESTINATION_VALUES
+    self.SELF_REFERENCING = opcodes.SELF_REFERENCING
+    self.STACK_EFFECTS = opcodes.STACK_EFFECTS
+    self.CONDITION_VALUES = opcodes.CONDITION_VALUES
+    self.SWAPPED_OPCODES = opcodes.SWAPPED_OPCODES
+
+    ###  handlers compiling the commands ((opcode, type) -> handler), see handlers
+    self.HANDLERS = handlers.HANDLERS
 
     self.REGISTERS = memoryLayout.REGISTERS
     self.TEMPS = memoryLayout.TEMPS
@@ -35,33 +92,108 @@ class Parser:
     self.CONSTANTS = memoryLayout.CONSTANTS
     self.START_POS = memoryLayout.START_POS
 
+    ###  optimisation passes run over the IR (e.g. ir.foldRuns); local passes (see ir.localPass) are run on each command
+    ###  as soon as it is compiled (see emitCall), the others over the whole program; the local passes' results per command
+    self.PASSES = [ir.foldRuns]
+    self.PASSED = {}
+
+    ###  stack of block ends of the open control flow blocks
+    self.cfBlockEnds = []
+
+    ###  registers whose values are known at compile time (register -> value), see trackValues
+    self.KNOWN = {}
+    self.trackRegisters = True
+
+    ###  if set, registers which are dead (overwritten before being read again) are moved destructively, see deadRegisters
+    self.destructiveTransfers = True
+
+    ###  if set and the depth of the stack is known at compile time at every line (see stackDepths),
+    ###  stack entry i is kept in the cell 'STACK.<i>' and PUSH and POP access it directly, instead of scanning the stack;
+    ###  DEPTH is the current depth, None if the stack is scanned, STACK_SLOTS the number of those cells
+    self.staticStack = True
+    self.DEPTH = None
+    self.STACK_SLOTS = 0
+
+    ###  optional cache.CompileCache, consulted by compile
+    self.cache = cache
+
+    ###  compilation units of the last compilation; if incremental is set, they are reused by the next compilation with the same options
+    self.units = []
+    self.incremental = False
+    self._aliasState = None
+
+    ###  number of worker processes for compiling large sources in parallel (see compileParallel); None: compile serially
+    self.workers = None
+    self.parallelMinLines = 2000
+
+    ###  cost model for generating constants (see macros.COST_MODELS), None: always use increments
+    self.costModel = 'size'
+
+    ###  number of entries of the memo of generated macro commands (see macros.memoized), 0: no memo;
+    ###  the statistics of the memo of the last compilation (macros.MemoInfo)
+    self.macroMemoSize = macros.MEMO_SIZE
+    self.MEMO_INFO = None
+
+    ###  width of the cells in bits; the compiled program has to be run with cells of this width
+    self.cellBits = memoryLayout.CELL_BITS
+
+    ###  if set, strings printed by at least internMinCount PRT commands are stored once in a data region and printed from there
+    self.internStrings = False
+    self.internMinCount = 2
+
+    ###  interned strings of the current program (text -> first and terminating cell), the data region's contents
+    ###  and the layout including the stack slots and the data region
+    self.STRINGS = {}
+    self.DATA = []
+    self.PROGRAM_CELLS = self.CELLS
+
+    ###  arrays declared by the current program with 'ARRAY' (name -> size), placed before the stack (see memoryLayout.arrayCells)
+    self.ARRAYS = {}
+    self.MAX_ARRAY_SIZE = 256
+
+    ###  if set to a Counter, the transitions of the head between cells are counted while compiling (see layoutOptimiser)
+    self.transitions = None
+
+    ###  parts of the lines of the current source (line -> parts), split at once by tokenizer.tokenize; see parseCmdParts
+    ###  and the parsed commands (line -> parts, parsed command), for lines no alias applies to; see parseCommand
+    self.TOKENS = {}
+    self.PARSED = {}
+
+    ###  user defined macros of the current program (name -> preprocessor.Macro) and its included files (absolute path -> text), see preprocess;
+    ###  the lines expanded from macro calls (first line -> list of (end, key), outermost first) and their compiled units
+    ###  (key, entry state, dead registers -> units), which are reused for equal calls (see compileUnits); those of included files
+    ###  are kept for the following compilations, as long as the options they were compiled with are unchanged (OPTIONS, see startProgram)
+    self.MACROS = {}
+    self.INCLUDES = {}
+    self.MACRO_CALLS = {}
+    self.EXPANSIONS = {}
+    self.OPTIONS = None
+
+    ###  file of the compiled source, paths of INCLUDE are relative to; None: relative to the working directory
+    self.sourcePath = None
+
+    ###  number of lines compileStream compiles at once and number of tokens the peephole optimiser keeps back between them
+    self.streamLines = 1024
+    self.streamWindow = peephole.WINDOW
+
 
 
   def parseCmdParts(self, cmd):
     '''
-    Splits a line of assembly into its parts.
+    Splits a line of assembly into its parts (see tokenizer).
     Splitting occurs at whitespace; though blocks enclosed by quotes (") will be treated as one part.
-    Comments beginning with '//' are ignored
+    Comments beginning with '//' are ignored.
+    The lines of the current source are looked up in TOKENS; other lines are tokenized on their own.
 
     :param cmd: command to split (string)
     :return: list of cmd parts
     '''
 
-    cmd = cmd.split('//')[0]
-    if len(cmd) == 0: return []
-
-    if cmd.count('"') % 2 != 0: raise AssemblySyntaxError('Quotation marks must be of even number')
-    cmd = cmd.split('"')
-    parts = []
-    for i, p in enumerate(cmd):
-      if p:
-        if i % 2 == 0:
-          p = p.upper().strip().split()
-          parts.extend(p)
+    parts = self.TOKENS.get(cmd)
+    if parts is None: parts = tokenizer.tokenize(cmd)[0]
+    if parts is None: raise AssemblySyntaxError('Quotation marks must be of even number')
 
-        else: parts.append(p)
-
-    return parts
+    return list(parts)
 
 
 
@@ -100,15 +232,11 @@ class Parser:
       if arg in self.ALIASES.keys(): arg = self.ALIASES[arg]
 
 
-    if arg in self.REGISTERS:
-      argType = 'R'
-    else:
-      try:
-        arg = str(litStrToInt(arg))
-        argType = 'V'
+    if arg in self.REGISTERS: return 'R', arg
 
-      except ValueError: argType = 'T'
-    return argType, arg
+    value = tokenizer.literal(arg)
+    if value is None: return 'T', arg
+    return 'V', value
 
 
 
@@ -164,11 +292,17 @@ class Parser:
     '''
     Parses a command (line of assembly).
     Will try to figure out the command class, opcode, the true type and the arguments.
+    Commands are cached in PARSED; a cached command is used, if none of its parts is an alias (at the time).
 
     :param cmd: command string (line of assembly)
     :return: cmd class, opcode, type and arguments
     '''
 
+    cached = self.PARSED.get(cmd)
+    if cached is not None and (not self.ALIASES or self.ALIASES.keys().isdisjoint(cached[0])):
+      cmdClass, opcode, realType, args = cached[1]
+      return cmdClass, opcode, realType, list(args)
+
     cmdParts = self.parseCmdParts(cmd)
     if cmdParts:
       opcode, cmdClass, possibleTypes = self.parseOpcode(cmdParts)
@@ -184,48 +318,18 @@ class Parser:
 
       if not realType in possibleTypes: self.findError(realType, possibleTypes, args)
 
-      args.extend([None] * (3 - len(args)))       # always return a list of length 3, so it can be unpacked to three variables
+      args.extend([None] * (3 - len(args)))       # always return a list of at least length 3, so it can be unpacked to three variables
+      if not self.ALIASES or self.ALIASES.keys().isdisjoint(cmdParts): self.PARSED[cmd] = (cmdParts, (cmdClass, opcode, realType, tuple(args)))
       return cmdClass, opcode, realType, args
 
 
 
   def postProcess(self, bf):
     """
-    Clean up some minor things, e.g. unnecessary moves ('>>><<' -> '>') or STZ-sequences
+    Clean up the generated code using the peephole optimiser, e.g. unnecessary moves ('>>\n<<<' -> '<') or STZ-sequences
     """
 
-    bfOrg = bf[:]
-
-    r = re.compile('((\[-\])+\s*)+')
-    match = r.search(bf)
-    if match:
-      while 1:
-        start, end = match.span()
-        ws = match.group().strip('[-]')
-        bf = bf[:start] + '[-]' + ws + bf[end:]
-        matches = r.finditer(bf)
-        for m in matches:
-          if m.start() > end:
-            match = m
-            break
-        else: break
-
-
-    r = re.compile('(<+>+|>+<+)+')
-    match = r.search(bf)
-    while match is not None:
-      s = match.group()
-      nl = s.count('<')
-      nr = s.count('>')
-
-      diff = nr-nl
-      if diff < 0: s = '<' * abs(diff)
-      else: s = '>' * diff
-
-      bf = bf[:match.start()] + s + bf[match.end():]
-      match = r.search(bf)
-
-    return bf
+    return peephole.optimise(bf)
 
 
   ### parsing functions
@@ -234,310 +338,1173 @@ class Parser:
   def compile(self, bfal, initConstants=True):
     '''
     Parses the given assembly to brainfuck commands.
-    splits the assembly in lines / commands, parses them using parseCommand and compiles them to bf commands
+    The assembly is compiled to the IR using compileIR, optimised by the passes in self.PASSES and emitted as brainfuck;
+    local passes are already run on each command by compileIR.
+    Large sources are compiled by compileParallel if self.workers is set, all passes are local and the compilation is not incremental
 
     :param bfal: assembly input
     :param initConstants: if True, initialise constants at the start of the program
     :return: brainfuck commands
     '''
 
+    if self.cache is not None:
+      key = self.cacheKey(bfal, initConstants)
+      entry = self.cache.get(key, self.validCacheEntry)
+      if entry is not None:
+        self.restoreCacheEntry(entry)
+        return entry['bf']
+
+    lines = self.preprocess(bfal)
+    if self.workers and self.workers > 1 and len(lines) >= self.parallelMinLines and not self.incremental and not self.globalPasses():
+      bf = self.compileParallel(lines, initConstants)
+
+    else:
+      program = self.compileIR(bfal, initConstants, lines)
+      program = ir.runPasses(program, self.globalPasses())
+      bf = self.postProcess(ir.emit(program))
+
+    if self.cache is not None: self.cache.put(key, self.cacheEntry(bf))
+    return bf
+
+
+  def compileStream(self, lines, initConstants=True, rescan=None):
+    '''
+    Parses assembly to brainfuck commands like compile, but reads the lines from an iterable and yields the brainfuck code in chunks.
+    Only streamLines lines, their units and a window of streamWindow tokens of the peephole optimiser are held at once
+    (and the commands of a control flow block, if self.PASSES has passes which are not local; those need the whole block).
+    The output equals the one of compile, except that registers are treated as alive at the end of each chunk (see deadRegisters)
+    and that moves or increments cancelling out are kept if their chain reaches further back than the window (see peephole).
+
+    The tables (interned strings, stack slots and arrays) are built by scanning the whole source before compiling it;
+    rescan returns a new iterable of the lines for every scan. Without rescan, lists and tuples are scanned directly;
+    other iterables are read only once, therefore no strings are interned, the stack is scanned and arrays can not be used.
+
+    :param lines: iterable of lines of assembly, e.g. a file
+    :param initConstants: if True, initialise constants at the start of the program
+    :param rescan: function returning the lines again, None if they can only be read once
+    :return: generator of the brainfuck code
+    '''
+
+    if rescan is None and isinstance(lines, (list, tuple)): rescan = functools.partial(iter, lines)
+
+    self.MACROS = {}
+    self.INCLUDES = {}
+    self.MACRO_CALLS = {}
+    self.EXPANSIONS = {}
+    self.OPTIONS = self.optionsKey()
+    self.cfBlockEnds = []
+    self.ALIASES = {}
+    self.KNOWN = {}
+    self.units = []
+
+    if rescan is not None:
+      self.internStringTable(self.expandStream(rescan()))
+      self.stackSlotTable(self.expandStream(rescan()))
+      self.arrayTable(self.expandStream(rescan()))
+
+    else:
+      self.STRINGS = {}
+      self.DATA = []
+      self.STACK_SLOTS = 0
+      self.DEPTH = None
+      self.ARRAYS = {}
+
+    self.setProgramCells()
+    optimiser = peephole.Peephole()
+
+    with self.macroContext(self.START_POS) as mc:
+      if initConstants: optimiser.feed(ir.emit([self.emitCall(mc, 'INIT', lambda s: ''.join(s.inc(cell, val) for cell, val in self.CONSTANTS))]))
+      if self.DATA: optimiser.feed(ir.emit([self.emitCall(mc, 'DATA', lambda s: s.initData(self.DATA))]))
+
+      chunk = []
+      calls = {}
+      pending = []            # compiled units, which are not emitted yet
+      source = self.expandStream(lines, calls=True)
+      while True:
+        for expanded, expandedCalls in source:
+          for start, end, key in sorted(expandedCalls, key=lambda c: (c[0], -c[1])):
+            calls.setdefault(len(chunk) + start, []).append((len(chunk) + end, key))
+
+          chunk += expanded
+          if len(chunk) >= self.streamLines: break
+
+        if not chunk: break
+
+        self.TOKENS = dict(zip(chunk, tokenizer.tokenize('\n'.join(chunk))))
+        self.PARSED = {}
+        self.PASSED = {}
+        dead = self.deadRegisters(chunk, self.ALIASES) if self.destructiveTransfers else None
+        pending += self.compileUnits(mc, chunk, dead=dead, calls=calls)
+        chunk = []
+        calls = {}
+
+        if not self.globalPasses(): optimiser.feed(self.emitUnits(pending))
+        elif not self.cfBlockEnds: optimiser.feed(ir.emit(ir.runPasses(self.buildProgram(pending), self.globalPasses())))
+        else: continue
+
+        pending = []
+        yield optimiser.flush(self.streamWindow)
+
+      self.MEMO_INFO = mc.memoInfo()
+
+    if self.cfBlockEnds:
+      print('Error at the end of the assembly:\n\tSyntaxError: {} control flow block(s) not closed'.format(len(self.cfBlockEnds)))
+      sys.exit(-1)
+
+    yield optimiser.getBf()
+
+
+  def compileFile(self, src, dst, initConstants=True):
+    '''
+    Compiles the assembly file src to the brainfuck file dst, using compileStream; neither is held in memory as a whole.
+    Paths of INCLUDE are relative to src.
+
+    :param src: path of the assembly file
+    :param dst: path of the brainfuck file to write
+    :param initConstants: if True, initialise constants at the start of the program
+    '''
+
+    self.sourcePath = src
+    with open(src, encoding='utf-8') as f, open(dst, 'w', encoding='utf-8') as out:
+      for bf in self.compileStream(f, initConstants, functools.partial(_readLines, src)): out.write(bf)
+
+
+  def emitUnits(self, units):
+    '''
+    Emits compiled units as brainfuck text, like ir.emit(self.buildProgram(units)), but without nesting:
+    the units may start and end in the middle of control flow blocks
+
+    :param units: list of units
+    :return: brainfuck text
+    '''
+
+    parts = []
+    for unit in units:
+      if unit.call is None: continue
+      parts.append(ir.emit([unit.call]))
+
+      if unit.cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_START: parts.append('[')
+      elif unit.cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END: parts.append(']')
+
+    return ''.join(parts)
+
+
+  def optimiseLayout(self, bfal, inputs=None, rounds=3):
+    '''
+    Reorders the cells in self.CELLS, so that the head travels less for the given assembly (see layoutOptimiser).
+    The transitions between cells are counted statically, or by profiling the compiled program if inputs are given.
+    Each round counts the transitions in the best layout so far and optimises it; the new layout is only kept if it is better,
+    i.e. the compiled program is shorter (static) or executes fewer moves (profile).
+
+    :param bfal: assembly input
+    :param inputs: input for profiling the program (bytes), None to count the transitions statically
+    :param rounds: maximum number of rounds
+    :return: the new layout
+    '''
+
+    analyser = copy.copy(self)
+    analyser.cache = None
+    analyser.units = []
+    analyser.incremental = False
+    analyser.workers = None
+
+    def analyse(cells):
+      analyser.CELLS = cells
+      analyser.transitions = collections.Counter() if inputs is None else None
+      program = analyser.compileIR(bfal)
+
+      if inputs is None: return analyser.transitions, len(analyser.postProcess(ir.emit(program)))
+
+      transitions = layoutOptimiser.profileTransitions(ir.lower(program), analyser.PROGRAM_CELLS, inputs, cellBits=self.cellBits)
+      return transitions, layoutOptimiser.travelCost(transitions, cells)
+
+    best = list(self.CELLS)
+    transitions, cost = analyse(best)
+    for i in range(rounds):
+      cells = layoutOptimiser.optimiseLayout(transitions, best)
+      if cells == best: break
+
+      cellsTransitions, cellsCost = analyse(cells)
+      if cellsCost >= cost: break
+      best, transitions, cost = cells, cellsTransitions, cellsCost
+
+    self.CELLS = best
+    self.units = []           # units of previous compilations refer to the old layout
+    return best
+
+
+  def macroContext(self, startPos):
+    '''
+    :param startPos: start position of the head
+    :return: MacroContext for the layout and options of this parser
+    '''
+
+    return macros.MacroContext(startPos=startPos, cells=self.PROGRAM_CELLS, temps=self.TEMPS, costModel=self.costModel, cellBits=self.cellBits, memoSize=self.macroMemoSize)
+
+
+  def cacheKey(self, bfal, initConstants):
+    '''
+    Key of the compile cache entry for the given assembly; covers everything the compiled code depends on,
+    except for the included files, which are checked by validCacheEntry. The assembly is hashed as written, before preprocessing.
+
+    :param bfal: assembly input
+    :param initConstants: as passed to compile
+    :return: cache key
+    '''
+
+    return self.cache.key(bfal.encode('utf-8'), initConstants, *self.optionsKey())
+
+
+  def optionsKey(self):
+    '''
+    :return: the options the compiled code depends on (layout, cell width, cost model, opcodes, handlers, passes, ...), as a tuple
+    '''
+
+    return (
+      self.CELLS, self.TEMPS, self.REGISTERS, self.CONSTANTS, self.START_POS, self.costModel, self.cellBits, self.internStrings, self.internMinCount, self.trackRegisters, self.destructiveTransfers, self.staticStack,
+      sorted(self.OPCODE_IDENTIFIERS.items()), sorted(self.OPCODE_TYPES.items(), key=lambda i: i[0].value), handlers.names(self.HANDLERS),
+      [p.__qualname__ for p in self.PASSES], self.__class__.__qualname__
+    )
+
+
+  def includeBase(self):
+    '''
+    :return: directory the paths of INCLUDE in the compiled source are relative to
+    '''
+
+    return os.path.dirname(os.path.abspath(self.sourcePath)) if self.sourcePath is not None else os.getcwd()
+
+
+  def cacheEntry(self, bf):
+    '''
+    Compile cache entry of the last compilation: the code, the state derived from the source (aliases, known values, macros)
+    and from the layout (PROGRAM_CELLS, STRINGS, DATA, ARRAYS, STACK_SLOTS, DEPTH), and the hashes of the included files
+
+    :param bf: compiled code
+    :return: entry (JSON-serialisable dict), see restoreCacheEntry
+    '''
+
+    return {
+      'bf': bf, 'aliases': self.ALIASES, 'known': self.KNOWN,
+      'macros': {name: [m.params, m.body] for name, m in self.MACROS.items()},
+      'cells': self.PROGRAM_CELLS, 'strings': self.STRINGS, 'data': self.DATA, 'arrays': self.ARRAYS,
+      'stackSlots': self.STACK_SLOTS, 'depth': self.DEPTH,
+      'includes': {path: cache.digest(text) for path, text in self.INCLUDES.items()},
+      'base': self.includeBase() if self.INCLUDES else None,
+    }
+
+
+  def validCacheEntry(self, entry):
+    '''
+    Checks, that the files included by the source of a compile cache entry are unchanged: they are resolved the same way
+    and their contents have the hashes recorded. Sets INCLUDES to the files read.
+
+    :param entry: entry, as returned by cacheEntry
+    :return: True, if the entry can be used
+    '''
+
+    self.INCLUDES = {}
+    if entry['includes'] and entry['base'] != self.includeBase(): return False
 
-    bf = ''
+    for path, hashed in entry['includes'].items():
+      try: text = preprocessor._readFile(path)
+      except OSError: return False
+
+      if cache.digest(text) != hashed: return False
+      self.INCLUDES[path] = text
+
+    return True
+
+
+  def restoreCacheEntry(self, entry):
+    '''
+    Restores the state of the compilation stored in a compile cache entry, as if the source was compiled.
+    No units are restored, so an incremental compilation after it compiles all lines.
+
+    :param entry: entry, as returned by cacheEntry
+    '''
+
+    self.ALIASES = entry['aliases']
+    self.KNOWN = entry['known']
+    self.MACROS = {name: preprocessor.Macro(name, params, body) for name, (params, body) in entry['macros'].items()}
+    self.MACRO_CALLS = {}
+    self.EXPANSIONS = {}
+    self.TOKENS = {}
+    self.PARSED = {}
+    self.PASSED = {}
+    self.cfBlockEnds = []
+    self._aliasState = None
+    self.MEMO_INFO = None
+
+    self.PROGRAM_CELLS = entry['cells']
+    self.STRINGS = {text: tuple(cells) for text, cells in entry['strings'].items()}
+    self.DATA = [tuple(d) for d in entry['data']]
+    self.ARRAYS = entry['arrays']
+    self.STACK_SLOTS = entry['stackSlots']
+    self.DEPTH = entry['depth']
+    self.units = []
+
+
+  def compileIR(self, bfal, initConstants=True, lines=None):
+    '''
+    Parses the given assembly to the IR.
+    preprocesses the assembly to lines / commands (see preprocess) and compiles them to units using compileUnits, which are then assembled to a program
+
+    :param bfal: assembly input
+    :param initConstants: if True, initialise constants at the start of the program
+    :param lines: lines of the assembly, if it was preprocessed already (see preprocess)
+    :return: IR program, consisting of one MacroCall per command
+    '''
+
+    if lines is None: lines = self.preprocess(bfal)
+    dead = self.startProgram(lines)
+
+    with self.macroContext(self.START_POS) as mc:
+      mc.transitions = self.transitions
+      program = self.emitHead(mc, initConstants)
+
+      if self.incremental and self.units: self.units = self.compileUnits(mc, lines, self.units, dead, self.MACRO_CALLS)
+      else: self.units = self.compileUnits(mc, lines, dead=dead, calls=self.MACRO_CALLS)
+
+      self.MEMO_INFO = mc.memoInfo()
+
+    if self.cfBlockEnds:
+      print('Error at the end of the assembly:\n\tSyntaxError: {} control flow block(s) not closed'.format(len(self.cfBlockEnds)))
+      sys.exit(-1)
+
+    return program + self.buildProgram(self.units)
+
+
+  def startProgram(self, lines):
+    '''
+    Resets the state of the parser for compiling lines and sets up the tables and the memory layout of the program.
+    The units of included files are kept, as long as the layout, the interned strings and the options (see optionsKey) are unchanged (see preprocessor);
+    the units of the last compilation (see compileUnits) are dropped if the options change.
+
+    :param lines: preprocessed lines of assembly
+    :return: registers dead after each line (see deadRegisters), None if registers are not moved destructively
+    '''
 
-    cfBlockEnds = []
+    layout = self.PROGRAM_CELLS, self.STRINGS, self.OPTIONS
+    self.OPTIONS = self.optionsKey()
+    if self.OPTIONS != layout[2]: self.units = []           # units of previous compilations refer to the old options
+    self.PARSED = {}
+    self.PASSED = {}
+    self.cfBlockEnds = []
     self.ALIASES = {}
-    with macros.MacroContext(startPos=self.START_POS, cells=self.CELLS, temps=self.TEMPS) as mc:
-      if initConstants:
-        for cell, val in self.CONSTANTS:
-          bf += mc.inc(cell, val)
-
-      for cmd in bfal.split('\n'):
-        try:
-          parsed = self.parseCommand(cmd)
-          if not parsed: continue
-        
+    self.KNOWN = {}
+    self.internStringTable(lines)
+    self.stackSlotTable(lines)
+    self.arrayTable(lines)
+    self.setProgramCells()
+
+    keep = (self.PROGRAM_CELLS, self.STRINGS, self.OPTIONS) == layout
+    self.EXPANSIONS = {key: units for key, units in self.EXPANSIONS.items() if keep and key[0][0] == preprocessor.INCLUDE}
+    return self.deadRegisters(lines) if self.destructiveTransfers else None
+
+
+  def emitHead(self, mc, initConstants=True):
+    '''
+    :param mc: MacroContext to compile in
+    :param initConstants: if True, initialise constants
+    :return: IR of the start of the program: the initialisation of the constants and of the data
+    '''
+
+    program = []
+    if initConstants: program.append(self.emitCall(mc, 'INIT', lambda s: ''.join(s.inc(cell, val) for cell, val in self.CONSTANTS)))
+    if self.DATA: program.append(self.emitCall(mc, 'DATA', lambda s: s.initData(self.DATA)))
+    return program
+
+
+  def compileParallel(self, lines, initConstants=True):
+    '''
+    Compiles preprocessed lines of assembly to brainfuck in a pool of self.workers processes; the result is identical to compile.
+
+    The lines are split into segments (see splitSegments). Each worker compiles a segment, emits its code and runs the peephole
+    optimiser over it (see peephole.optimisePart); the optimised segments are joined by peephole.join, which only optimises
+    the code around the seams again. A segment whose entry state differs from the exit state of the one before is compiled again,
+    from the right state, as is a segment whose worker failed (errors are reported by that compilation). Only local passes can be run this way (see ir.localPass); no units are kept.
+
+    :param lines: lines of assembly (see preprocess)
+    :param initConstants: if True, initialise constants at the start of the program
+    :return: brainfuck commands
+    '''
+
+    dead = self.startProgram(lines) or [frozenset()] * len(lines)
+
+    with self.macroContext(self.START_POS) as mc:
+      head = ir.emit(self.emitHead(mc, initConstants))
+      state = self.saveState(mc)
+      segments = self.splitSegments(mc, lines, dead)
+
+      worker = copy.copy(self)
+      worker.units = []
+      worker.cache = None
+      worker.TOKENS = {}            # the workers tokenize their segments themselves
+      worker.PARSED = {}
+      worker.PASSED = {}
+      worker.EXPANSIONS = {}
+      with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as pool:
+        futures = [pool.submit(_compileSegment, worker, lines[a:b], entry, dead[a:b]) for a, b, entry in segments]
+        results = []
+        for f in futures:
+          try: results.append(f.result())
+          except Exception: results.append(None)          # e.g. started at a wrongly guessed position; compiled again below
+
+      parts = [(head,) + peephole.optimisePart(head)]
+      for (a, b, entry), result in zip(segments, results):
+        if result is not None and entry == state: bf, optimised, skip, syncs, exit = result
+        else:
+          self.restoreState(mc, state)
+          units = self.compileUnits(mc, lines[a:b], dead=dead[a:b])
+          bf = self.emitUnits(units)
+          optimised, skip, syncs = peephole.optimisePart(bf)
+          exit = units[-1].exit if units else state
+
+        parts.append((bf, optimised, skip, syncs))
+        state = exit
+
+      self.restoreState(mc, state)
+      self.MEMO_INFO = mc.memoInfo()
+
+    if self.cfBlockEnds:
+      print('Error at the end of the assembly:\n\tSyntaxError: {} control flow block(s) not closed'.format(len(self.cfBlockEnds)))
+      sys.exit(-1)
+
+    self.units = []
+    return peephole.join(parts)
+
+
+  def expandStream(self, lines, calls=False):
+    '''
+    Expands lines of assembly one by one (see preprocessor.Preprocessor.stream); sets MACROS and INCLUDES
+
+    :param lines: iterable of lines of assembly
+    :param calls: if True, the macro calls among the expanded lines are generated as well
+    :return: generator of the expanded lines; if calls is set, of the expanded lines of each line of assembly and the calls among them
+    '''
+
+    pp = preprocessor.Preprocessor(reserved=self.OPCODE_IDENTIFIERS)
+    self.MACROS, self.INCLUDES = pp.macros, pp.files
+    try:
+      for expanded, expandedCalls in pp.stream(lines, self.sourcePath):
+        if calls: yield expanded, expandedCalls
+        else: yield from expanded
+
+    except AssemblyError as err:
+      print('Error while preprocessing the line "{}":\n\t{}: {}'.format(pp.line, err.name, err))
+      sys.exit(-1)
+
+
+  def preprocess(self, bfal):
+    '''
+    Splits the assembly into lines and tokenizes them (sets TOKENS, see tokenizer).
+    Macros are defined and their calls expanded, files are included (sets MACROS, INCLUDES and MACRO_CALLS, see preprocessor).
+
+    :param bfal: assembly input
+    :return: lines of assembly, expanded
+    '''
+
+    lines = bfal.split('\n')
+    parts = tokenizer.tokenize(bfal)
+    self.MACROS = {}
+    self.INCLUDES = {}
+    self.MACRO_CALLS = {}
+
+    if preprocessor.hasDirectives(parts):
+      pp = preprocessor.Preprocessor(reserved=self.OPCODE_IDENTIFIERS)
+      try: lines, calls = pp.expand(lines, parts, self.sourcePath)
+      except AssemblyError as err:
+        print('Error while preprocessing the line "{}":\n\t{}: {}'.format(pp.line, err.name, err))
+        sys.exit(-1)
+
+      self.MACROS, self.INCLUDES = pp.macros, pp.files
+      for start, end, key in sorted(calls, key=lambda c: (c[0], -c[1])): self.MACRO_CALLS.setdefault(start, []).append((end, key))
+      parts = tokenizer.tokenize('\n'.join(lines))
+
+    self.TOKENS = dict(zip(lines, parts))
+    return lines
+
+
+  def internStringTable(self, lines):
+    '''
+    Chooses the strings to be interned, if self.internStrings is set: those printed by at least internMinCount PRT commands.
+    Sets STRINGS and DATA: string i is stored in the cells 'S<i>.0', 'S<i>.1', ..., followed by a 0 in 'S<i>.END'.
+
+    :param lines: lines of assembly
+    '''
+
+    counts = collections.Counter()
+    if self.internStrings:
+      for line in lines:
+        try: parts = self.parseCmdParts(line)
+        except AssemblyError: continue
+
+        if len(parts) == 2 and self.OPCODE_IDENTIFIERS.get(parts[0]) == self.OPCODES.PRINT: counts[parts[1]] += 1
+
+    self.STRINGS = {}
+    self.DATA = []
+    for text, n in counts.items():
+      if n < self.internMinCount or self.parseArg(self.OPCODES.PRINT, text)[0] != 'T': continue
+
+      try: chars = macros.textBytes(text)
+      except UnicodeDecodeError: continue
+      if not chars or 0 in chars: continue
+
+      i = len(self.STRINGS)
+      cells = ['S{}.{}'.format(i, j) for j in range(len(chars))] + ['S{}.END'.format(i)]
+      self.STRINGS[text] = (cells[0], cells[-1])
+      self.DATA += zip(cells, list(chars) + [0])
+
+
+  def stackSlotTable(self, lines):
+    '''
+    Decides how the stack is accessed, if self.staticStack is set: if the depth of the stack is known at every line,
+    STACK_SLOTS is set to the maximum depth and the compilation starts at DEPTH 0; otherwise STACK_SLOTS is 0 and DEPTH None.
+
+    :param lines: lines of assembly
+    '''
+
+    slots = 0
+    if self.staticStack:
+      for depth in self.iterStackDepths(lines):
+        if depth is None:
+          slots = None
+          break
+        slots = max(slots, depth)
+
+    self.STACK_SLOTS = slots or 0
+    self.DEPTH = 0 if slots is not None and self.staticStack else None
+
+
+  def arrayTable(self, lines):
+    '''
+    Sets ARRAYS to the arrays declared in the lines with 'ARRAY <name> <size>'.
+    Invalid declarations (sizes out of range, names whose cells are taken or redeclared with another size) are ignored;
+    they will raise their error when being compiled.
+
+    :param lines: lines of assembly
+    '''
+
+    self.ARRAYS = {}
+    taken = set(self.CELLS) | {self.stackSlot(i) for i in range(self.STACK_SLOTS)} | {cell for cell, val in self.DATA}
+    for line in lines:
+      try: parts = self.parseCmdParts(line)
+      except AssemblyError: continue
+      if len(parts) != 3 or self.OPCODE_IDENTIFIERS.get(parts[0]) != self.OPCODES.ARRAY: continue
+
+      (nameType, name), (sizeType, size) = self.parseArg(self.OPCODES.ARRAY, parts[1]), self.parseArg(self.OPCODES.ARRAY, parts[2])
+      if nameType != 'T' or sizeType != 'V' or name in self.ARRAYS or not 0 < int(size) <= self.MAX_ARRAY_SIZE: continue
+
+      cells = memoryLayout.arrayCells(name, int(size))
+      if taken.isdisjoint(cells):
+        self.ARRAYS[name] = int(size)
+        taken.update(cells)
+
+
+  def arrayIndex(self, array, index=None):
+    '''
+    :param array: name of an array
+    :param index: index into the array (string, as returned by parseCommand), None if it is not known
+    :return: index as int, None if it is not known
+    '''
+
+    if array not in self.ARRAYS: raise AssemblyNameError('Unknown array: {}'.format(array))
+    if index is None: return None
+
+    if not 0 <= int(index) < self.ARRAYS[array]: raise AssemblyValueError('Index {} out of range for array {}'.format(index, array))
+    return int(index)
+
+
+  def setProgramCells(self):
+    '''
+    Sets PROGRAM_CELLS, the layout the program is compiled for: the stack slots, the data region and the arrays lie right before the stack.
+    If the layout changes, units of previous compilations are dropped.
+    '''
+
+    cells = self.CELLS
+    extra = [self.stackSlot(i) for i in range(self.STACK_SLOTS)] + [cell for cell, val in self.DATA]
+    for name, size in self.ARRAYS.items(): extra += memoryLayout.arrayCells(name, size)
+    if extra:
+      stack = cells.index(memoryLayout.STACK[0]) if memoryLayout.STACK[0] in cells else len(cells)
+      cells = cells[:stack] + extra + cells[stack:]
+
+    if cells != self.PROGRAM_CELLS: self.units = []
+    self.PROGRAM_CELLS = cells
+
+
+  def stackSlot(self, depth):
+    '''
+    :param depth: stack depth
+    :return: cell of the stack entry at depth, if the stack is addressed statically
+    '''
+
+    return '{}.{}'.format(memoryLayout.STACK[0], depth)
+
+
+  def stackDepths(self, lines):
+    '''
+    Determines the depth of the stack at every line at compile time.
+    This is possible, if every control flow block leaves the stack as deep as it found it and nothing is popped from the empty stack.
+    Lines which can not be parsed are ignored; they will raise their error when being compiled.
+
+    :param lines: lines of assembly
+    :return: list of the depths after each line, None if the depth is not known everywhere
+    '''
+
+    depths = list(self.iterStackDepths(lines))
+    return depths if None not in depths[-1:] else None
+
+
+  def iterStackDepths(self, lines):
+    '''
+    Generates the depths of the stack after each line, as stackDepths, without holding them
+
+    :param lines: iterable of lines of assembly
+    :return: generator of the depths; it ends with None, if the depth is not known everywhere
+    '''
+
+    depth = 0
+    blocks = []
+    for line in lines:
+      try: parts = self.parseCmdParts(line)
+      except AssemblyError: parts = None
+
+      opcode = self.OPCODE_IDENTIFIERS.get(parts[0]) if parts else None
+      if opcode is not None:
+        cmdClass = self.OPCODE_TYPES[opcode][0]
+        depth += self.STACK_EFFECTS.get(opcode, 0)
+
+        if depth < 0:
+          yield None
+          return
+
+        elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_START: blocks.append(depth)
+        elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END:
+          if not blocks or blocks.pop() != depth:
+            yield None
+            return
+
+      yield depth
+
+
+  def deadRegisters(self, lines, aliases=None):
+    '''
+    Liveness analysis: determines the registers which are dead after each line, i.e. which are written before they are read again.
+    Their values need not be preserved, so they can be moved destructively (without a temp and a restore loop).
+    Only straight-line code is analysed: at control flow commands, lines which can not be parsed and the end of the assembly,
+    all registers are live.
+
+    :param lines: lines of assembly
+    :param aliases: aliases defined before the lines (see ALIASES), None if there are none
+    :return: list of frozensets of registers, one per line
+    '''
+
+    accesses = []             # (read registers, written registers) of each line; None where all registers are live
+    saved = self.ALIASES
+    self.ALIASES = dict(aliases) if aliases else {}
+    try:
+      for line in lines:
+        try: parsed = self.parseCommand(line)
+        except (AssemblyError, InternalError):
+          accesses.append(None)
+          continue
+
+        if not parsed: accesses.append((set(), set()))
+        else:
           cmdClass, opcode, cmdType, args = parsed
-          if cmdClass == self.OPCODE_CLASSES.INSTRUCTION:
-            arg1, arg2, arg3 = args
+          if cmdClass in (self.OPCODE_CLASSES.CONTROLFLOW_START, self.OPCODE_CLASSES.CONTROLFLOW_END): accesses.append(None)
+          else:
+            if opcode == self.OPCODES.ALIAS: self.ALIASES[args[0]] = args[1]
+            accesses.append(self.registerAccesses(cmdClass, opcode, cmdType, args))
 
-            if opcode == self.OPCODES.SET:
-              if cmdType == 'RV': bf += mc.atCell(arg1, '[-]') + mc.setFromTo(0, int(arg2), dest=arg1)
-              elif cmdType == 'RR': bf += mc.copyCell(arg1, arg2)
+    finally: self.ALIASES = saved
 
-              else: raise UnknownCmdTypeError(cmdType)
+    dead = []
+    cur = set()
+    for access in reversed(accesses):
+      dead.append(frozenset(cur))
+      if access is None: cur = set()
+      else:
+        reads, writes = access
+        cur = (cur | writes) - reads
 
+    dead.reverse()
+    return dead
 
-            elif opcode == self.OPCODES.STZ: bf += mc.atCell(arg1, '[-]')
 
-            elif opcode == self.OPCODES.PUSH:
-              if cmdType == 'V':
-                bf += mc.atStackEnd('+>{}<'.format(mc.inc(val=int(arg1))))
+  def registerAccesses(self, cmdClass, opcode, cmdType, args):
+    '''
+    Registers read and written by a parsed command
 
-              elif cmdType == 'R':
-                bf += mc.doCellTimes(arg1, lambda s: s.atStackEnd('>+<<<'))
-                bf += mc.atStackEnd('+')
+    :param cmdClass: command class, as returned by parseCommand
+    :param opcode: opcode, as returned by parseCommand
+    :param cmdType: command type, as returned by parseCommand
+    :param args: arguments, as returned by parseCommand
+    :return: set of read registers, set of written registers
+    '''
 
-            elif opcode == self.OPCODES.POP:
-              bf += mc.set(arg1, 0)
-              bf += mc.atStackEnd('<[-<') + mc.atCell(arg1, mc.inc()) + mc.atStackEnd('<]<-<<')
+    reads = set()
+    writes = set()
+    if cmdClass != self.OPCODE_CLASSES.INSTRUCTION: return reads, writes
 
-            elif opcode == self.OPCODES.INPUT: bf += mc.atCell(arg1, ',')
-            elif opcode == self.OPCODES.OUTPUT: bf += mc.atCell(arg1, '.')
+    destinations = (opcode in self.DESTINATION_VALUES) + (opcode in self.SECOND_DESTINATION_VALUES)
+    for i, (t, arg) in enumerate(zip(cmdType, args)):
+      if t != 'R': continue
+      if i < destinations:
+        writes.add(arg)
+        if opcode in self.SELF_REFERENCING: reads.add(arg)
 
+      else: reads.add(arg)
 
-            elif opcode == self.OPCODES.INC:
-              if   cmdType == 'R': bf += mc.inc(dest=arg1)
-              elif cmdType == 'RV': bf += mc.inc(dest=arg1, val=int(arg2))
-              elif cmdType == 'RR': bf += mc.addCell(arg1, arg2)
+    if opcode in self.CONDITION_VALUES:
+      writes.add('RC')
+      if opcode == self.OPCODES.NOT: reads.add('RC')
 
-              else: raise UnknownCmdTypeError(cmdType)
+    return reads, writes
 
 
-            elif opcode == self.OPCODES.DEC:
-              if   cmdType == 'R': bf += mc.dec(dest=arg1)
-              elif cmdType == 'RV': bf += mc.dec(dest=arg1, val=int(arg2))
-              elif cmdType == 'RR': bf += mc.subCell(arg1, arg2)
+  def compileUnits(self, mc, lines, previous=(), dead=None, calls=None):
+    '''
+    Compiles lines of assembly to units, starting at the current state.
+    Units of a previous compilation are reused, as long as their line, entry state and dead registers are equal to the current ones.
+    Those are aligned to the lines by the common prefix and suffix of the old and new lines;
+    therefore after an edit, only the lines from the first changed line until the state converges again are compiled.
+    Likewise, the lines of a macro call are compiled once per entry state and registers dead after them; equal calls reuse those units.
+
+    :param mc: MacroContext to compile in
+    :param lines: lines of assembly
+    :param previous: units of a previous compilation
+    :param dead: registers dead after each line (see deadRegisters), None if no register is
+    :param calls: lines expanded from macro calls (see MACRO_CALLS), None if there are none
+    :return: list of units, one per line
+    '''
 
-              else: raise UnknownCmdTypeError(cmdType)
+    if dead is None: dead = [frozenset()] * len(lines)
+    if not calls or mc.transitions is not None: calls = {}         # transitions are counted for every line
 
+    nOld = len(previous)
+    prefix = 0
+    while prefix < min(nOld, len(lines)) and previous[prefix].line == lines[prefix]: prefix += 1
 
-            elif opcode == self.OPCODES.ADD:
-              if   cmdType == 'RVV': bf += mc.set(arg1, int(arg2) + int(arg3))
-              elif cmdType == 'RRV': bf += mc.copyCell(arg1, arg2) + mc.inc(arg1, int(arg3))
-              elif cmdType == 'RRR': bf += mc.copyCell(arg1, arg2) + mc.addCell(arg1, arg3)
+    suffix = 0
+    while suffix < min(nOld, len(lines)) - prefix and previous[nOld-1-suffix].line == lines[len(lines)-1-suffix]: suffix += 1
 
-              else: raise UnknownCmdTypeError(cmdType)
+    units = []
+    expanding = []            # macro calls being compiled: (first line, end, key of their units), innermost last
+    i = 0
+    while i < len(lines):
+      line = lines[i]
+      state = self.saveState(mc)
 
+      if i < prefix: old = previous[i]
+      elif i >= len(lines) - suffix: old = previous[i - len(lines) + nOld]
+      else: old = None
 
-            elif opcode == self.OPCODES.SUB:
-              if   cmdType == 'RVV': bf += mc.set(arg1, int(arg2) - int(arg3))
-              elif cmdType == 'RRV': bf += mc.copyCell(arg1, arg2) + mc.dec(arg1, int(arg3))
-              elif cmdType == 'RRR': bf += mc.copyCell(arg1, arg2) + mc.subCell(arg1, arg3)
+      if old is not None and old.entry == state and old.dead == dead[i]:
+        self.restoreState(mc, old.exit)
+        units.append(old)
 
-              else: raise UnknownCmdTypeError(cmdType)
+      else:
+        expansion = None
+        for end, key in calls.get(i, ()):
+          key = (key, state, tuple(dead[i:end]))
+          expansion = self.EXPANSIONS.get(key)
+          if expansion is not None: break
+          expanding.append((i, end, key))
 
-            elif opcode == self.OPCODES.MUL:
-              if   cmdType == 'RVV': bf += mc.set(arg1, int(arg2) * int(arg3))
-              elif cmdType == 'RRV': bf += mc.mulCell(arg1, 'RV', arg2, int(arg3))
-              elif cmdType == 'RRR': bf += mc.mulCell(arg1, 'RR', arg2, arg3)
+        if expansion is not None:
+          self.restoreState(mc, expansion[-1].exit)
+          units.extend(expansion)
 
-              else: raise UnknownCmdTypeError(cmdType)
+        else:
+          if mc.transitions is not None: mc.transitionWeight = layoutOptimiser.STATIC_LOOP_WEIGHT ** self.cfBlockEnds.count(self.OPCODES.END_LOOP)
+          units.append(self.compileLine(mc, line, state, dead[i]))
 
-            elif opcode == self.OPCODES.DIV:
-              if   cmdType == 'RVV': bf += mc.set(arg1, int(arg2) // int(arg3) if int(arg3) else 0)
-              elif cmdType == 'RRV':
-                self.ensureCompInit = True
-                bf += mc.divCell(arg1, 'RV', arg2, int(arg3))
+      i = len(units)
+      while expanding and expanding[-1][1] <= i:
+        start, end, key = expanding.pop()
+        self.EXPANSIONS[key] = units[start:end]
 
-              elif cmdType == 'RRR':
-                self.ensureCompInit = True
-                bf += mc.divCell(arg1, 'RR', arg2, arg3)
+    return units
 
-              else: raise UnknownCmdTypeError(cmdType)
 
+  def splitSegments(self, mc, lines, dead):
+    '''
+    Splits lines of assembly into about self.workers * 4 segments, whose entry state can be determined without compiling the lines before:
+    a segment starts after a line whose exit position does not depend on its entry position (e.g. after ifCB, the head is always at C0; see exitPos);
+    the aliases, open control flow blocks, known register values and stack depths are gathered by a quick scan over the lines.
+    The entry states are guesses, which compileParallel checks.
+
+    :param mc: MacroContext, at the state before the lines
+    :param lines: lines of assembly
+    :param dead: registers dead after each line (see deadRegisters)
+    :return: list of segments as (index of the first line, index after the last line, entry state)
+    '''
 
-            elif opcode == self.OPCODES.TRUE:
-              bf += mc.set('RC', 1)
+    nSegments = self.workers * 4
+    targets = [len(lines) * i // nSegments for i in range(1, nSegments)]
 
-            elif opcode == self.OPCODES.FALSE:
-              bf += mc.set('RC', 0)
+    segments = []
+    start = 0
+    entry = self.saveState(mc)
+    aliases = dict(self.ALIASES)
+    cfBlockEnds = list(self.cfBlockEnds)
+    known = dict(self.KNOWN)
+    depth = self.DEPTH
 
-            elif opcode == self.OPCODES.NOT:
-              self.ensureCompInit = True
-              bf += mc.copyCell('CB', 'RC', destructive=True)
-              bf += mc.inc('RC')
-              bf += mc.ifCB(lambda s: s.dec('RC'))
-              bf += mc.set('CB', 0)
+    for i, line in enumerate(lines):
+      if not targets: break
+      if i >= targets[0]:
+        pos = self.exitPos(line, (None, tuple(sorted(aliases.items())), tuple(cfBlockEnds), tuple(sorted(known.items())), depth), dead[i])
+        if pos is not None:
+          depth = self.scanLine(line, aliases, cfBlockEnds, known, depth, dead[i])
+          segments.append((start, i+1, entry))
+          start = i+1
+          entry = (pos, tuple(sorted(aliases.items())), tuple(cfBlockEnds), tuple(sorted(known.items())), depth)
+          while targets and targets[0] <= i: targets.pop(0)
+          continue
 
-            elif opcode == self.OPCODES.NOT_ZERO:
-              if cmdType == 'V':
-                if int(arg1) : bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+      depth = self.scanLine(line, aliases, cfBlockEnds, known, depth, dead[i])
 
-              elif cmdType == 'R':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 0)
-                bf += mc.addCell('CB', arg1)
-                bf += mc.ifCB(lambda s: s.inc('RC'))
-                bf += mc.set('CB', 0)
+    segments.append((start, len(lines), entry))
+    return segments
 
-              else: raise UnknownCmdTypeError(cmdType)
 
-            elif opcode == self.OPCODES.ZERO:
-              if cmdType == 'V':
-                if not int(arg1): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+  def scanLine(self, cmd, aliases, cfBlockEnds, known, depth=None, dead=frozenset()):
+    '''
+    Updates aliases, open control flow blocks and known register values as compiling cmd would, without compiling it.
+    Lines which can not be parsed are ignored; they will raise their error when being compiled.
+
+    :param cmd: line of assembly
+    :param aliases: alias table to update
+    :param cfBlockEnds: list of block ends of the open control flow blocks to update
+    :param known: known register values to update
+    :param depth: stack depth before cmd, None if the stack is scanned
+    :param dead: registers dead after cmd
+    :return: stack depth after cmd
+    '''
 
-              elif cmdType == 'R':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 1)
-                bf += mc.addCell('CB', arg1)
-                bf += mc.ifCB(lambda s: s.dec('RC'))
-                bf += mc.set('CB', 0)
+    try: parts = self.parseCmdParts(cmd)
+    except AssemblyError: return depth
+    if not parts or parts[0] not in self.OPCODE_IDENTIFIERS: return depth
 
-              else: raise UnknownCmdTypeError(cmdType)
+    opcode = self.OPCODE_IDENTIFIERS[parts[0]]
+    cmdClass = self.OPCODE_TYPES[opcode][0]
+    if depth is not None: depth += self.STACK_EFFECTS.get(opcode, 0)
 
+    if opcode in self.CONTROLFLOW_BLOCK_ENDS: cfBlockEnds.append(self.CONTROLFLOW_BLOCK_ENDS[opcode])
+    elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END and cfBlockEnds: cfBlockEnds.pop()
+    elif opcode == self.OPCODES.ALIAS and len(parts) == 3: aliases[parts[1]] = self.parseArg(opcode, parts[2])[1]
 
-            elif opcode == self.OPCODES.EQUAL:
-              if cmdType == 'VV':
-                if int(arg1) == int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+    if self.trackRegisters and cmdClass in (self.OPCODE_CLASSES.INSTRUCTION, self.OPCODE_CLASSES.CONTROLFLOW_START, self.OPCODE_CLASSES.CONTROLFLOW_END):
+      saved = self.ALIASES
+      self.ALIASES = aliases
+      try: cmdClass, opcode, cmdType, args = self.parseCommand(cmd)
+      except AssemblyError: return depth
+      finally: self.ALIASES = saved
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 1)
-                bf += mc.addCell('CB', arg1) + mc.dec('CB', int(arg2))
-                bf += mc.ifCB(lambda s: s.dec('RC'))
-                bf += mc.set('CB', 0)
+      opcode, cmdType, args = self.foldCommand(known, cmdClass, opcode, cmdType, args)
+      self.trackValues(known, cmdClass, opcode, cmdType, args, dead)
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 1)
+    return depth
 
-                if arg1 != arg2: # if registers are equal, their values are -> EQ is true
-                  bf += mc.addCell('CB', arg1) + mc.subCell('CB', arg2)
-                  bf += mc.ifCB(lambda s: s.dec('RC'))
-                  bf += mc.set('CB', 0)
 
+  def exitPos(self, cmd, state, dead=frozenset()):
+    '''
+    Guesses the head position after cmd, if it does not depend on the position before it:
+    cmd is compiled from the first and from the last but one cell (macros may use the cell after the head, e.g. PRT to find a temp),
+    commands ending at a fixed cell (e.g. a comparison, at RC) end at the same one. If a probe fails, cmd is not guessed.
+    The guess is checked by compileParallel; the state of the parser is left unchanged.
+
+    :param cmd: line of assembly
+    :param state: state before cmd (see saveState); its position is ignored
+    :param dead: registers dead after cmd
+    :return: the position after cmd, None if it depends on the position before
+    '''
 
-            elif opcode == self.OPCODES.NOT_EQUAL:
-              if cmdType == 'VV':
-                if int(arg1) != int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+    try: parts = self.parseCmdParts(cmd)
+    except AssemblyError: return None
+    if not parts or parts[0] not in self.OPCODE_IDENTIFIERS: return None
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 0)
-                bf += mc.addCell('CB', arg1) + mc.dec('CB', int(arg2))
-                bf += mc.ifCB(lambda s: s.inc('RC'))
-                bf += mc.set('CB', 0)
+    saved = (self.ALIASES, self.cfBlockEnds, self._aliasState, self.KNOWN, self.DEPTH)
+    positions = set()
+    try:
+      for pos in (0, len(self.PROGRAM_CELLS) - 2):
+        with self.macroContext(pos) as mc:
+          self.restoreState(mc, (pos,) + tuple(state[1:]))
+          positions.add(self.compileLine(mc, cmd, dead=dead).exit[0])
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.set('RC', 0)
+    except (AssemblyError, InternalError): return None
+    finally: self.ALIASES, self.cfBlockEnds, self._aliasState, self.KNOWN, self.DEPTH = saved
 
-                if arg1 != arg2: # if registers are equal, their values are -> NEQ is false
-                  bf += mc.addCell('CB', arg1) + mc.subCell('CB', arg2)
-                  bf += mc.ifCB(lambda s: s.inc('RC'))
-                  bf += mc.set('CB', 0)
+    return positions.pop() if len(positions) == 1 else None
 
 
-            elif opcode == self.OPCODES.GREATER:
-              if cmdType == 'VV':
-                if int(arg1) > int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+  def globalPasses(self):
+    '''
+    :return: the passes of self.PASSES which are run over the whole program, i.e. those which are not local (see ir.localPass)
+    '''
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.comparison('RV', arg1, int(arg2), 'GT')
+    return [p for p in self.PASSES if not ir.isLocal(p)]
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.comparison('RR', arg1, arg2, 'GT')
 
-              else: raise UnknownCmdTypeError(cmdType)
+  def emitCall(self, mc, name, macro):
+    '''
+    Compiles a command to a macro call (see MacroContext.emit) and runs the local passes of self.PASSES over it.
+    The result is kept as brainfuck text, so the call stays cheap to hold and to transfer to other processes;
+    equal code at equal positions is optimised only once (memoized in PASSED).
+
+    :param mc: MacroContext to compile in
+    :param name: name of the call
+    :param macro: function compiling the command (MacroContext -> brainfuck commands)
+    :return: ir.MacroCall
+    '''
 
+    call = mc.emit(name, macro)
+    local = [p for p in self.PASSES if ir.isLocal(p)]
+    if not local or not call.bf: return call
 
-            elif opcode == self.OPCODES.GREATER_EQUAL:
-              if cmdType == 'VV':
-                if int(arg1) >= int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+    key = (call.bf, call.startPos)
+    if key not in self.PASSED: self.PASSED[key] = ir.emit(ir.runPasses(call.body, local))
+    return ir.MacroCall(name, startPos=call.startPos, endPos=call.endPos, bf=self.PASSED[key])
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.comparison('RV', arg1, int(arg2), 'GE')
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.comparison('RR', arg1, arg2, 'GE')
+  def compileLine(self, mc, cmd, entry=None, dead=frozenset()):
+    '''
+    Compiles a single line of assembly to a unit
 
-              else: raise UnknownCmdTypeError(cmdType)
+    :param mc: MacroContext to compile in
+    :param cmd: line of assembly
+    :param entry: state before the line, as returned by saveState (saved if not given)
+    :param dead: registers dead after the line (see deadRegisters)
+    :return: CompileUnit
+    '''
 
+    if entry is None: entry = self.saveState(mc)
 
-            elif opcode == self.OPCODES.LESS:
-              if cmdType == 'VV':
-                if int(arg1) < int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+    try:
+      parsed = self.parseCommand(cmd)
+      if not parsed: return CompileUnit(cmd, entry, entry)
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.comparison('RV', arg1, int(arg2), 'LT')
+      cmdClass, opcode, cmdType, args = parsed
+      if self.trackRegisters: opcode, cmdType, args = self.foldCommand(self.KNOWN, cmdClass, opcode, cmdType, args)
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.comparison('RR', arg1, arg2, 'LT')
+      call = self.emitCall(mc, opcode.name, lambda s: self.compileCommand(s, cmdClass, opcode, cmdType, args, dead))
+      if self.trackRegisters: self.trackValues(self.KNOWN, cmdClass, opcode, cmdType, args, dead)
+      if self.DEPTH is not None: self.DEPTH += self.STACK_EFFECTS.get(opcode, 0)
 
-              else: raise UnknownCmdTypeError(cmdType)
+      return CompileUnit(cmd, entry, self.saveState(mc), cmdClass, call, dead)
 
+    except (AssemblyError, InternalError, Exception) as err:
+      if isinstance(err, AssemblyError):
+        msg = 'Error while parsing the command "{}":\n\t{}: {}'.format(cmd, err.name, err)
+        print(msg)
+        sys.exit(-1)
 
-            elif opcode == self.OPCODES.LESS_EQUAL:
-              if cmdType == 'VV':
-                if int(arg1) <= int(arg2): bf += mc.set('RC', 1)
-                else: bf += mc.set('RC', 0)
+      elif isinstance(err, InternalError): msg = 'Bad news, an internal error occured'
+      else: msg = 'Very bad news, a runtime error occured'
 
-              elif cmdType == 'RV':
-                self.ensureCompInit = True
-                bf += mc.comparison('RV', arg1, int(arg2), 'LE')
+      msg += ' while parsing the command "{}":\n\t'.format(cmd)
+      print(msg)
+      raise err
 
-              elif cmdType == 'RR':
-                self.ensureCompInit = True
-                bf += mc.comparison('RR', arg1, arg2, 'LE')
 
-              else: raise UnknownCmdTypeError(cmdType)
+  def buildProgram(self, units):
+    '''
+    Assembles compiled units to an IR program; the commands of control flow blocks are nested into loops
 
-            else: raise UnknownOpcodeError(opcode)
+    :param units: list of units
+    :return: IR program
+    '''
 
+    program = []
+    body = program          # list the next command is compiled into
+    blocks = []             # enclosing lists of the open control flow blocks
 
-          elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_START:
-            if opcode in (self.OPCODES.LOOP, self.OPCODES.IF):
-              bf += mc.moveToCell('RC')
-              bf += '['
+    for unit in units:
+      if unit.call is None: continue
+      body.append(unit.call)
 
-              if opcode == self.OPCODES.LOOP: cfBlockEnds.append(self.OPCODES.END_LOOP)
-              elif opcode == self.OPCODES.IF: cfBlockEnds.append(self.OPCODES.END_IF)
+      if unit.cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_START:
+        loop = ir.Loop([], unit.call.endPos)
+        body.append(loop)
+        blocks.append(body)
+        body = loop.body
 
-            else: raise UnknownOpcodeError(opcode)
+      elif unit.cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END: body = blocks.pop()
 
+    return program
 
-          elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END:
-            blockEnd = cfBlockEnds.pop()
-            if blockEnd != opcode: SyntaxError('Unexpected control flow block end')
 
-            if opcode == self.OPCODES.END_LOOP:
-              bf += mc.moveToCell('RC') + ']'
+  def saveState(self, mc):
+    '''
+    Snapshot of everything the compilation of a line depends on (besides the line itself)
 
-            elif opcode == self.OPCODES.END_IF:
-              bf += mc.set('RC', 0) + ']'
+    :param mc: MacroContext
+    :return: state (hashable)
+    '''
 
-            else: raise UnknownOpcodeError(opcode)
+    if self._aliasState is None or self._aliasState[0] is not self.ALIASES:
+      self._aliasState = (self.ALIASES, tuple(sorted(self.ALIASES.items())))
 
-          elif cmdClass == self.OPCODE_CLASSES.SPECIAL:
-            arg1, arg2, arg3 = args
+    return (mc.getCurPos(), self._aliasState[1], tuple(self.cfBlockEnds), tuple(sorted(self.KNOWN.items())), self.DEPTH)
 
-            if opcode == self.OPCODES.ALIAS: self.ALIASES[arg1] = arg2
-            elif opcode == self.OPCODES.PRINT: bf += mc.moveToCell(mc.getClosestTemp()) + mc.printText(arg1)
 
-            else: raise UnknownOpcodeError(opcode)
+  def restoreState(self, mc, state):
+    '''
+    Restores a state saved by saveState
 
+    :param mc: MacroContext
+    :param state: state to restore
+    '''
 
-          else: raise UnknownCmdClassError(cmdClass)
+    pos, aliases, cfBlockEnds, known, depth = state
+    mc._curPos = pos
+    self.ALIASES = dict(aliases)
+    self._aliasState = (self.ALIASES, aliases)
+    self.cfBlockEnds = list(cfBlockEnds)
+    self.KNOWN = dict(known)
+    self.DEPTH = depth
 
-          if bf and not bf[-1] == '\n': bf += '\n'
 
-        except (AssemblyError, InternalError, Exception) as err:
-          if isinstance(err, AssemblyError):
-            msg = 'Error while parsing the command "{}":\n\t{}: {}'.format(cmd, err.name, err)
-            print(msg)
-            sys.exit(-1)
+  def foldCommand(self, known, cmdClass, opcode, cmdType, args):
+    '''
+    Replaces source registers with known values (constant propagation), e.g. 'EQ R0 3' becomes 'EQ 5 3' if R0 is known to be 5.
+    The command is only changed if the resulting type exists; for commutative instructions and comparisons,
+    the arguments are swapped if necessary (e.g. 'ADD R0 5 R1' -> 'ADD R0 R1 5', 'GT 5 R1' -> 'LT R1 5').
+
+    :param known: known register values (see trackValues)
+    :param cmdClass: command class, as returned by parseCommand
+    :param opcode: opcode, as returned by parseCommand
+    :param cmdType: command type, as returned by parseCommand
+    :param args: arguments, as returned by parseCommand
+    :return: opcode, type and arguments of the folded command
+    '''
 
-          elif isinstance(err, InternalError): msg = 'Bad news, an internal error occured'
-          else: msg = 'Very bad news, a runtime error occured'
+    if cmdClass != self.OPCODE_CLASSES.INSTRUCTION or not known: return opcode, cmdType, args
+
+    first = (opcode in self.DESTINATION_VALUES) + (opcode in self.SECOND_DESTINATION_VALUES)        # the destinations are never replaced
+    positions = [i for i in range(first, len(cmdType)) if cmdType[i] == 'R' and args[i] in known]
+    if not positions: return opcode, cmdType, args
+
+    subsets = [positions] + ([[i] for i in positions] if len(positions) > 1 else [])
+    for subset in subsets:
+      t = list(cmdType)
+      a = list(args)
+      for i in range(first, len(cmdType)):
+        if i in subset:
+          t[i] = 'V'
+          a[i] = str(known[args[i]])
+
+        elif t[i] == 'V': a[i] = str(int(a[i]) % self.cellSize())
+
+      candidates = [(opcode, t, a)]
+      swapped = self.SWAPPED_OPCODES.get(opcode)
+      if swapped is not None and len(t) >= first + 2:
+        t, a = t[:], a[:]
+        t[first], t[first+1] = t[first+1], t[first]
+        a[first], a[first+1] = a[first+1], a[first]
+        candidates.append((swapped, t, a))
+
+      for op, t, a in candidates:
+        if ''.join(t) in self.OPCODE_TYPES[op][1]: return op, ''.join(t), a
+
+    return opcode, cmdType, args
+
+
+  def trackValues(self, known, cmdClass, opcode, cmdType, args, dead=frozenset()):
+    '''
+    Updates the known register values after a command.
+    Values are only tracked through straight-line code; at the start of a control flow block, nothing is known,
+    after its end only the condition register (0) is. Dead registers read by the command may have been moved destructively,
+    so they are unknown afterwards.
+
+    :param known: known register values (register -> value), updated in place
+    :param cmdClass: command class, as returned by parseCommand
+    :param opcode: opcode, as returned by parseCommand
+    :param cmdType: command type, as returned by parseCommand
+    :param args: arguments, as returned by parseCommand
+    :param dead: registers dead after the command
+    '''
+
+    if dead:
+      for register in self.registerAccesses(cmdClass, opcode, cmdType, args)[0] & dead: known.pop(register, None)
+
+    if cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_START: known.clear()
+    elif cmdClass == self.OPCODE_CLASSES.CONTROLFLOW_END:
+      known.clear()
+      known['RC'] = 0
+
+    elif cmdClass != self.OPCODE_CLASSES.INSTRUCTION: return
+
+    elif opcode in self.DESTINATION_VALUES:
+      values = [int(a) % self.cellSize() if t == 'V' else known.get(a) for t, a in zip(cmdType, args)]
+      if opcode not in self.SELF_REFERENCING: values[0] = 0        # the old value of the destination is not used
+
+      second = self.SECOND_DESTINATION_VALUES.get(opcode)
+      if second is not None: values[1] = 0
+      self.setTracked(known, args[0], self.DESTINATION_VALUES[opcode], values)
+      if second is not None: self.setTracked(known, args[1], second, values)
+
+    elif opcode in self.CONDITION_VALUES:
+      if opcode == self.OPCODES.NOT: values = [known.get('RC')]
+      else: values = [int(a) % self.cellSize() if t == 'V' else known.get(a) for t, a in zip(cmdType, args)]
+      self.setTracked(known, 'RC', self.CONDITION_VALUES[opcode], values)
+
+
+  def setTracked(self, known, cell, func, values):
+    '''
+    Sets the known value of a cell to func(*values), if all values are known; otherwise the cell becomes unknown
+    '''
+
+    if func is None or None in values: known.pop(cell, None)
+    else: known[cell] = func(*values) % self.cellSize()
+
+
+  def cellSize(self):
+    '''
+    :return: number of values of a cell (2**cellBits)
+    '''
+
+    return 1 << self.cellBits
+
+
+  def setKnown(self, mc, cell, val):
+    '''
+    Sets a cell to val; if its current value is known (see trackValues), only the difference is added
+
+    :param mc: MacroContext
+    :param cell: cell to set
+    :param val: value to set the cell to
+    :return: brainfuck commands
+    '''
+
+    val %= self.cellSize()
+    if cell in self.KNOWN: return mc.setFromTo(self.KNOWN[cell], val, dest=cell)
+    return mc.set(cell, val)
+
+
+  def compileCommand(self, mc, cmdClass, opcode, cmdType, args, dead=frozenset()):
+    '''
+    Compiles a single parsed command to brainfuck commands, using the handler registered for its opcode and type (see handlers)
+
+    :param mc: MacroContext to compile in
+    :param cmdClass: command class, as returned by parseCommand
+    :param opcode: opcode, as returned by parseCommand
+    :param cmdType: command type, as returned by parseCommand
+    :param args: arguments, as returned by parseCommand
+    :param dead: registers which are dead after the command (see deadRegisters); they are moved destructively
+    :return: brainfuck commands
+    '''
 
-          msg += ' while parsing the command "{}":\n\t'.format(cmd)
-          print(msg)
-          raise err
+    handler = self.HANDLERS.get((opcode, cmdType))
+    if handler is None:
+      if cmdClass not in self.OPCODE_CLASSES: raise UnknownCmdClassError(cmdClass)
+      if any(op == opcode for op, t in self.HANDLERS): raise UnknownCmdTypeError(cmdType)
+      raise UnknownOpcodeError(opcode)
 
-    return self.postProcess(bf)
+    return handler(self, mc, args, dead)
 
 
 
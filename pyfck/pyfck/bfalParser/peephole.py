@@ -0,0 +1,289 @@
+'''
+Peephole optimiser for brainfuck code generated by the Brainfuck Assembly Language (BFAL)
+
+The optimiser works on a stream of tokens (runs of moves, runs of increments, clears, loops, in- / output and line breaks)
+and needs a single pass over them. Every token is compared to the last significant token already written,
+therefore the following optimisations also apply across line breaks:
+  - moves and increments are merged; if they cancel out, they are removed, e.g. '>>\n<' -> '>'
+  - increments directly in front of a clear are removed, e.g. '++[-]' -> '[-]'
+  - clears of a cell known to be 0 are removed, e.g. '[-][-]' -> '[-]' or '[->+<][-]' -> '[->+<]'
+  - loops at a cell known to be 0 are never entered and removed, e.g. '[-][>]' -> '[-]'
+
+A cell is known to be 0 right after a clear or a loop, as long as the head did not move.
+
+For streaming, the written tokens can be flushed but for a window of the last ones (see Peephole.flush);
+tokens are only changed while they are within the window, so the result equals the unwindowed one,
+unless a chain of tokens cancelling out reaches further back than the window.
+
+Parts of the code can also be optimised separately (see optimisePart, e.g. in parallel) and then joined (see join):
+only the code around the seams is optimised again, the result equals the one of optimising the code as a whole.
+
+Marius Lambacher, 2018
+'''
+
+import re
+
+
+_TOKENS = re.compile(r'[<>]+|[+-]+|\[-\]|[][.,\n]')
+
+# token kinds
+MOVE = '>'
+ADD = '+'
+CLEAR = '0'
+OPEN = '['
+CLOSE = ']'
+OUTPUT = '.'
+INPUT = ','
+NEWLINE = '\n'
+
+###  default number of tokens kept back by Peephole.flush, so they can still be merged with the following code
+WINDOW = 256
+
+class Peephole:
+  def __init__(self):
+    self.out = []         # written tokens as [kind, value, current cell is 0 after token]
+    self.skip = 0         # nesting depth of the dead loop currently being skipped
+    self.flushed = None   # kind of the last flushed token
+
+
+  def isZero(self):
+    """Whether the current cell is known to be 0 at the end of the written tokens"""
+
+    i = self.lastSignificant()
+    return i is not None and self.out[i][2]
+
+
+  def lastSignificant(self):
+    """Index of the last written token which is not a line break, None if there is none"""
+
+    i = len(self.out) - 1
+    while i >= 0 and self.out[i][0] == NEWLINE: i -= 1       # there is at most one line break in a row
+    return i if i >= 0 else None
+
+
+  def remove(self, i):
+    """Remove the token at index i, without leaving an empty line behind"""
+
+    del self.out[i]
+    before = self.out[i-1][0] if i > 0 else self.flushed
+    if i < len(self.out) and self.out[i][0] == NEWLINE and before in (None, NEWLINE): del self.out[i]
+
+
+  def merge(self, kind, val):
+    """Merge a move or increment into the last significant token; if they cancel out, the token is removed"""
+
+    i = self.lastSignificant()
+    if i is not None and self.out[i][0] == kind:
+      val += self.out[i][1]
+      if val: self.out[i][1] = val
+      else: self.remove(i)
+
+    elif val: self.out.append([kind, val, False])
+
+
+  def feed(self, bf):
+    """
+    Feed brainfuck code into the optimiser
+
+    :param bf: brainfuck code
+    """
+
+    for m in _TOKENS.finditer(bf): self.feedToken(m.group())
+
+
+  def feedToken(self, s):
+    """
+    Feed a single token into the optimiser
+
+    :param s: token, as matched by _TOKENS
+    """
+
+    c = s[0]
+    if self.skip:
+      if s == OPEN: self.skip += 1
+      elif s == CLOSE: self.skip -= 1
+      return
+
+    if c in '<>': self.merge(MOVE, s.count('>') - s.count('<'))
+    elif c in '+-': self.merge(ADD, s.count('+') - s.count('-'))
+
+    elif s == '[-]':
+      i = self.lastSignificant()
+      if i is not None and self.out[i][0] == ADD: self.remove(i)
+      if not self.isZero(): self.out.append([CLEAR, None, True])
+
+    elif s == OPEN:
+      if self.isZero(): self.skip = 1
+      else: self.out.append([OPEN, None, False])
+
+    elif s == CLOSE: self.out.append([CLOSE, None, True])
+    elif s == INPUT: self.out.append([INPUT, None, False])
+    elif s == OUTPUT: self.out.append([OUTPUT, None, self.isZero()])
+
+    elif (self.out[-1][0] if self.out else self.flushed) not in (None, NEWLINE): self.out.append([NEWLINE, None, False])      # drop empty lines
+
+
+  def getBf(self):
+    """
+    :return: the optimised brainfuck code
+    """
+
+    return self.tokensBf(self.out)
+
+
+  def flush(self, keep):
+    """
+    Removes the written tokens but the last keep ones
+
+    :param keep: number of tokens to keep, at least 2 (so the last significant token is kept)
+    :return: brainfuck code of the removed tokens
+    """
+
+    n = len(self.out) - keep
+    if n <= 0: return ''
+
+    bf = self.tokensBf(self.out[:n])
+    self.flushed = self.out[n-1][0]
+    del self.out[:n]
+    return bf
+
+
+  @staticmethod
+  def tokensBf(tokens):
+    """
+    :param tokens: written tokens
+    :return: brainfuck code of the tokens
+    """
+
+    parts = []
+    for kind, val, zero in tokens:
+      if kind == MOVE: parts.append('>' * val if val > 0 else '<' * -val)
+      elif kind == ADD: parts.append('+' * val if val > 0 else '-' * -val)
+      elif kind == CLEAR: parts.append('[-]')
+      else: parts.append(kind)
+
+    return ''.join(parts)
+
+
+
+def optimise(bf):
+  '''
+  Runs the peephole optimiser over bf
+
+  :param bf: brainfuck code
+  :return: optimised brainfuck code
+  '''
+
+  p = Peephole()
+  p.feed(bf)
+  return p.getBf()
+
+
+def optimisePart(bf, syncs=64):
+  '''
+  Runs the peephole optimiser over a part of the code, which follows other code; the parts are put together by join.
+  Besides the optimised code, the points the part can be joined at are recorded: points, after which the last written token
+  is a clear or the end of a loop. Such a token is never removed, so the tokens before it do not affect the following ones.
+
+  :param bf: brainfuck code
+  :param syncs: maximum number of points to record
+  :return: (optimised code, number of dead loops open at its end, list of points as (offset in bf, offset in the optimised code))
+  '''
+
+  p = Peephole()
+  marks = []              # (offset in bf, token written last)
+  for m in _TOKENS.finditer(bf):
+    s = m.group()
+    p.feedToken(s)
+    if s[-1] == CLOSE and len(marks) < syncs and not p.skip and p.out and p.out[-1][0] in (CLEAR, CLOSE): marks.append((m.end(), p.out[-1]))
+
+  ends = {}               # id of a marked token -> offset after it in the optimised code
+  if marks:
+    marked = {id(token) for end, token in marks}
+    offset = 0
+    for token in p.out:
+      kind, val, zero = token
+      offset += abs(val) if val else 3 if kind == CLEAR else 1
+      if id(token) in marked:
+        ends[id(token)] = offset
+        if len(ends) == len(marked): break
+
+  return p.getBf(), p.skip, [(end, ends[id(token)]) for end, token in marks]
+
+
+def _tail(parts):
+  '''
+  Restores the Peephole, which optimised the code of the joined parts, from the code: only the tokens from the last clear or
+  end of a loop on are needed, as no token before it can be changed by the following code
+
+  :param parts: list of optimised code
+  :return: (Peephole, (index of the part and offset in it the restored tokens start at))
+  '''
+
+  p = Peephole()
+  for n in range(len(parts) - 1, -1, -1):
+    start = parts[n].rfind(CLOSE)
+    if start < 0: continue
+
+    end = start + 1
+    clear = parts[n].endswith('[-]', 0, end)
+    if clear: start -= 2
+    p.out.append([CLEAR if clear else CLOSE, None, True])
+    cut = n, start
+    text = [parts[n][end:]] + parts[n+1:]
+    break
+
+  else:
+    cut = 0, 0
+    text = parts
+
+  for bf in text:
+    for m in _TOKENS.finditer(bf):
+      s = m.group()
+      c = s[0]
+      if c in '<>': p.out.append([MOVE, s.count('>') - s.count('<'), False])
+      elif c in '+-': p.out.append([ADD, s.count('+') - s.count('-'), False])
+      elif s == OUTPUT: p.out.append([OUTPUT, None, p.isZero()])
+      else: p.out.append([s, None, False])          # neither clears nor ends of loops follow
+
+  return p, cut
+
+
+def join(parts):
+  '''
+  Joins parts of code; the result equals the one of optimising the code of all parts at once.
+  Each part is optimised by optimisePart, as if it was the start of the program. The code of each part is fed into a Peephole restored
+  from the code before it (see _tail), until a point recorded by optimisePart is reached, at which the Peephole's last token
+  is a clear or the end of a loop as well: from there on, both optimise the code in the same way and the rest of the part's
+  optimised code is taken. Usually, this is the first point of the part.
+
+  :param parts: list of (code, optimised code, number of dead loops open at its end, points), see optimisePart
+  :return: optimised brainfuck code
+  '''
+
+  res = []
+  skip = 0
+  for bf, optimised, partSkip, syncs in parts:
+    if not res:
+      res.append(optimised)
+      skip = partSkip
+      continue
+
+    p, (n, start) = _tail(res)
+    p.skip = skip
+    syncs = dict(syncs)
+    rest = None
+    for m in _TOKENS.finditer(bf):
+      p.feedToken(m.group())
+      if m.end() in syncs and not p.skip and p.out and p.out[-1][0] in (CLEAR, CLOSE):
+        rest = syncs[m.end()]
+        break
+
+    res[n:] = [res[n][:start], Peephole.tokensBf(p.out)]
+    if rest is not None:
+      res.append(optimised[rest:])
+      skip = partSkip
+
+    else: skip = p.skip
+
+  return ''.join(res)
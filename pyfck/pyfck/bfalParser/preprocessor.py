@@ -0,0 +1,291 @@
+'''
+Preprocessor for the Brainfuck Assembly Language (BFAL): user defined macros and included files
+
+  MACRO <name> <parameters>     defines a macro; its body are the following lines until ENDMACRO
+    ...
+  ENDMACRO
+  <name> <arguments>            calls the macro: its body, with every parameter replaced by the corresponding argument
+  INCLUDE "<file>"              includes a file, relative to the including file; each file is included once per build
+
+Parameters are replaced where they are words of the body (not within quotes or comments); an argument can be a word or quoted text.
+Macros may call other macros, which are defined before the call, but not call themselves, define macros or include files.
+Directives and names of macros are case-insensitive, as opcodes are; names of opcodes can not be used for macros.
+
+The preprocessor returns the expanded lines and the macro calls among them (first line, end, key): all calls with the same key
+(the macro and its arguments) expand to the same lines, so the parser compiles each only once per entry state (see Parser.compileUnits).
+Included files are recorded as such calls too, keyed by their expanded lines: the parser keeps their units across compilations,
+so a library included by several programs is compiled once per entry state, until the memory layout changes (see Parser.startProgram).
+Preprocessor.stream expands a source line by line instead, holding only the body of the macro being defined.
+
+  MACRO SWAP A B
+    PUSH A
+    SET A B
+    POP B
+  ENDMACRO
+
+  SWAP R0 R1
+
+
+Marius Lambacher, 2018
+'''
+
+import os
+
+from . import tokenizer
+from .errors import *
+
+
+MACRO = 'MACRO'
+END_MACRO = 'ENDMACRO'
+INCLUDE = 'INCLUDE'
+DIRECTIVES = (MACRO, END_MACRO, INCLUDE)
+
+###  maximum depth of nested macro calls
+MAX_DEPTH = 64
+
+
+
+class Macro:
+  """A user defined macro: its parameters and the lines of its body"""
+
+  def __init__(self, name, params, body):
+    self.name = name
+    self.params = params
+    self.body = body
+
+
+
+def hasDirectives(parts):
+  '''
+  :param parts: parts of the lines, as returned by tokenizer.tokenize
+  :return: True, if any line is a directive; otherwise, there is nothing to preprocess
+  '''
+
+  return any(p and p[0] in DIRECTIVES for p in parts)
+
+
+def words(line):
+  '''
+  :param line: line of assembly
+  :return: words and quoted texts of line as written (with quotes, not upper-cased); None if it has an unclosed quote
+  '''
+
+  res = []
+  for m in tokenizer.TOKEN_RE.finditer(line):
+    kind = m.lastindex
+    if kind in (tokenizer._WORD, tokenizer._TEXT): res.append(m.group(0))
+    elif kind == tokenizer._UNCLOSED: return None
+
+  return res
+
+
+def arguments(line):
+  '''
+  :param line: line of assembly
+  :return: words and quoted texts of line as written, but the first one (see words)
+  '''
+
+  res = words(line)
+  if res is None: raise AssemblySyntaxError('Quotation marks must be of even number')
+  return res[1:]
+
+
+def substitute(line, replacements):
+  '''
+  :param line: line of assembly
+  :param replacements: dict of words (upper-cased) and their replacements
+  :return: line, with its words replaced; quoted texts, comments and whitespace are kept
+  '''
+
+  res = []
+  for m in tokenizer.TOKEN_RE.finditer(line):
+    word = m.group(tokenizer._WORD)
+    if word is not None: res.append(replacements.get(word.upper(), word))
+    else: res.append(m.group(0))
+
+  return ''.join(res)
+
+
+
+class Preprocessor:
+  def __init__(self, reserved=(), readFile=None):
+    '''
+    :param reserved: names which can not be used for macros (the opcode identifiers)
+    :param readFile: function reading an included file (path -> text), open() by default
+    '''
+
+    ###  defined macros (name -> Macro)
+    self.macros = {}
+
+    ###  included files (absolute path -> text), each is read and expanded once
+    self.files = {}
+
+    ###  expanded lines and macro calls among them: (first line, end, (name, arguments)); included files: (first line, end, (INCLUDE, lines))
+    self.lines = []
+    self.calls = []
+
+    ###  line being expanded, for error messages
+    self.line = None
+
+    self.reserved = reserved
+    self.readFile = readFile if readFile is not None else _readFile
+
+
+  def expand(self, lines, parts, path=None):
+    '''
+    Expands lines of assembly: defines macros, expands their calls and includes files
+
+    :param lines: lines of assembly
+    :param parts: parts of the lines, as returned by tokenizer.tokenize
+    :param path: file of the lines, paths of included files are relative to; None: relative to the working directory
+    :return: expanded lines, macro calls among them (first line, end, key)
+    '''
+
+    self.expandLines(lines, parts, path, ())
+    return self.lines, self.calls
+
+
+  def stream(self, lines, path=None):
+    '''
+    Expands lines of assembly one by one, as expand does, e.g. the lines of a file being read
+
+    :param lines: iterable of lines of assembly (a trailing '\\n' is removed)
+    :param path: file of the lines, paths of included files are relative to; None: relative to the working directory
+    :return: generator of the expanded lines and the macro calls among them (first line, end, key), one pair per line of assembly
+    '''
+
+    name = body = None          # macro being defined and its body
+    for line in lines:
+      line = self.line = line.rstrip('\n')
+      p = tokenizer.tokenize(line)[0]
+      head = p[0] if p else None
+
+      if body is not None:
+        if head == MACRO: raise AssemblySyntaxError('Macros can not be defined within macros')
+        elif head == END_MACRO:
+          self.define(name, body)
+          name = body = None
+
+        else: body.append(line)
+        continue
+
+      if head == MACRO: name, body = p[1:], []
+      else:
+        self.lines, self.calls = [], []
+        self.expandLines([line], [p], path, ())
+        yield self.lines, self.calls
+
+    if body is not None: raise AssemblySyntaxError('Macro not closed by {}'.format(END_MACRO))
+
+
+  def expandLines(self, lines, parts, path, callers):
+    '''
+    Appends lines to self.lines, expanded
+
+    :param lines: lines of assembly
+    :param parts: parts of the lines, as returned by tokenizer.tokenize
+    :param path: file of the lines
+    :param callers: names of the macros, whose body lines are
+    '''
+
+    i = 0
+    while i < len(lines):
+      line = self.line = lines[i]
+      p = parts[i]
+      head = p[0] if p else None
+      i += 1
+
+      if head == MACRO:
+        if callers: raise AssemblySyntaxError('Macros can not be defined within macros')
+
+        end = i
+        while end < len(lines) and not (parts[end] and parts[end][0] == END_MACRO):
+          if parts[end] and parts[end][0] == MACRO: raise AssemblySyntaxError('Macros can not be defined within macros')
+          end += 1
+
+        if end == len(lines): raise AssemblySyntaxError('Macro not closed by {}'.format(END_MACRO))
+        self.define(p[1:], lines[i:end])
+        i = end + 1
+
+      elif head == END_MACRO: raise AssemblySyntaxError('{} without {}'.format(END_MACRO, MACRO))
+      elif head == INCLUDE:
+        if callers: raise AssemblySyntaxError('Files can not be included by macros')
+        self.include(line, path)
+
+      elif head in self.macros: self.call(self.macros[head], line, path, callers)
+      else: self.lines.append(line)
+
+
+  def define(self, parts, body):
+    '''
+    Defines a macro
+
+    :param parts: name and parameters of the macro (parts of the line defining it)
+    :param body: lines of its body
+    '''
+
+    if not parts: raise AssemblySyntaxError('Macro without name')
+
+    name, params = parts[0], parts[1:]
+    if name in self.reserved or name in DIRECTIVES: raise AssemblyNameError('{} can not be used as name of a macro'.format(name))
+    if name in self.macros: raise AssemblyNameError('Macro {} is already defined'.format(name))
+    if len(set(params)) != len(params): raise AssemblyNameError('Parameters of macro {} are not unique'.format(name))
+
+    self.macros[name] = Macro(name, params, body)
+
+
+  def call(self, macro, line, path, callers):
+    '''
+    Expands a call of a macro
+
+    :param macro: Macro
+    :param line: line calling it
+    :param path: file of the line
+    :param callers: names of the macros, whose body line is
+    '''
+
+    args = arguments(line)
+    if len(args) != len(macro.params):
+      raise AssemblyTypeError('Macro {} takes {} argument(s), {} given'.format(macro.name, len(macro.params), len(args)))
+
+    if macro.name in callers: raise AssemblyValueError('Macro {} calls itself'.format(macro.name))
+    if len(callers) >= MAX_DEPTH: raise AssemblyValueError('Macro calls nested too deep')
+
+    replacements = dict(zip(macro.params, args))
+    body = [substitute(l, replacements) for l in macro.body]
+
+    start = len(self.lines)
+    self.expandLines(body, tokenizer.tokenize('\n'.join(body)), path, callers + (macro.name,))
+    if len(self.lines) > start: self.calls.append((start, len(self.lines), (macro.name, tuple(args))))
+
+
+  def include(self, line, path):
+    '''
+    Includes a file, if it was not included before; its lines are recorded as a call, keyed by their content
+
+    :param line: INCLUDE line
+    :param path: file of the line
+    '''
+
+    args = arguments(line)
+    if len(args) != 1 or not args[0].startswith('"'): raise AssemblySyntaxError('{} takes a file name in quotation marks'.format(INCLUDE))
+
+    name = args[0][1:-1]
+    file = os.path.abspath(os.path.join(os.path.dirname(path) if path is not None else '', name))
+    if file in self.files: return
+
+    try: text = self.readFile(file)
+    except OSError as err: raise AssemblyNameError('Unable to include {}: {}'.format(name, err.strerror))
+
+    self.files[file] = text
+    lines = text.split('\n')
+    start = len(self.lines)
+    self.expandLines(lines, tokenizer.tokenize(text), file, ())
+    if len(self.lines) > start: self.calls.append((start, len(self.lines), (INCLUDE, tuple(self.lines[start:]))))
+
+
+
+def _readFile(path):
+  """Reads an included file"""
+
+  with open(path, encoding='utf-8') as f: return f.read()
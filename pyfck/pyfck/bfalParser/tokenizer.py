@@ -0,0 +1,90 @@
+'''
+Tokenizer for the Brainfuck Assembly Language (BFAL)
+
+The source is split into lines (at '\n') and each distinct line into tokens, once:
+  - words (opcodes, registers, literals, names) are separated by whitespace and upper-cased
+  - text enclosed by quotes (") is one token and kept as it is; it can not span lines, empty text is dropped
+  - comments beginning with '//' (outside of quotes) are skipped
+Lines without quotes and comments are split by str.split, the others by a single regular expression (TOKEN_RE).
+The tokens are interned, and equal lines share their parts (which must not be modified therefore).
+
+literal() tells numeric literals from other tokens; usually by regular expressions, without raising exceptions.
+Its results are cached.
+
+  tokenize('SET R0 5 // five\\nPRT "Hi"')     # [['SET', 'R0', '5'], ['PRT', 'Hi']]
+
+
+Marius Lambacher, 2018
+'''
+
+import functools
+import re
+import sys
+
+from ..util import litStrToInt
+
+
+###  groups: 1 comment, 2 quoted text, 3 word, 4 unclosed quote (until the end of the line); whitespace is matched without group
+TOKEN_RE = re.compile(r'(//.*)|"([^"]*)"|((?:[^\s"/]|/(?!/))+)|(".*)|\s+')
+_TEXT, _WORD, _UNCLOSED = 2, 3, 4
+
+###  numeric literals, as accepted by util.litStrToInt
+LITERAL_RE = re.compile(r'[+-]?\d+(?:_\d+)*|0[bB][01]+(?:_[01]+)*|0[oO][0-7]+(?:_[0-7]+)*|0[xX][0-9a-fA-F]+(?:_[0-9a-fA-F]+)*')
+
+
+
+def tokenize(source):
+  '''
+  Splits source into the parts of its lines (separated by '\\n').
+  Lines with an unclosed quote can not be split; they are None.
+
+  :param source: assembly
+  :return: list with the parts of each line (index = line number - 1), each a list of tokens or None
+  '''
+
+  known = {}
+  lines = []
+  for line in source.split('\n'):
+    parts = known.get(line, False)
+    if parts is False:
+      if '"' in line or '//' in line: parts = tokenizeLine(line)
+      else: parts = [sys.intern(word) for word in line.upper().split()]
+      known[line] = parts
+
+    lines.append(parts)
+
+  return lines
+
+
+def tokenizeLine(line):
+  '''
+  :param line: line of assembly
+  :return: parts of line, None if it has an unclosed quote
+  '''
+
+  parts = []
+  for m in TOKEN_RE.finditer(line):
+    kind = m.lastindex
+    if kind == _WORD: parts.append(sys.intern(m.group(_WORD).upper()))
+    elif kind == _TEXT:
+      text = m.group(_TEXT)
+      if text: parts.append(sys.intern(text))
+
+    elif kind == _UNCLOSED: return None
+
+  return parts
+
+
+
+@functools.lru_cache(maxsize=65536)
+def literal(token):
+  '''
+  :param token: token to classify
+  :return: value of token as decimal string, if it is a numeric literal (see util.litStrToInt); else None
+  '''
+
+  if LITERAL_RE.fullmatch(token) is not None: return str(litStrToInt(token))
+  if not token or not (token[0] in '+-' or token[0].isdigit() or token[0].isspace()): return None     # can not be a literal
+
+  try: return str(litStrToInt(token))         # unusual literals, e.g. '0B0B1' or with padding or other digits
+  except ValueError: return None
@@ -0,0 +1,162 @@
+'''
+Command line interface of pyfck
+
+  pyfck compile <source.bfal> [-o <program.bf>]     compiles an assembly file to brainfuck (printed, if no output file is given)
+  pyfck run <program>                               runs a brainfuck program; assembly files (.bfal) are compiled first
+  pyfck exec <line> ...                             compiles and runs assembly given on the command line, one line per argument
+
+Compiled programs are stored in a compile cache (see bfalParser.cache), so unchanged assembly is compiled only once.
+Modules are imported by the commands needing them: compiling never imports the interpreter, and therefore NumPy.
+Installed as the console script 'pyfck', or run as 'python -m pyfck'.
+
+Marius Lambacher, 2018
+'''
+
+import argparse
+import os
+import sys
+
+
+###  default directory of the compile cache
+CACHE_DIR = os.path.join('~', '.cache', 'pyfck')
+
+###  suffix of assembly files, which run compiles before running them
+ASSEMBLY_SUFFIX = '.bfal'
+
+
+
+def argumentParser():
+  '''
+  :return: argparse.ArgumentParser for the command line
+  '''
+
+  ap = argparse.ArgumentParser(prog='pyfck', description='Compile and run the Brainfuck Assembly Language (BFAL)')
+  ap.add_argument('--cache-dir', dest='cacheDir', default=CACHE_DIR, help='directory of the compile cache (default: %(default)s)')
+  ap.add_argument('--no-cache', dest='noCache', action='store_true', help='neither read nor write the compile cache')
+  ap.add_argument('--cell-bits', dest='cellBits', type=int, choices=(8, 16, 32), help='width of the cells in bits')
+  commands = ap.add_subparsers(dest='command', metavar='command')
+  commands.required = True
+
+  cmd = commands.add_parser('compile', help='compile an assembly file to brainfuck')
+  cmd.add_argument('source', help='assembly file')
+  cmd.add_argument('-o', '--output', help='brainfuck file to write, standard output if not given')
+  cmd.add_argument('--stream', action='store_true', help='compile in bounded memory (see Parser.compileFile), bypasses the cache; needs --output')
+  cmd.set_defaults(func=compileCommand)
+
+  cmd = commands.add_parser('run', help='run a brainfuck program or an assembly file (' + ASSEMBLY_SUFFIX + ')')
+  cmd.add_argument('program', help='brainfuck or assembly file')
+  cmd.set_defaults(func=runCommand)
+
+  cmd = commands.add_parser('exec', help='compile and run assembly given as arguments')
+  cmd.add_argument('lines', nargs='+', help='lines of assembly')
+  cmd.set_defaults(func=execCommand)
+
+  return ap
+
+
+def main(argv=None):
+  '''
+  Runs the command line
+
+  :param argv: arguments, sys.argv[1:] if None
+  :return: exit status
+  '''
+
+  args = argumentParser().parse_args(argv)
+  return args.func(args)
+
+
+def compileCommand(args):
+  '''
+  'compile': compiles args.source to args.output (or the standard output)
+
+  :param args: parsed arguments
+  :return: exit status
+  '''
+
+  parser = createParser(args)
+  if args.stream:
+    if args.output is None: argumentParser().error('--stream needs --output')
+    parser.cache = None
+    parser.compileFile(args.source, args.output)
+    return 0
+
+  bf = compileFile(parser, args.source)
+  if args.output is None: sys.stdout.write(bf)
+  else:
+    with open(args.output, 'w', encoding='utf-8') as f: f.write(bf)
+
+  return 0
+
+
+def runCommand(args):
+  '''
+  'run': runs args.program, compiling it first if it is an assembly file
+
+  :param args: parsed arguments
+  :return: exit status
+  '''
+
+  if args.program.endswith(ASSEMBLY_SUFFIX): bf = compileFile(createParser(args), args.program)
+  else:
+    with open(args.program, encoding='utf-8') as f: bf = f.read()
+
+  return run(bf, args.cellBits)
+
+
+def execCommand(args):
+  '''
+  'exec': compiles and runs args.lines
+
+  :param args: parsed arguments
+  :return: exit status
+  '''
+
+  return run(createParser(args).compile('\n'.join(args.lines)), args.cellBits)
+
+
+def createParser(args):
+  '''
+  :param args: parsed arguments
+  :return: Parser for the options given, using the compile cache
+  '''
+
+  from .bfalParser import Parser
+  from .bfalParser.cache import CompileCache
+
+  parser = Parser(cache=None if args.noCache else CompileCache(args.cacheDir))
+  if args.cellBits is not None: parser.cellBits = args.cellBits
+  return parser
+
+
+def compileFile(parser, path):
+  '''
+  :param parser: Parser
+  :param path: assembly file
+  :return: brainfuck code of the file
+  '''
+
+  parser.sourcePath = path
+  with open(path, encoding='utf-8') as f: return parser.compile(f.read())
+
+
+def run(bf, cellBits=None):
+  '''
+  Runs brainfuck code with the interpreter
+
+  :param bf: brainfuck code
+  :param cellBits: width of the cells in bits, the default of the interpreter if None
+  :return: exit status
+  '''
+
+  from .bfInterpreter import Interpreter
+
+  interpreter = Interpreter(cellBits=cellBits)
+  interpreter.load(bf)
+  try: interpreter.run()
+  except (MemoryError, SyntaxError) as err:
+    print('\nError while running the program:\n\t{}: {}'.format(type(err).__name__, err))
+    return -1
+
+  finally: sys.stdout.flush()
+  return 0
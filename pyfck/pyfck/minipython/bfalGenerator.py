@@ -83,6 +83,7 @@ class BFALGenerator:
         elif op == 'SUB': self.cmds += 'SUB R2 R0 R1'
         elif op == 'MUL': self.cmds += 'MUL R2 R0 R1'
         elif op == 'DIV': self.cmds += 'DIV R2 R0 R1'
+        elif op == 'MOD': self.cmds += 'MOD R2 R0 R1'
 
         self.cmds += 'PUSH R2'
 
@@ -10,7 +10,7 @@ Marius Lambacher, 2018
 
 
 # UNOPS = ('ADD', 'SUB')
-BINOPS = ('ADD', 'SUB', 'MUL', 'DIV') #, 'MOD')
+BINOPS = ('ADD', 'SUB', 'MUL', 'DIV', 'MOD')
 
 CUNOPS = ('NOT',)
 CBINOPS = ('AND', 'OR')
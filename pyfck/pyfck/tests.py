@@ -2,7 +2,17 @@ import unittest
 from .tests import *
 
 TestSuite = unittest.TestSuite()
+TestSuite.addTest(test_benchmarks.TestBenchmarks)
 TestSuite.addTest(test_bfInterpreter.TestBFInterpreter)
 TestSuite.addTest(test_bfParser.TestBFALParser)
+TestSuite.addTest(test_cache.TestCompileCache)
+TestSuite.addTest(test_cli.TestCli)
+TestSuite.addTest(test_ir.TestIR)
+TestSuite.addTest(test_layoutOptimiser.TestLayoutOptimiser)
+TestSuite.addTest(test_macros.TestMacros)
+TestSuite.addTest(test_memoryLayout.TestMemoryLayout)
 TestSuite.addTest(test_opcodes.TestOpcodes)
+TestSuite.addTest(test_peephole.TestPeephole)
+TestSuite.addTest(test_preprocessor.TestPreprocessor)
+TestSuite.addTest(test_tokenizer.TestTokenizer)
 TestSuite.addTest(test_util.TestUtils)
@@ -1,3 +1,3 @@
-from . import test_bfInterpreter, test_bfParser, test_opcodes, test_util
+from . import test_benchmarks, test_bfInterpreter, test_bfParser, test_cache, test_cli, test_ir, test_layoutOptimiser, test_macros, test_memoryLayout, test_opcodes, test_peephole, test_preprocessor, test_tokenizer, test_util
 
-__all__ = [test_bfInterpreter.TestBFInterpreter, test_bfParser.TestBFALParser, test_opcodes.TestOpcodes, test_util.TestUtils]
\ No newline at end of file
+__all__ = [test_benchmarks.TestBenchmarks, test_bfInterpreter.TestBFInterpreter, test_bfParser.TestBFALParser, test_cache.TestCompileCache, test_cli.TestCli, test_ir.TestIR, test_layoutOptimiser.TestLayoutOptimiser, test_macros.TestMacros, test_memoryLayout.TestMemoryLayout, test_opcodes.TestOpcodes, test_peephole.TestPeephole, test_preprocessor.TestPreprocessor, test_tokenizer.TestTokenizer, test_util.TestUtils]
\ No newline at end of file
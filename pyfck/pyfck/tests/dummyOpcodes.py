@@ -9,6 +9,8 @@ Marius Lambacher, 2017
 
 from enum import Enum
 
+from ..bfalParser import handlers
+
 ### opcodes
 
 class OPCODE_CLASSES(Enum):
@@ -60,3 +62,30 @@ OPCODE_TYPES = {
   OPCODES.ALIAS: (OPCODE_CLASSES.SPECIAL, ('TV', 'TR'))
 }
 
+
+
+### handlers, in a registry of their own (see bfalParser.handlers)
+
+HANDLERS = {}
+
+@handlers.register(OPCODES.OPX, 'R', registry=HANDLERS)
+@handlers.register(OPCODES.OPY, 'R', registry=HANDLERS)
+def _incR(parser, mc, args, dead): return mc.inc(args[0])
+
+@handlers.register(OPCODES.OPY, 'RV', registry=HANDLERS)
+@handlers.register(OPCODES.OPZ, 'RV', 'RVR', 'RVV', registry=HANDLERS)
+def _incRV(parser, mc, args, dead): return mc.inc(args[0], int(args[1]))
+
+@handlers.register(OPCODES.CONDU, '', registry=HANDLERS)
+@handlers.register(OPCODES.CONDV, 'V', registry=HANDLERS)
+@handlers.register(OPCODES.CFS, '', registry=HANDLERS)
+@handlers.register(OPCODES.CFE, '', registry=HANDLERS)
+def _nop(parser, mc, args, dead): return ''
+
+@handlers.register(OPCODES.ALIAS, 'TV', 'TR', registry=HANDLERS)
+def _alias(parser, mc, args, dead):
+  parser.ALIASES[args[0]] = args[1]
+  return ''
+
+
+handlers.validate(OPCODE_TYPES, HANDLERS)
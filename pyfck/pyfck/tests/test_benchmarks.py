@@ -0,0 +1,81 @@
+"""
+Tests for the benchmarks
+
+Marius Lambacher, 2018
+"""
+
+import json
+import unittest
+
+from ..benchmarks import codegen, comparison, corpus, measure, parallel, throughput
+from ..bfalParser import opcodes
+from ..bfalParser.errors import *
+
+
+class TestBenchmarks(unittest.TestCase):
+  def test_benchmarks_measure_run(self):
+    m = measure.run('++[>+++<-]>.', memorySize=3)
+    self.assertEqual(m.steps, 2 + 1 + 2*7 + 1 + 1)
+    self.assertEqual(m.memory, [0, 6, 0])
+    self.assertEqual(m.output, bytes([6]))
+    self.assertEqual(m.extent, 1)
+    self.assertEqual(measure.run('+'*300 + '.', cellBits=16).output, (300,))
+
+  def test_benchmarks_measure_run_memory(self):
+    m = measure.run('[-]>0', {0: 3, 1: 5}, memorySize=2)
+    self.assertEqual(m.memory, [0, 0])
+    self.assertEqual(m.steps, 3*2 + 1 + 1 + 1)
+
+  def test_benchmarks_measure_run_profileError(self):
+    with self.assertRaises(ProfileError): measure.run('[[]')
+
+  def test_benchmarks_comparison(self):
+    values = (0, 1, 5, 128, 254, 255)
+    for mode in comparison.MODES:
+      for t in comparison.TYPES:
+        new, old = (comparison.measureComparison(impl, t, mode, values) for impl in comparison.IMPLEMENTATIONS)
+        self.assertEqual(new['errors'], 0)
+        self.assertLess(new['meanSteps'], 0.8 * old['meanSteps'])
+        self.assertLess(new['maxSteps'], old['maxSteps'])
+
+  def test_benchmarks_corpus(self):
+    for name, program in corpus.PROGRAMS.items():
+      bf = throughput.programCode(program, 8)
+      self.assertEqual(measure.run(bf, maxSteps=10**8).output, program.output, msg=name)
+
+  def test_benchmarks_throughput(self):
+    results = throughput.benchmark(('hello', 'hanoi'), cellBits=(8, 32), repeat=1)
+    self.assertEqual(len(results), 2 * 2 * len(throughput.ENGINES))
+    self.assertTrue(all(r['correct'] and r['stepsPerSecond'] > 0 and r['peakMemory'] > 0 for r in results))
+    self.assertEqual(throughput.compare(results, results), [])
+
+    slower = [dict(r, stepsPerSecond=r['stepsPerSecond'] / 2, steps=r['steps'] + (r['program'] == 'hanoi')) for r in results]
+    regressions = throughput.compare(slower, results)
+    self.assertEqual(len(regressions), len(results))
+    self.assertEqual(len([r for r, b, problems in regressions if len(problems) == 2]), len(results) // 2)
+
+  def test_benchmarks_codegen(self):
+    combinations = list(codegen.combinations(opcodes.OPCODES.DIVMOD, 'RRRV'))
+    self.assertEqual(len(combinations), len(codegen.REGISTER_SETS) * len(codegen.VALUES) ** 2)
+    self.assertEqual(codegen.name(combinations[1]), 'DIVMOD R0 R1 R2 1 | R2=0')
+    self.assertEqual(list(codegen.combinations(opcodes.OPCODES.END_IF, '')), [])
+
+    results = codegen.benchmark({'DIVMOD', 'POP', 'IF'})
+    self.assertEqual(len(results), len(codegen.REGISTER_SETS) * (3 * len(codegen.VALUES) ** 2 + len(codegen.VALUES)) + len(codegen.CONDITIONS))
+    self.assertTrue(all(r['steps'] is not None for r in results.values()))
+
+    worse = {key: dict(r, steps=r['steps'] + 1) for key, r in results.items()}
+    self.assertEqual(codegen.compare(results, worse), [])
+    self.assertEqual(len(codegen.compare(worse, results)), len(results))
+
+  def test_benchmarks_codegen_baseline(self):
+    with open(codegen.BASELINE) as f: baseline = json.load(f)
+    results = codegen.benchmark()
+    self.assertEqual(set(results), set(baseline))
+    self.assertEqual(codegen.compare(results, baseline), [])
+
+  def test_benchmarks_parallel(self):
+    self.assertEqual(parallel.program(50, seed=1), parallel.program(50, seed=1))
+    results = parallel.benchmark(300, workers=(2,), repeat=1, minLines=0)
+    self.assertEqual([r['workers'] for r in results], [None, 2])
+    self.assertTrue(all(r['identical'] and r['seconds'] > 0 for r in results))
@@ -100,6 +100,20 @@ class TestBFInterpreter(unittest.TestCase):
     self.runCmds('---')
     self.assertEqual(self.interpreter.memory[0], 253)
 
+  def test_bfInterpreter_memory_wrapping_cellBits(self):
+    self.interpreter = Interpreter(cellBits=16)
+    self.runCmds('+'*257)
+    self.assertEqual(self.interpreter.memory[0], 257)
+
+    self.runCmds('---')
+    self.assertEqual(self.interpreter.memory[0], 65533)
+
+    self.interpreter = Interpreter(cellBits=32)
+    self.runCmds('-')
+    self.assertEqual(self.interpreter.memory[0], 2**32 - 1)
+
+    with self.assertRaises(ValueError): Interpreter(cellBits=12)
+
   def test_bfInterpreter_cmd_loop(self):
     self.runCmds('++++[->+<]')
     self.assertEqual(self.interpreter.memory[0], 0)
@@ -7,16 +7,23 @@ Marius Lambacher, 2017
 """
 
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
 from ..bfalParser import Parser
+from ..bfalParser import handlers
+from ..bfalParser import opcodes
+from ..bfalParser.macros import MacroContext
+from ..bfInterpreter import Interpreter
 from..bfalParser.errors import *
 from . import dummyOpcodes
 from . import dummyMemoryLayout
 import numpy as np
 from io import StringIO
 import sys
+import pickle
 
 
 class DummyParser(Parser):
@@ -27,6 +34,7 @@ class DummyParser(Parser):
     self.OPCODES = dummyOpcodes.OPCODES
     self.OPCODE_IDENTIFIERS = dummyOpcodes.OPCODE_IDENTIFIERS
     self.OPCODE_TYPES = dummyOpcodes.OPCODE_TYPES
+    self.HANDLERS = dummyOpcodes.HANDLERS
 
     #self.CONDITIONS = dummyOpcodes.CONDITIONS
     #self.CONDITION_IDENTIFIERS = dummyOpcodes.CONDITION_IDENTIFIERS
@@ -105,3 +113,139 @@ class TestBFALParser(unittest.TestCase):
 
   def test_bfalParser_parseCommand(self):
     self.assertEqual(self.parser.parseCommand('YYY R0 42'), (self.parser.OPCODE_CLASSES.INSTRUCTION, self.parser.OPCODES.OPY, 'RV', ['R0', '42', None]))
+
+
+  def test_bfalParser_compileCommand_handlers(self):
+    mc = MacroContext(startPos=0, cells=dummyMemoryLayout.CELLS, temps=dummyMemoryLayout.TEMPS)
+    cmd = self.parser.parseCommand('ZZZ R1 3')
+    self.assertEqual(self.parser.compileCommand(mc, *cmd), '>>+++')
+
+    with self.assertRaises(UnknownCmdTypeError):
+      self.parser.compileCommand(mc, self.parser.OPCODE_CLASSES.INSTRUCTION, self.parser.OPCODES.OPX, 'RV', ['R1', '3', None])
+
+    self.parser.HANDLERS = {}
+    with self.assertRaises(UnknownOpcodeError):
+      self.parser.compileCommand(mc, *cmd)
+
+  def test_bfalParser_handlers_register(self):
+    registry = {}
+    handler = handlers.register(self.parser.OPCODES.OPY, 'R', 'RV', registry=registry)(dummyOpcodes._incRV)
+
+    self.assertIs(handler, dummyOpcodes._incRV)
+    self.assertEqual(registry, {(self.parser.OPCODES.OPY, 'R'): handler, (self.parser.OPCODES.OPY, 'RV'): handler})
+    with self.assertRaisesRegex(MissingHandlerError, 'OPX'):
+      handlers.validate(dummyOpcodes.OPCODE_TYPES, registry)
+
+  def test_bfalParser_handlers_builtin(self):
+    handlers.validate(opcodes.OPCODE_TYPES)
+    self.assertEqual(pickle.loads(pickle.dumps(handlers.HANDLERS)).keys(), handlers.HANDLERS.keys())      # sent to worker processes
+    self.assertEqual(handlers.names(), handlers.names(pickle.loads(pickle.dumps(handlers.HANDLERS))))
+
+
+  def test_bfalParser_compile_incremental(self):
+    parser = Parser()
+    parser.incremental = True
+
+    lines = ['SET R0 {}'.format(i) for i in range(20)] + ['NZ R0', 'IF', 'INC R1', 'ENDIF'] + ['INC R{} 2'.format(i%8) for i in range(20)]
+    parser.compile('\n'.join(lines))
+
+    edits = (
+      (lambda l: l[:5] + ['OUT R3'] + l[6:], 3),                    # edit
+      (lambda l: l[:5] + ['OUT R2', 'INC R2'] + l[5:], 4),          # insertion
+      (lambda l: l[:30] + l[31:], 2),                               # deletion
+      (lambda l: l[:5] + ['ALIAS FOO R2'] + l[5:], len(lines)),     # changes the state of all following lines
+    )
+
+    for edit, maxCompiled in edits:
+      lines = edit(lines)
+      with patch.object(parser, 'compileLine', wraps=parser.compileLine) as compileLine:
+        bf = parser.compile('\n'.join(lines))
+
+      self.assertEqual(bf, Parser().compile('\n'.join(lines)))
+      self.assertLessEqual(compileLine.call_count, maxCompiled)
+
+    lines += ['SET R1 255', 'OUT R1']
+    parser.compile('\n'.join(lines))
+    parser.cellBits = 16                  # the units refer to the old options
+    fresh = Parser()
+    fresh.cellBits = 16
+    self.assertEqual(parser.compile('\n'.join(lines)), fresh.compile('\n'.join(lines)))
+
+  def test_bfalParser_compile_parallel(self):
+    lines = ['SET R0 {}'.format(i) for i in range(20)] + ['ALIAS FOO R2', 'NZ R0', 'LOOP', 'INC FOO', 'NZ R0', 'IF', 'DEC R0', 'ENDIF', 'ENDLOOP']
+    lines += ['INC R{} 2'.format(i%8) for i in range(20)] + ['OUT FOO']
+    bfal = '\n'.join(lines)
+
+    parser = Parser()
+    parser.workers = 2
+    parser.parallelMinLines = 0
+
+    self.assertEqual(parser.compile(bfal), Parser().compile(bfal))
+    self.assertEqual(parser.ALIASES, {'FOO': 'R2'})
+    self.assertEqual(parser.units, [])
+
+  def test_bfalParser_compile_parallel_recompile(self):
+    lines = ['PRT "ab"', 'PUSH 3', 'SET R0 2'] + ['EQ R{} 1'.format(i%4) if i%3 else 'INC R{} 5'.format(i%4) for i in range(40)]
+    lines += ['PRT "hi"' if i%2 else 'OUT R{}'.format(i%4) for i in range(10)]        # PRT is probed as a split point
+    lines += ['NZ R0', 'LOOP', 'DEC R0', 'OUT R0', 'NZ R0', 'ENDLOOP', 'POP R1']
+    bfal = '\n'.join(lines)
+    bf = Parser().compile(bfal)
+
+    parser = Parser()
+    parser.workers = 2
+    parser.parallelMinLines = 0
+    with patch.object(Parser, 'compileParallel', autospec=True, side_effect=Parser.compileParallel) as compileParallel:
+      self.assertEqual(parser.compile(bfal), bf)
+      self.assertEqual(compileParallel.call_count, 1)
+
+    # wrong guesses of the exit positions: the segments are compiled again by the parser itself
+    with patch.object(Parser, 'exitPos', return_value=len(parser.PROGRAM_CELLS) - 1), \
+         patch.object(Parser, 'compileUnits', autospec=True, side_effect=Parser.compileUnits) as compileUnits:
+      self.assertEqual(parser.compile(bfal), bf)
+      self.assertEqual(compileUnits.call_count, parser.workers * 4 - 1)
+
+    parser.PASSES.append(lambda program: program)           # global passes are run over the units of a serial compilation
+    parser.compile(bfal)
+    self.assertEqual(len(parser.units), len(lines))
+
+  def test_bfalParser_compileStream(self):
+    lines = ['ALIAS FOO R2', 'ARRAY A 4', 'PRT "ab"', 'PUSH 5', 'SET R0 3', 'NZ R0', 'LOOP', 'INC FOO', 'STORE A 1 FOO', 'DEC R0', 'NZ R0', 'ENDLOOP']
+    lines += ['PRT "ab"', 'POP R1', 'LOAD R3 A 1', 'OUT FOO']
+    bfal = '\n'.join(lines)
+
+    parser = Parser()
+    parser.internStrings = True
+    self.assertEqual(''.join(parser.compileStream(lines)), parser.compile(bfal))
+
+    parser.streamLines = 2
+    parser.streamWindow = 3
+    chunks = list(parser.compileStream(lines))
+    self.assertGreater(len(chunks), len(lines) // 2)
+
+    for bf in (''.join(chunks), parser.compile(bfal)):
+      interpreter = Interpreter()
+      interpreter.load(bf)
+      with patch('sys.stdout', new=StringIO()) as out: interpreter.run()
+      self.assertEqual(out.getvalue(), 'abab\x03')
+      self.assertEqual([interpreter.memory[parser.PROGRAM_CELLS.index(r)] for r in ('R0', 'R1', 'R2', 'R3')], [0, 5, 3, 3])
+
+  def test_bfalParser_compileFile(self):
+    with tempfile.TemporaryDirectory() as directory:
+      src, dst = os.path.join(directory, 'main.bfal'), os.path.join(directory, 'main.bf')
+      with open(os.path.join(directory, 'inc.bfal'), 'w') as f: f.write('MACRO TWICE A\nINC A\nINC A\nENDMACRO\n')
+      with open(src, 'w') as f: f.write('INCLUDE "inc.bfal"\nPUSH 1\nTWICE R0\nTWICE R1\nPOP R1\n')
+
+      parser = Parser()
+      parser.compileFile(src, dst)
+      with open(dst) as f: bf = f.read()
+
+      self.assertEqual(parser.STACK_SLOTS, 1)
+      parser.sourcePath = src
+      with open(src) as f: self.assertEqual(bf, parser.compile(f.read()))
+
+    parser = Parser()                   # read once: the stack is scanned, but the code works the same
+    bf = ''.join(parser.compileStream(iter(['PUSH 7', 'POP R0'])))
+    interpreter = Interpreter()
+    interpreter.load(bf)
+    interpreter.run()
+    self.assertEqual((parser.STACK_SLOTS, interpreter.memory[parser.PROGRAM_CELLS.index('R0')]), (0, 7))
@@ -0,0 +1,100 @@
+"""
+Tests for the compile cache of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ..bfalParser import Parser
+from ..bfalParser.cache import CompileCache
+
+
+class TestCompileCache(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.cache = CompileCache(self.tmp.name)
+    self.parser = Parser(cache=self.cache)
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+
+  def test_cache_key(self):
+    self.assertEqual(self.cache.key('foo', 1), self.cache.key('foo', 1))
+    self.assertNotEqual(self.cache.key('foo', 1), self.cache.key('foo', 2))
+    self.assertNotEqual(self.cache.key('ab', 'c'), self.cache.key('a', 'bc'))
+
+  def test_cache_getPut(self):
+    self.assertIsNone(self.cache.get('foo'))
+    self.cache.put('foo', {'bf': '+'})
+    self.assertEqual(self.cache.get('foo'), {'bf': '+'})
+    self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+    self.assertEqual(os.listdir(self.tmp.name), ['foo.bfc'])        # no temporary files left behind
+
+  def test_cache_eviction(self):
+    cache = CompileCache(self.tmp.name, maxSize=300)
+    for i in range(10):
+      cache.put('entry{}'.format(i), {'bf': '+' * 90})
+      os.utime(cache.path('entry{}'.format(i)), (i, i))
+
+    self.assertLessEqual(sum(e[1] for e in cache.entries()), 300)
+    self.assertIsNotNone(cache.get('entry9'))
+    self.assertIsNone(cache.get('entry0'))
+
+
+  def test_cache_parser_hit(self):
+    bfal = 'ALIAS FOO R3\nSET FOO 42\nPRT "Hello"'
+    bf = Parser().compile(bfal)
+    self.assertEqual(self.parser.compile(bfal), bf)
+
+    with patch.object(Parser, 'compileIR', side_effect=AssertionError('compiled despite cache entry')):
+      self.parser.ALIASES = {}
+      self.assertEqual(self.parser.compile(bfal), bf)
+
+    self.assertEqual(self.parser.ALIASES, {'FOO': 'R3'})
+    self.assertEqual(self.cache.hits, 1)
+
+  def test_cache_parser_layout(self):
+    bfal = 'ARRAY A 4\nSTORE A 2 7\nPRT "hi"\nPUSH 1\nPOP R1\nSET R0 1'
+    parser = Parser(cache=self.cache)
+    bf = parser.compile(bfal)
+
+    with patch.object(Parser, 'preprocess', side_effect=AssertionError('preprocessed despite cache entry')):
+      hit = Parser(cache=self.cache)
+      self.assertEqual(hit.compile(bfal), bf)
+
+    self.assertEqual(self.cache.hits, 1)
+    for attr in ('PROGRAM_CELLS', 'STRINGS', 'DATA', 'ARRAYS', 'STACK_SLOTS', 'DEPTH', 'KNOWN'):
+      self.assertEqual(getattr(hit, attr), getattr(parser, attr), attr)
+    self.assertEqual(hit.units, [])
+
+  def test_cache_parser_includes(self):
+    path = os.path.join(self.tmp.name, 'lib.bfal')
+    with open(path, 'w') as f: f.write('MACRO SETTWO A\nSET A 2\nENDMACRO')
+
+    self.parser.sourcePath = os.path.join(self.tmp.name, 'main.bfal')
+    bfal = 'INCLUDE "lib.bfal"\nSETTWO R0'
+    bf = self.parser.compile(bfal)
+    self.assertEqual(self.parser.compile(bfal), bf)
+    self.assertEqual(self.cache.hits, 1)
+    self.assertEqual(list(self.parser.MACROS), ['SETTWO'])
+    self.assertEqual(list(self.parser.INCLUDES), [path])
+
+    with open(path, 'w') as f: f.write('MACRO SETTWO A\nSET A 3\nENDMACRO')
+    self.assertNotEqual(self.parser.compile(bfal), bf)
+    self.assertEqual(self.cache.hits, 1)
+
+    self.parser.sourcePath = None                 # the include is resolved differently
+    with self.assertRaises(SystemExit), patch('sys.stdout'): self.parser.compile(bfal)
+
+  def test_cache_parser_invalidation(self):
+    self.parser.compile('SET R0 1')
+    self.parser.compile('SET R0 1', initConstants=False)
+    self.parser.CELLS = ['R0'] + [c for c in self.parser.CELLS if c != 'R0']
+    self.parser.compile('SET R0 1')
+    self.assertEqual(self.cache.hits, 0)
+    self.assertEqual(len(self.cache.entries()), 3)
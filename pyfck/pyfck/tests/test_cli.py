@@ -0,0 +1,57 @@
+"""
+Tests for the command line interface
+
+Marius Lambacher, 2018
+"""
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from .. import cli
+
+
+class TestCli(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.source = os.path.join(self.tmp.name, 'hi.bfal')
+    with open(self.source, 'w') as f: f.write('SET R0 72\nOUT R0\nPRT "i"\n')
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def main(self, *argv):
+    with patch('sys.stdout', new=io.StringIO()) as out:
+      status = cli.main(['--cache-dir', os.path.join(self.tmp.name, 'cache')] + list(argv))
+    return status, out.getvalue()
+
+
+  def test_cli_compile(self):
+    output = os.path.join(self.tmp.name, 'hi.bf')
+    self.assertEqual(self.main('compile', self.source, '-o', output), (0, ''))
+    with open(output) as f: bf = f.read()
+
+    self.assertEqual(self.main('compile', self.source), (0, bf))
+    self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, 'cache'))), 1)          # compiled once, then loaded
+
+    self.assertEqual(self.main('--no-cache', 'compile', '--stream', self.source, '-o', output), (0, ''))
+    with open(output) as f: self.assertEqual(f.read(), bf)
+
+  def test_cli_run(self):
+    self.assertEqual(self.main('run', self.source), (0, 'Hi'))
+    self.assertEqual(self.main('exec', 'PRT "a b"', 'SET R1 33', 'OUT R1'), (0, 'a b!'))
+
+    program = os.path.join(self.tmp.name, 'hi.bf')
+    with open(program, 'w') as f: f.write('+' * 65 + '.<')
+    status, out = self.main('run', program)
+    self.assertEqual((status, out.startswith('A\nError while running the program')), (-1, True))
+
+  def test_cli_lazyImports(self):
+    code = 'import sys, pyfck.cli; pyfck.cli.main(["--no-cache", "compile", sys.argv[1]]); print(sorted(m for m in ("numpy", "pyfck.bfInterpreter") if m in sys.modules))'
+    out = subprocess.run([sys.executable, '-c', code, self.source], stdout=subprocess.PIPE, universal_newlines=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))).stdout
+    self.assertTrue(out.endswith('[]\n'), out)
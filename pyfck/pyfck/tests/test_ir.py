@@ -0,0 +1,77 @@
+"""
+Tests for the IR of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import unittest
+
+from ..bfalParser import ir, macros
+from ..bfalParser.errors import *
+from ..bfInterpreter import Interpreter
+import numpy as np
+
+
+class TestIR(unittest.TestCase):
+  def test_ir_parse_basic(self):
+    self.assertEqual(ir.parse('>>+++<-.,[-]'), [ir.Move(2), ir.Add(3), ir.Move(-1), ir.Add(-1), ir.Output(), ir.Input(), ir.Clear()])
+
+  def test_ir_parse_mergesRuns(self):
+    self.assertEqual(ir.parse('>><<<+-+\nfoo'), [ir.Move(-1), ir.Add(1)])
+
+  def test_ir_parse_loops(self):
+    self.assertEqual(ir.parse('+[->+<[]]'), [ir.Add(1), ir.Loop([ir.Add(-1), ir.Move(1), ir.Add(1), ir.Move(-1), ir.Loop([])])])
+
+  def test_ir_parse_positions(self):
+    ops = ir.parse('>>[->+<]>+[<]+', pos=3)
+    self.assertEqual([op.pos for op in ops], [3, 5, 5, 6, 6, None])
+    self.assertEqual([op.pos for op in ops[1].body], [5, 5, 6, 6])
+
+  def test_ir_parse_bracketErrors(self):
+    with self.assertRaises(IRParseError): ir.parse('[[]')
+    with self.assertRaises(IRParseError): ir.parse('[]]')
+
+  def test_ir_emit_roundTrip(self):
+    bf = '>>+++<-.,[-]+[->>+<<[<]]'
+    self.assertEqual(ir.emit(ir.parse(bf)), bf)
+
+  def test_ir_emit_macroCallNewlines(self):
+    program = [ir.MacroCall('A', ir.parse('+>')), ir.MacroCall('B', []), ir.MacroCall('C', ir.parse('.'))]
+    self.assertEqual(ir.emit(program), '+>\n.\n')
+
+  def test_ir_lower(self):
+    program = [ir.MacroCall('A', ir.parse('+>[-]<[-<]'))]
+    self.assertEqual(ir.lower(program), '+>0<[-<]')
+
+  def test_ir_lower_interpreter(self):
+    interpreter = Interpreter(memorySize=16)
+    interpreter.loadCmds(ir.lower(ir.parse('+++>++[-]<[->+++<]')))
+    interpreter.run()
+    np.testing.assert_array_equal(interpreter.memory[:3], np.array([0, 9, 0], dtype='u1'))
+
+  def test_ir_foldRuns(self):
+    program = [ir.Move(2), ir.Move(-2), ir.Add(1), ir.Add(2), ir.Clear(), ir.Clear(), ir.Loop([ir.Move(1), ir.Move(1)]), ir.Move(1)]
+    self.assertEqual(ir.foldRuns(program), [ir.Add(3), ir.Clear(), ir.Loop([ir.Move(2)]), ir.Move(1)])
+
+  def test_ir_foldRuns_keepsBlocks(self):
+    program = [ir.MacroCall('A', [ir.Move(1)]), ir.MacroCall('B', [ir.Move(-1)])]
+    self.assertEqual(ir.foldRuns(program), program)
+
+  def test_ir_localPass(self):
+    self.assertTrue(ir.isLocal(ir.foldRuns))
+    self.assertFalse(ir.isLocal(lambda ops: ops))
+
+    program = [ir.MacroCall('A', [ir.Move(1), ir.Move(1)]), ir.MacroCall('B', [ir.Add(1), ir.Add(-1), ir.Clear()])]
+    self.assertEqual(ir.foldRuns(program), [ir.MacroCall(call.name, ir.foldRuns(call.body)) for call in program])
+
+  def test_ir_walk(self):
+    program = [ir.MacroCall('A', [ir.Add(1), ir.Loop([ir.Output()])])]
+    self.assertEqual([type(op) for op in ir.walk(program)], [ir.MacroCall, ir.Add, ir.Loop, ir.Output])
+
+  def test_ir_macroContext_emit(self):
+    with macros.MacroContext(startPos=0) as mc:
+      call = mc.emit('INC', lambda s: s.inc('R0', 2))
+
+    self.assertEqual(call.name, 'INC')
+    self.assertEqual((call.startPos, call.endPos), (0, mc.CELLS.index('R0')))
+    self.assertEqual(call.body, [ir.Move(mc.CELLS.index('R0')), ir.Add(2)])
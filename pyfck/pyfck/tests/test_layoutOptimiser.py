@@ -0,0 +1,79 @@
+"""
+Tests for the memory layout optimiser of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import unittest
+
+from ..bfalParser import Parser, memoryLayout, layoutOptimiser
+from ..bfalParser.errors import *
+from ..bfInterpreter import Interpreter
+
+
+class TestLayoutOptimiser(unittest.TestCase):
+  def setUp(self):
+    self.bfal = '\n'.join(['SET R7 5', 'SET R0 3', 'NZ R0', 'LOOP', 'INC R7 2', 'LT R6 30', 'ADD R6 R6 R7', 'DEC R0', 'NZ R0', 'ENDLOOP', 'MUL R5 R7 R6'])
+
+  def runBfal(self, parser):
+    """Compiles and runs self.bfal, returns the compiled code and the registers"""
+    bf = parser.compile(self.bfal)
+    interpreter = Interpreter(memorySize=100)
+    interpreter.load(bf)
+    interpreter.run()
+    return bf, {r: interpreter.memory[parser.CELLS.index(r)] for r in memoryLayout.REGISTERS}
+
+
+  def test_layoutOptimiser_normalise(self):
+    transitions = layoutOptimiser.normalise({('R0', 'R1'): 2, ('R1', 'R0'): 3, ('R2', 'R2'): 4})
+    self.assertEqual(transitions, {('R0', 'R1'): 5})
+
+  def test_layoutOptimiser_travelCost(self):
+    self.assertEqual(layoutOptimiser.travelCost({('A', 'C'): 3, ('C', 'B'): 1}, ['A', 'B', 'C']), 7)
+
+  def test_layoutOptimiser_profileTransitions(self):
+    transitions = layoutOptimiser.profileTransitions('+++[>>+<<-]>>>,', ['A', 'B', 'C'])
+    self.assertEqual(transitions, {('A', 'C'): 3, ('C', 'A'): 3})
+
+  def test_layoutOptimiser_profileTransitions_maxSteps(self):
+    transitions = layoutOptimiser.profileTransitions('+[>+<]', ['A', 'B'], maxSteps=11)
+    self.assertEqual(transitions, {('A', 'B'): 3, ('B', 'A'): 2})
+
+  def test_layoutOptimiser_optimiseLayout(self):
+    cells = memoryLayout.CELLS
+    transitions = {('CA', 'R7'): 10, ('R7', 'T7'): 5}
+    layout = layoutOptimiser.optimiseLayout(transitions, cells)
+
+    self.assertEqual(sorted(layout), sorted(cells))
+    self.assertEqual(layout[:6], memoryLayout.COMPARISON + ['RC'])
+    self.assertEqual(layout[-2:], memoryLayout.STACK)
+    self.assertEqual(layout[6:8], ['R7', 'T7'])
+    self.assertLess(layoutOptimiser.travelCost(transitions, layout), layoutOptimiser.travelCost(transitions, cells))
+
+  def test_layoutOptimiser_optimiseLayout_layoutError(self):
+    with self.assertRaises(LayoutError): layoutOptimiser.optimiseLayout({}, ['R0'] + memoryLayout.CELLS)
+
+  def test_layoutOptimiser_parser_static(self):
+    parser = Parser()
+    bf, registers = self.runBfal(parser)
+    self.assertEqual(registers['R5'], 41)
+
+    layout = parser.optimiseLayout(self.bfal)
+    self.assertEqual(layout, parser.CELLS)
+    self.assertNotEqual(layout, memoryLayout.CELLS)
+
+    optimisedBf, optimisedRegisters = self.runBfal(parser)
+    self.assertLess(len(optimisedBf), len(bf))
+    self.assertEqual(optimisedRegisters, registers)
+
+  def test_layoutOptimiser_parser_profile(self):
+    parser = Parser()
+    bf, registers = self.runBfal(parser)
+    cost = layoutOptimiser.travelCost(layoutOptimiser.profileTransitions(bf.replace('[-]', '0'), parser.CELLS), parser.CELLS)
+
+    parser.optimiseLayout(self.bfal, inputs=b'')
+    optimisedBf, optimisedRegisters = self.runBfal(parser)
+    optimisedCost = layoutOptimiser.travelCost(layoutOptimiser.profileTransitions(optimisedBf.replace('[-]', '0'), parser.CELLS), parser.CELLS)
+
+    self.assertLess(optimisedCost, cost)
+    self.assertEqual(optimisedRegisters, registers)
@@ -0,0 +1,370 @@
+"""
+Tests for the macros of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import contextlib
+import io
+import os
+import unittest
+
+from ..benchmarks import measure
+from ..bfalParser import Parser, macros
+from ..bfalParser.errors import *
+from ..bfInterpreter import Interpreter
+
+
+class TestMacros(unittest.TestCase):
+  def runBfal(self, parser, bfal):
+    """Compiles and runs bfal, returns the compiled code and the interpreter; the output is stored in self.output"""
+    bf = parser.compile(bfal)
+    interpreter = Interpreter(memorySize=200)
+    interpreter.load(bf)
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output): interpreter.run()
+    self.output = output.getvalue()
+
+    return bf, interpreter
+
+
+  def divide(self, bfal, values, dividend='R0', divisor='R1', dest='R2'):
+    """Runs the division bfal for all pairs of values and checks that only dest changes"""
+    parser = Parser()
+    parser.trackRegisters = False
+    cells = parser.CELLS
+
+    rvBf = {}
+    rrBf = parser.compile(bfal.format(divisor), initConstants=False)
+    for b in values:
+      if b not in rvBf: rvBf[b] = parser.compile(bfal.format(b), initConstants=False)
+
+      for a in values:
+        for bf in (rrBf, rvBf[b]):
+          memory = {cells.index(dest): 9, cells.index('C1'): 1, cells.index(dividend): a, cells.index(divisor): b, cells.index('RC'): 77}
+          m = measure.run(bf, memory, memorySize=len(cells))
+
+          memory[cells.index(dest)] = a // b if b else 0
+          self.assertEqual(m.memory, [memory.get(i, 0) for i in range(len(cells))], (bf, a, b))
+
+
+  def test_macros_constantPlan(self):
+    self.assertEqual(macros.constantPlan(9, 1, 1, 0), (9, None))
+    cost, (a, b, c) = macros.constantPlan(120, 1, 1, 0)
+    self.assertEqual(a*b + c, 120)
+    self.assertEqual(cost, 1 + a + 3 + 3 + abs(b) + abs(c))
+    self.assertLess(cost, 120)
+
+  def test_macros_constantPlan_wraparound(self):
+    cost, (a, b, c) = macros.constantPlan(-100, 1, 1, 0)
+    self.assertEqual((a*b + c) % 256, 156)
+
+  def test_macros_constantPlan_steps(self):
+    for val in (20, 64, 100, 128, -128):
+      self.assertIsNone(macros.constantPlan(val, 1, 1, 0, 'steps')[1])
+
+  def test_macros_constantPlan_costModelError(self):
+    with self.assertRaises(CostModelError): macros.constantPlan(100, 1, 1, 0, 'fast')
+
+  def test_macros_addConst(self):
+    with macros.MacroContext() as mc:
+      bf = mc.addConst('R0', 120)
+
+    self.assertIn('[', bf)
+    self.assertLess(len(bf), 60)
+    self.assertEqual(mc.getCurPos(), mc.CELLS.index('R0'))
+    self.assertFalse(mc.LOCKED)
+
+  def test_macros_addConst_linear(self):
+    with macros.MacroContext(costModel=None) as mc:
+      self.assertEqual(mc.addConst('C0', 300), '+' * 44)
+
+  def test_macros_addConstRelative(self):
+    with macros.MacroContext() as mc:
+      interpreter = Interpreter(memorySize=5)
+      interpreter.load('>' + mc.addConstRelative(-77, -1) + '>' + mc.addConstRelative(200, 2))
+      interpreter.run()
+
+    self.assertEqual(list(interpreter.memory), [0, 179, 200, 0, 0])
+    self.assertEqual(mc.getCurPos(), 0)
+
+  def test_macros_constants(self):
+    program = 'SET R3 {0}\nINC R5 {0}\nDEC R1 {0}\nPUSH {0}\nPUSH 7'
+    for costModel in macros.COST_MODELS + (None,):
+      parser = Parser()
+      parser.costModel = costModel
+
+      for val in list(range(0, 256, 7)) + [127, 128, 129, 255]:
+        bf, interpreter = self.runBfal(parser, program.format(val))
+        memory = interpreter.memory
+
+        cells = [memory[parser.PROGRAM_CELLS.index(c)] for c in ('R3', 'R5', 'R1', 'STACK.0', 'STACK.1')]
+        self.assertEqual(cells, [val, val, -val % 256, val, 7])
+        self.assertFalse(any(memory[parser.CELLS.index(t)] for t in parser.TEMPS))
+
+  def test_macros_constants_size(self):
+    program = '\n'.join('SET R0 {}\nPUSH {}'.format(i*37 % 256, i*91 % 256) for i in range(20))
+
+    parser = Parser()
+    parser.staticStack = False
+    size = len(parser.compile(program))
+    parser.costModel = None
+    self.assertLess(size, 0.6 * len(parser.compile(program)))
+
+  def test_macros_primingBases(self):
+    self.assertEqual(macros.primingBases(b'Hello World', 4), [ord('l'), ord('W'), ord(' ')])
+    self.assertEqual(macros.primingBases(b'Hello World', 1), [ord('l')])
+    self.assertEqual(macros.primingBases(b'!?', 4), [])
+
+  def test_macros_printTextOptimised(self):
+    texts = ('Hello World!\\n', 'ERROR: value out of range (code 42)', 'x', '!?')
+    for costModel in macros.COST_MODELS + (None,):
+      parser = Parser()
+      parser.costModel = costModel
+
+      for text in texts:
+        bf, interpreter = self.runBfal(parser, 'SET R3 5\nPRT "{}"\nINC R3'.format(text))
+        self.assertEqual(self.output, text.replace('\\n', '\n'))
+        self.assertEqual(interpreter.memory[parser.CELLS.index('R3')], 6)
+        self.assertFalse(any(interpreter.memory[parser.CELLS.index(t)] for t in parser.TEMPS))
+
+  def test_macros_printTextOptimised_size(self):
+    text = 'The Quick Brown Fox Jumps Over 13 Lazy Dogs.'
+    with macros.MacroContext() as mc:
+      optimised = mc.printTextOptimised(text)
+
+    with macros.MacroContext(costModel=None) as mc:
+      plain = mc.printTextOptimised(text)
+
+    self.assertLess(2 * len(optimised), len(plain))
+
+  def test_macros_internStrings(self):
+    bfal = '\n'.join(['PRT "Status: OK\\n"', 'PRT "once"', 'PUSH 9', 'PRT "Status: OK\\n"'])
+    parser = Parser()
+    parser.staticStack = False
+    bf, interpreter = self.runBfal(parser, bfal)
+    output = self.output
+
+    parser.internStrings = True
+    internedBf, interpreter = self.runBfal(parser, bfal)
+    self.assertEqual(self.output, output)
+    self.assertEqual(internedBf.count('[.>]'), 2)
+    self.assertEqual(list(parser.STRINGS), ['Status: OK\\n'])
+    self.assertEqual(interpreter.memory[parser.PROGRAM_CELLS.index('STACK') + 3], 9)
+    self.assertEqual(parser.PROGRAM_CELLS.index('S0.0'), parser.CELLS.index('STACK'))
+    self.assertEqual(parser.PROGRAM_CELLS[:parser.CELLS.index('STACK')], parser.CELLS[:parser.CELLS.index('STACK')])
+
+    parser.internStringTable(['PRT "R1"', 'PRT "R1"', 'PRT "42"', 'PRT "42"'])     # not printable as text
+    self.assertEqual(parser.STRINGS, {})
+
+    parser.internMinCount = 3
+    parser.compile(bfal)
+    self.assertEqual(parser.STRINGS, {})
+    self.assertEqual(parser.PROGRAM_CELLS, parser.CELLS)
+
+  def test_macros_trackValues(self):
+    bfal = '\n'.join(['SET R0 5', 'SET R0 7', 'SET R1 R0', 'ADD R2 R0 R1', 'EQ R2 14', 'OUT R2'])
+    parser = Parser()
+    bf, interpreter = self.runBfal(parser, bfal)
+    self.assertEqual(parser.KNOWN, {'R0': 7, 'R1': 7, 'R2': 14, 'RC': 1})
+
+    parser.trackRegisters = False
+    plainBf, plain = self.runBfal(parser, bfal)
+    self.assertLess(len(bf), len(plainBf))
+    for r in ('R0', 'R1', 'R2', 'RC'):
+      self.assertEqual(interpreter.memory[parser.CELLS.index(r)], plain.memory[parser.CELLS.index(r)])
+
+  def test_macros_trackValues_controlFlow(self):
+    parser = Parser()
+    parser.compile('\n'.join(['SET R0 3', 'NZ R0', 'LOOP', 'DEC R0', 'NZ R0', 'ENDLOOP', 'SET R1 R0']))
+    self.assertEqual(parser.KNOWN, {'RC': 0})
+
+    known = {'R0': 3, 'RC': 1}
+    parser.trackValues(known, parser.OPCODE_CLASSES.CONTROLFLOW_START, parser.OPCODES.IF, '', [None] * 3)
+    self.assertEqual(known, {})
+
+  def test_macros_trackValues_knownZeroBlockEnd(self):
+    # RC is known to be 0 at the end of the block: the block still has to be closed on RC
+    for bfal, expected in ((['SET R3 9', 'IF', 'LT 10 5', 'SET R3 0', 'ENDIF', 'DEC R3 7'], 2),
+                           (['SET R3 9', 'IF', 'FALSE', 'STZ R3', 'ENDIF', 'IF', 'ENDIF', 'DEC R3 7'], 2),
+                           (['SET R3 9', 'TRUE', 'LOOP', 'DEC R3', 'NOT', 'SET R2 0', 'ENDLOOP', 'DEC R3 7'], 1)):
+      parser = Parser()
+      bf, interpreter = self.runBfal(parser, '\n'.join(bfal))
+      self.assertEqual(interpreter.memory[parser.PROGRAM_CELLS.index('R3')], expected, bfal)
+      self.assertEqual(interpreter.memory[parser.PROGRAM_CELLS.index('RC')], 0, bfal)
+
+  def test_macros_foldCommand(self):
+    parser = Parser()
+    INSTRUCTION = parser.OPCODE_CLASSES.INSTRUCTION
+    OPCODES = parser.OPCODES
+    known = {'R0': 3, 'R1': 5}
+
+    self.assertEqual(parser.foldCommand(known, INSTRUCTION, OPCODES.EQUAL, 'RV', ['R0', '3', None]), (OPCODES.EQUAL, 'VV', ['3', '3', None]))
+    self.assertEqual(parser.foldCommand(known, INSTRUCTION, OPCODES.GREATER, 'RR', ['R1', 'R2', None]), (OPCODES.LESS, 'RV', ['R2', '5', None]))
+    self.assertEqual(parser.foldCommand(known, INSTRUCTION, OPCODES.ADD, 'RRR', ['R0', 'R2', 'R1']), (OPCODES.ADD, 'RRV', ['R0', 'R2', '5']))
+    self.assertEqual(parser.foldCommand(known, INSTRUCTION, OPCODES.INC, 'RR', ['R0', 'R1', None]), (OPCODES.INC, 'RV', ['R0', '5', None]))
+    self.assertEqual(parser.foldCommand(known, INSTRUCTION, OPCODES.OUTPUT, 'R', ['R0', None, None]), (OPCODES.OUTPUT, 'R', ['R0', None, None]))
+
+  def test_macros_deadRegisters(self):
+    parser = Parser()
+    lines = ['SET R1 R0', 'SET R0 3', 'ADD R2 R1 R3', 'SET R1 7', 'SET R3 1', 'NZ R2', 'LOOP', 'ENDLOOP']
+    dead = [{'RC', 'R2', 'R0'}, {'RC', 'R2'}, {'RC', 'R1', 'R3'}, {'RC', 'R3'}, {'RC'}, set(), set(), set()]
+    self.assertEqual(parser.deadRegisters(lines), dead)
+
+  def test_macros_destructiveTransfers(self):
+    bfal = '\n'.join(['SET R1 R0', 'SET R0 0', 'ADD R2 R1 R3', 'MUL R4 R2 3', 'STZ R1', 'STZ R2', 'STZ R3'])
+
+    steps = []
+    for destructive in (True, False):
+      parser = Parser()
+      parser.trackRegisters = False
+      parser.destructiveTransfers = destructive
+
+      interpreter = Interpreter(memorySize=200, debugging=True)
+      interpreter.load(parser.compile(bfal, initConstants=False))
+      interpreter.run()
+      interpreter.memory[parser.CELLS.index('R0')] = 20
+      interpreter.memory[parser.CELLS.index('R3')] = 30
+
+      n = 0
+      while interpreter.running:
+        interpreter.step()
+        n += 1
+
+      self.assertEqual([interpreter.memory[parser.CELLS.index(r)] for r in ('R0', 'R1', 'R2', 'R3', 'R4')], [0, 0, 0, 0, 150])
+      steps.append(n)
+
+    self.assertLess(steps[0], 0.6 * steps[1])
+
+  def test_macros_divModCell(self):
+    values = (0, 1, 2, 3, 7, 10, 16, 100, 127, 128, 200, 254, 255)
+    self.divide('DIV R2 R0 {}', values)
+    self.divide('DIV R0 R0 {}', values, dest='R0')
+    self.divide('DIV R1 R0 {}', values, dest='R1')
+
+  def test_macros_divModCell_size(self):
+    parser = Parser()
+    sizes = [len(parser.compile('DIV R2 R0 {}'.format(b), initConstants=False)) for b in (2, 50, 200)]
+    self.assertLess(max(sizes) - min(sizes), 40)
+
+  @unittest.skipUnless(os.environ.get('PYFCK_EXHAUSTIVE'), 'set PYFCK_EXHAUSTIVE to test all 256x256 operands')
+  def test_macros_divModCell_exhaustive(self):
+    self.divide('DIV R2 R0 {}', range(256))
+
+  def test_macros_divModCell_steps(self):
+    parser = Parser()
+    parser.trackRegisters = False
+    cells = parser.CELLS
+
+    steps = []
+    for bfal in ('DIVMOD R2 R3 R0 R1', 'DIV R2 R0 R1\nMUL R4 R2 R1\nSUB R3 R0 R4'):
+      m = measure.run(parser.compile(bfal, initConstants=False), {cells.index('C1'): 1, cells.index('R0'): 200, cells.index('R1'): 7}, memorySize=len(cells))
+      self.assertEqual([m.memory[cells.index(r)] for r in ('R0', 'R1', 'R2', 'R3')], [200, 7, 28, 4])
+      steps.append(m.steps)
+
+    self.assertLess(2 * steps[0], steps[1])
+
+  def test_macros_arrayWalk_steps(self):
+    for bfal in ('ARRAY A 256\nSTORE A R1 R2\nLOAD R3 A R1', 'ARRAY A 256\nSTORE A R1 9\nLOAD R3 A R1'):
+      parser = Parser()
+      bf = parser.compile(bfal, initConstants=False)
+      cells = parser.PROGRAM_CELLS
+
+      steps = []
+      for index in (0, 85, 170, 255):
+        m = measure.run(bf, {cells.index('R1'): index, cells.index('R2'): 9}, memorySize=len(cells))
+        self.assertEqual([m.memory[cells.index(c)] for c in ('R3', 'A.{}'.format(index), 'A.H1', 'A.M{}'.format(index))], [9, 9, 0, 0])
+        steps.append(m.steps)
+
+      growth = [b - a for a, b in zip(steps, steps[1:])]
+      self.assertLess(max(growth), 1.5 * min(growth), msg=steps)          # linear: quadratic growth would triple from the first to the last
+
+  def test_macros_stackDepths(self):
+    parser = Parser()
+    lines = ['PUSH 1', 'PUSH R0', 'NZ R0', 'LOOP', 'POP R1', 'PUSH R1', 'ENDLOOP', 'POP R2', 'POP R3']
+    self.assertEqual(parser.stackDepths(lines), [1, 2, 2, 2, 1, 2, 2, 1, 0])
+    self.assertIsNone(parser.stackDepths(['NZ R0', 'LOOP', 'PUSH 1', 'NZ R0', 'ENDLOOP']))     # grows every iteration
+    self.assertIsNone(parser.stackDepths(['POP R0']))
+
+  def test_macros_staticStack(self):
+    bfal = '\n'.join(['SET R0 200', 'PUSH R0', 'PUSH 7', 'PUSH R0', 'POP R1', 'POP R2', 'SET R0 3', 'PUSH R2'])
+
+    runs = []
+    for static in (True, False):
+      parser = Parser()
+      parser.staticStack = static
+      m = measure.run(parser.compile(bfal), memorySize=200)
+      cells = parser.PROGRAM_CELLS
+      self.assertEqual([m.memory[cells.index(r)] for r in ('R0', 'R1', 'R2')], [3, 200, 7])
+      runs.append((parser, m))
+
+    (parser, m), (scanning, scanned) = runs
+    self.assertEqual((parser.STACK_SLOTS, scanning.STACK_SLOTS), (3, 0))
+    self.assertEqual(parser.PROGRAM_CELLS.index('STACK.0'), parser.CELLS.index('STACK'))
+    self.assertEqual([m.memory[parser.PROGRAM_CELLS.index(c)] for c in ('STACK.0', 'STACK.1', 'STACK.2')], [200, 7, 0])
+    self.assertLess(m.steps, 0.8 * scanned.steps)
+
+  def test_macros_cellBits(self):
+    bfal = '\n'.join(['SET R0 1000', 'INC R0 R0', 'SET R1 300', 'DIVMOD R2 R3 R0 R1', 'DEC R4'])
+
+    parser = Parser()
+    parser.cellBits = 16
+    bf = parser.compile(bfal)
+    self.assertLess(len(bf), 500)         # constants are generated by loops, not by increments
+
+    interpreter = Interpreter(memorySize=200, cellBits=16)
+    interpreter.load(bf)
+    interpreter.run()
+    cells = parser.PROGRAM_CELLS
+    self.assertEqual([interpreter.memory[cells.index(r)] for r in ('R0', 'R2', 'R3', 'R4')], [2000, 6, 200, 65535])
+
+    m = measure.run(bf, memorySize=200, cellBits=16)
+    self.assertEqual(list(m.memory), list(interpreter.memory))
+
+  def test_macros_memoized(self):
+    def compileEq(mc, a, b):
+      return mc.copyCell('CB', a) + mc.ifCB(lambda s: s.dec(b))
+
+    mc = macros.MacroContext()
+    mc.moveToCell('R2')
+    first = compileEq(mc, 'R0', 'RC')
+    pos = mc.getCurPos()
+
+    mc.moveToCell('R2')
+    self.assertEqual(compileEq(mc, 'R0', 'RC'), first)        # new lambdas of the same code and captured values hit the memo
+    self.assertEqual(mc.getCurPos(), pos)
+    self.assertEqual(mc.memoInfo().hits, 2)
+    self.assertNotEqual(compileEq(mc, 'R0', 'R1'), first)
+
+    fresh = macros.MacroContext(memoSize=0)
+    fresh.moveToCell('R2')
+    self.assertEqual(compileEq(fresh, 'R0', 'RC'), first)
+    self.assertEqual(fresh.memoInfo(), macros.MemoInfo(0, 0, 0, 0, 0))
+
+  def test_macros_memoized_keys(self):
+    mc = macros.MacroContext(memoSize=2)
+    for val in (1, 2, 3): mc.addConst('R0', val)
+    self.assertEqual((mc.memoInfo().misses, mc.memoInfo().size), (3, 2))        # least recently used entries are dropped
+
+    counter = {'calls': 0}
+    def cmds(s):
+      counter['calls'] += 1
+      return '+'
+
+    mc.ifCB(cmds)
+    mc.ifCB(cmds)
+    self.assertEqual(counter['calls'], 2)             # captures a dict, whose contents may change
+    self.assertEqual(mc.memoInfo().uncached, 2)
+
+    with mc.lockTemp('T0'): locked = mc.addCell('R1', 'R0')
+    self.assertNotEqual(mc.addCell('R1', 'R0'), locked)
+
+  def test_macros_memoized_parser(self):
+    bfal = '\n'.join('INP R{}\nGT R0 R1\nADD R2 R1 R3\nDIV R3 R2 R0'.format(i % 4) for i in range(50))
+    parser = Parser()
+    bf = parser.compile(bfal)
+
+    self.assertGreater(parser.MEMO_INFO.hits, parser.MEMO_INFO.misses)
+    parser.macroMemoSize = 0
+    self.assertEqual(parser.compile(bfal), bf)
@@ -0,0 +1,63 @@
+"""
+Tests for the memory layout of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import itertools
+import unittest
+
+from ..bfalParser import memoryLayout, macros
+
+
+class TestMemoryLayout(unittest.TestCase):
+  def setUp(self):
+    self.layout = memoryLayout.Layout(['T0', 'R0', 'T1', 'R1', 'R2', 'T2', 'R1'], ['T0', 'T1', 'T2'])
+
+
+  def test_memoryLayout_layout_index(self):
+    self.assertEqual([self.layout.index(c) for c in ('T0', 'R0', 'R2', 'T2')], [0, 1, 4, 5])
+    self.assertEqual(self.layout.index('R1'), 3)
+    with self.assertRaises(ValueError): self.layout.index('R3')
+
+  def test_memoryLayout_layout_findTemp(self):
+    self.assertEqual(self.layout.findTemp(1), 'T1')
+    self.assertEqual(self.layout.findTemp(2), 'T2')
+    self.assertEqual(self.layout.findTemp(5), None)
+    self.assertEqual(self.layout.findTemp(4, -1), 'T1')
+    self.assertEqual(self.layout.findTemp(2, -1), None)         # the first cell is excluded when searching to the left
+
+  def test_memoryLayout_layout_findTemp_locked(self):
+    self.assertEqual(self.layout.findTemp(1, locked={'T1'}), 'T2')
+    self.assertEqual(self.layout.findTemp(1, locked={'T1', 'T2'}), None)
+    self.assertEqual(self.layout.findTemp(6, -1, locked={'T2'}), 'T1')
+
+  def test_memoryLayout_getLayout(self):
+    self.assertIs(memoryLayout.getLayout(), memoryLayout.getLayout(list(memoryLayout.CELLS), list(memoryLayout.TEMPS)))
+    self.assertEqual(memoryLayout.getLayout().cells, tuple(memoryLayout.CELLS))
+
+  def test_memoryLayout_macroContext_findTemp(self):
+    cells = memoryLayout.CELLS
+    temps = memoryLayout.TEMPS
+
+    def findTemp(cell, direction, locked):        # linear search over the cells
+      step = 1 if direction >= 0 else -1
+      stop = len(cells) if direction >= 0 else 0
+      return next((cells[i] for i in range(cells.index(cell)+step, stop, step) if cells[i] in temps and cells[i] not in locked), None)
+
+    with macros.MacroContext() as mc:
+      for locked in itertools.chain([()], itertools.combinations(temps, 1), itertools.combinations(temps, 2)):
+        for cell in locked: mc.LOCKED[cell] += 1
+
+        for cell, direction in itertools.product(cells, (1, -1)):
+          self.assertEqual(mc.findTemp(cell, direction), findTemp(cell, direction, locked))
+
+        mc.LOCKED.clear()
+
+  def test_memoryLayout_macroContext_lockTemp(self):
+    with macros.MacroContext() as mc:
+      with mc.lockTemp('T0'):
+        with mc.lockTemp('T0'): pass
+        self.assertIn('T0', mc.LOCKED)
+
+      self.assertNotIn('T0', mc.LOCKED)
@@ -215,6 +215,24 @@ class TestOpcodes(TestCase):
     for reg, val in self.parser.CONSTANTS:
       self.setCell(reg, val, memory)
 
+  def setEntries(self, memory, vals, array='A'):
+    """Set the entries of an array in memory; the program declaring it has to be loaded already"""
+
+    for i, val in enumerate(vals):
+      memory[self.parser.PROGRAM_CELLS.index('{}.{}'.format(array, i))] = val
+
+  def runArray(self, cmds, memory, vals):
+    """Runs given code after declaring the array 'A' with the entries vals; returns a copy of memory including the entries"""
+
+    self.loadBfal('ARRAY A {}\n{}'.format(len(vals), cmds))
+    m = memory.copy()
+    self.setEntries(m, vals)
+
+    self.interpreter.init()
+    self.interpreter.memory = m.copy()
+    self.noInitRun()
+    return m
+
   def createStack(self, memory, vals):
     """Add stack to memory; values in order as given in vals"""
 
@@ -324,6 +342,7 @@ class TestOpcodes(TestCase):
     self.nonzerosTest(STZ_R)
 
   def test_opcodes_PUSH_V(self):
+    self.parser.staticStack = False
     @self.runNTimes(7)
     @self.withTestValues(lambda i: ([0,], [0, 10], [10,], [10, 0], [10, 20], [10, 20, 0], [10, 20, 0, 30])[i])
     def PUSH_V(memory, val):
@@ -339,6 +358,7 @@ class TestOpcodes(TestCase):
     self.nonzerosTest(PUSH_V)
 
   def test_opcodes_PUSH_R(self):
+    self.parser.staticStack = False
     @self.atTestRegisters(resetCount=True)
     @self.runNTimes(7)
     @self.withTestValues(lambda i: ([0,], [0, 10], [10,], [10, 0], [10, 20], [10, 20, 0], [10, 20, 0, 30])[i])
@@ -373,6 +393,124 @@ class TestOpcodes(TestCase):
     self.nonzerosTest(POP_R)
 
 
+  def test_opcodes_LOAD_RTV(self):
+    @self.atTestRegisters()
+    def LOAD_RTV(memory, reg):
+      vals = [5, 0, 255, 17]
+      for i, v in enumerate(vals):
+        m = self.runArray('LOAD {} A {}'.format(reg, i), memory, vals)
+        self.assertRegisterEqual(m, reg, val=v)
+
+    self.zerosTest(LOAD_RTV)
+    self.nonzerosTest(LOAD_RTV)
+
+  def test_opcodes_LOAD_RTR(self):
+    @self.atTestRegisters(nDim=2)
+    def LOAD_RTR(memory, reg0, reg1):
+      vals = [5, 0, 255, 17, 1]
+      for i, v in enumerate(vals):
+        m = memory.copy()
+        self.setCell(reg1, i, m)
+        m = self.runArray('LOAD {} A {}'.format(reg0, reg1), m, vals)
+        self.assertRegisterEqual(m, reg0, val=v)
+
+    self.zerosTest(LOAD_RTR)
+    self.nonzerosTest(LOAD_RTR)
+
+  def test_opcodes_STORE_TVV(self):
+    def STORE_TVV(memory):
+      vals = [5, 0, 255, 17]
+      for i in range(len(vals)):
+        m = self.runArray('STORE A {} 42'.format(i), memory, vals)
+        self.setEntries(m, vals[:i] + [42] + vals[i+1:])
+        self.assertRegisterEqual(m, 'RC', expr=lambda v: v)
+
+    self.zerosTest(STORE_TVV)
+    self.nonzerosTest(STORE_TVV)
+
+  def test_opcodes_STORE_TVR(self):
+    @self.atTestRegisters()
+    def STORE_TVR(memory, reg):
+      vals = [5, 0, 255, 17]
+      for i in range(len(vals)):
+        m = memory.copy()
+        self.setCell(reg, 42, m)
+        m = self.runArray('STORE A {} {}'.format(i, reg), m, vals)
+        self.setEntries(m, vals[:i] + [42] + vals[i+1:])
+        self.assertRegisterEqual(m, reg, val=42)
+
+    self.zerosTest(STORE_TVR)
+    self.nonzerosTest(STORE_TVR)
+
+  def test_opcodes_STORE_TRV(self):
+    @self.atTestRegisters()
+    def STORE_TRV(memory, reg):
+      vals = [5, 0, 255, 17, 1]
+      for i in range(len(vals)):
+        m = memory.copy()
+        self.setCell(reg, i, m)
+        m = self.runArray('STORE A {} 200'.format(reg), m, vals)
+        self.setEntries(m, vals[:i] + [200] + vals[i+1:])
+        self.assertRegisterEqual(m, reg, val=i)
+
+    self.zerosTest(STORE_TRV)
+    self.nonzerosTest(STORE_TRV)
+
+  def test_opcodes_STORE_TRR(self):
+    @self.atTestRegisters(nDim=2)
+    def STORE_TRR(memory, reg0, reg1):
+      vals = [5, 0, 255, 17, 1]
+      for i in range(len(vals)):
+        m = memory.copy()
+        self.setCell(reg1, 42, m)
+        self.setCell(reg0, i, m)
+        v = self.getCell(reg1, m)
+        m = self.runArray('STORE A {} {}'.format(reg0, reg1), m, vals)
+        self.setEntries(m, vals[:i] + [v] + vals[i+1:])
+        self.assertRegisterEqual(m, reg0, val=i)
+
+    self.zerosTest(STORE_TRR)
+    self.nonzerosTest(STORE_TRR)
+
+  def test_opcodes_FILL_TV(self):
+    def FILL_TV(memory):
+      m = self.runArray('FILL A 42', memory, [5, 0, 255])
+      self.setEntries(m, [42] * 3)
+      self.assertRegisterEqual(m, 'RC', expr=lambda v: v)
+
+    self.zerosTest(FILL_TV)
+    self.nonzerosTest(FILL_TV)
+
+  def test_opcodes_FILL_TR(self):
+    @self.atTestRegisters()
+    def FILL_TR(memory, reg):
+      m = memory.copy()
+      self.setCell(reg, 42, m)
+      m = self.runArray('FILL A {}'.format(reg), m, [5, 0, 255])
+      self.setEntries(m, [42] * 3)
+      self.assertRegisterEqual(m, reg, val=42)
+
+    self.zerosTest(FILL_TR)
+    self.nonzerosTest(FILL_TR)
+
+  def test_opcodes_CLEAR_T(self):
+    def CLEAR_T(memory):
+      m = self.runArray('CLR A', memory, [5, 0, 255])
+      self.setEntries(m, [0] * 3)
+      self.assertRegisterEqual(m, 'RC', expr=lambda v: v)
+
+    self.zerosTest(CLEAR_T)
+    self.nonzerosTest(CLEAR_T)
+
+  @patch('sys.stdout', new_callable=StringIO)
+  def test_opcodes_arrayErrors(self, mock_stdout):
+    with self.assertRaises(SystemExit): self.parser.compile('LOAD R0 A R1')
+    self.assertIn('Unknown array', mock_stdout.getvalue())
+
+    with self.assertRaises(SystemExit): self.parser.compile('ARRAY A 4\nSTORE A 4 R1')
+    self.assertIn('out of range', mock_stdout.getvalue())
+
+
   def test_opcodes_INC_R(self):
     @self.atTestRegisters()
     def INC_R(memory, reg):
@@ -601,6 +739,101 @@ class TestOpcodes(TestCase):
     self.zerosTest(DIV_RRR)
     self.nonzerosTest(DIV_RRR)
 
+  def test_opcodes_MOD_RVV(self):
+    @self.atTestRegisters(resetCount=True)
+    @self.runNTimes(4)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    def MOD_RVV(memory, reg, val0, val1):
+      self.runBfal('MOD {} {} {}'.format(reg, val0, val1), memory)
+      self.assertRegisterEqual(memory, reg, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(MOD_RVV)
+    self.nonzerosTest(MOD_RVV)
+
+  def test_opcodes_MOD_RRV(self):
+    @self.atTestRegisters(nDim=2, resetCount=True)
+    @self.runNTimes(4)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    def MOD_RRV(memory, reg0, reg1, val0, val1):
+      m = memory.copy()
+      self.setCell(reg1, val0, m)
+      self.runBfal('MOD {} {} {}'.format(reg0, reg1, val1), m)
+      self.assertRegisterEqual(m, reg0, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(MOD_RRV)
+    self.nonzerosTest(MOD_RRV)
+
+  def test_opcodes_MOD_RRR(self):
+    @self.atTestRegisters(nDim=3, nRegs=3, resetCount=True)
+    @self.runNTimes(4)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    @self.skipEqualRegisters(0, 2)
+    def MOD_RRR(memory, reg0, reg1, reg2, val0, val1):
+      if reg1 == reg2: val1 = val0
+      m = memory.copy()
+      self.setCell(reg1, val0, m)
+      self.setCell(reg2, val1, m)
+      self.runBfal('MOD {} {} {}'.format(reg0, reg1, reg2), m)
+      self.assertRegisterEqual(m, reg0, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(MOD_RRR)
+    self.nonzerosTest(MOD_RRR)
+
+
+  def test_opcodes_DIVMOD_RRVV(self):
+    @self.atTestRegisters(nDim=2, resetCount=True)
+    @self.runNTimes(4)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    @self.skipEqualRegisters()
+    def DIVMOD_RRVV(memory, reg0, reg1, val0, val1):
+      m = memory.copy()
+      self.runBfal('DIVMOD {} {} {} {}'.format(reg0, reg1, val0, val1), m)
+
+      self.setCell(reg0, val0//val1 if val1 else 0, m)
+      self.assertRegisterEqual(m, reg1, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(DIVMOD_RRVV)
+    self.nonzerosTest(DIVMOD_RRVV)
+
+  def test_opcodes_DIVMOD_RRRV(self):
+    @self.atTestRegisters(nDim=3, nRegs=3, resetCount=True)
+    @self.runNTimes(4)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    @self.skipEqualRegisters(0, 1)
+    def DIVMOD_RRRV(memory, reg0, reg1, reg2, val0, val1):
+      m = memory.copy()
+      self.setCell(reg2, val0, m)
+      self.runBfal('DIVMOD {} {} {} {}'.format(reg0, reg1, reg2, val1), m)
+
+      self.setCell(reg0, val0//val1 if val1 else 0, m)
+      self.assertRegisterEqual(m, reg1, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(DIVMOD_RRRV)
+    self.nonzerosTest(DIVMOD_RRRV)
+
+  def test_opcodes_DIVMOD_RRRR(self):
+    @self.atTestRegisters(nDim=4, nRegs=4, resetCount=True)
+    @self.runNTimes(2)
+    @self.withTestValues(lambda i: 10*i+3 if i%2 else 0, lambda j: 10*(j//2))
+    @self.skipEqualRegisters(0, 1)
+    def DIVMOD_RRRR(memory, reg0, reg1, reg2, reg3, val0, val1):
+      if reg2 == reg3: val1 = val0
+      m = memory.copy()
+      self.setCell(reg2, val0, m)
+      self.setCell(reg3, val1, m)
+      self.runBfal('DIVMOD {} {} {} {}'.format(reg0, reg1, reg2, reg3), m)
+
+      self.setCell(reg0, val0//val1 if val1 else 0, m)
+      self.assertRegisterEqual(m, reg1, val= val0%val1 if val1 else val0)
+
+    self.zerosTest(DIVMOD_RRRR)
+    self.nonzerosTest(DIVMOD_RRRR)
+
+  @patch('sys.stdout', new_callable=StringIO)
+  def test_opcodes_DIVMOD_sameDestinations(self, mock_stdout):
+    with self.assertRaises(SystemExit): self.parser.compile('DIVMOD R0 R0 R1 3')
+    self.assertIn('different registers', mock_stdout.getvalue())
+
 
   def test_opcodes_TRUE(self):
     @self.runNTimes(2)
@@ -1036,6 +1269,19 @@ class TestOpcodes(TestCase):
   def test_opcodes_END_IF(self): pass
 
 
+  @patch('sys.stdout', new_callable=StringIO)
+  def test_opcodes_ARRAY_TV(self, mock_stdout):
+    self.parser.compile('ARRAY A 4\nARRAY B 2\nARRAY A 4')
+    self.assertEqual(self.parser.ARRAYS, {'A': 4, 'B': 2})
+
+    cells = self.parser.PROGRAM_CELLS
+    self.assertLess(cells.index('B.1'), cells.index('STACK'))
+    self.assertEqual(cells.index('A.1') - cells.index('A.0'), 3)
+
+    for bfal in ('ARRAY A 0', 'ARRAY A 257', 'ARRAY A 4\nARRAY A 5', 'ARRAY STACK 2'):
+      with self.assertRaises(SystemExit): self.parser.compile(bfal)
+      self.assertIn('Invalid declaration', mock_stdout.getvalue())
+
   def test_opcodes_ALIAS_TV(self):
     self.parser.compile('ALIAS FOO 42')
     self.assertIn('FOO', self.parser.ALIASES)
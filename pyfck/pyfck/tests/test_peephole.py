@@ -0,0 +1,68 @@
+"""
+Tests for the peephole optimiser of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import unittest
+
+from ..bfalParser import peephole
+
+
+class TestPeephole(unittest.TestCase):
+  def test_peephole_moves(self):
+    self.assertEqual(peephole.optimise('>>><<+<>'), '>+')
+    self.assertEqual(peephole.optimise('><+<<'), '+<<')
+
+  def test_peephole_moves_acrossLines(self):
+    self.assertEqual(peephole.optimise('+>>\n<<<-'), '+<\n-')
+    self.assertEqual(peephole.optimise('+>\n<\n-'), '')
+
+  def test_peephole_increments(self):
+    self.assertEqual(peephole.optimise('+++--.-+'), '+.')
+    self.assertEqual(peephole.optimise('+>+\n-<'), '+\n')
+
+  def test_peephole_clears(self):
+    self.assertEqual(peephole.optimise('+++[-]'), '[-]')
+    self.assertEqual(peephole.optimise('[-]\n[-][-]+'), '[-]\n+')
+    self.assertEqual(peephole.optimise('[->+<][-]'), '[->+<]')
+    self.assertEqual(peephole.optimise('[-]>[-]<[-]'), '[-]>[-]<[-]')
+    self.assertEqual(peephole.optimise('[-]><[-]'), '[-]')
+
+  def test_peephole_deadLoops(self):
+    self.assertEqual(peephole.optimise('[-][>[-]<]+'), '[-]+')
+    self.assertEqual(peephole.optimise('[<]\n[>+[<]]>'), '[<]\n>')
+    self.assertEqual(peephole.optimise('+[]'), '+[]')
+
+  def test_peephole_keepsIO(self):
+    self.assertEqual(peephole.optimise('[-].,[-]'), '[-].,[-]')
+    self.assertEqual(peephole.optimise('[-].[-]'), '[-].')
+
+  def test_peephole_dropsEmptyLines(self):
+    self.assertEqual(peephole.optimise('+\n\n>\n<\n'), '+\n')
+
+  def test_peephole_flush(self):
+    for bf in ('+>>\n<<<-', '+>\n<\n-', '[-]\n[-][>]+\n.', '+\n\n>\n<\n', '[->+<]\n\n[-]>>\n<'):
+      p = peephole.Peephole()
+      chunks = []
+      for token in peephole._TOKENS.findall(bf):
+        p.feed(token)
+        chunks.append(p.flush(3))
+
+      self.assertEqual(''.join(chunks) + p.getBf(), peephole.optimise(bf))
+
+  def test_peephole_join(self):
+    codes = ('+>>\n<<<-[-]>+\n[->+<]<<\n>>[-]+', '[-]\n[-][>]+\n.[<]\n>>+[-]\n<<-[>+<]\n', '+[>[-]<]\n[-]\n[>]\n>+[-]<[-]', '[-]>[<[-]]>[-]]\n+\n')
+    for bf in codes:
+      tokens = peephole._TOKENS.findall(bf)
+      for cuts in ((), (3,), (1, 5), (2, 4, 7), tuple(range(1, len(tokens)))):
+        pieces = [''.join(tokens[a:b]) for a, b in zip((0,) + cuts, cuts + (len(tokens),))]
+        self.assertEqual(peephole.join([(piece,) + peephole.optimisePart(piece) for piece in pieces]), peephole.optimise(bf), msg=(bf, cuts))
+
+  def test_peephole_optimisePart(self):
+    bf = '+[-]>[-<+>]\n<[>]'
+    optimised, skip, syncs = peephole.optimisePart(bf)
+    self.assertEqual((optimised, skip), (peephole.optimise(bf), 0))
+    self.assertEqual(syncs, [(4, 3), (11, 10), (16, 15)])
+    self.assertEqual(peephole.optimisePart(bf, syncs=1)[2], [(4, 3)])
+    self.assertEqual(peephole.optimisePart('[-][>[')[1], 2)
@@ -0,0 +1,120 @@
+"""
+Tests for the preprocessor (macros and included files) of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ..bfalParser import Parser, preprocessor, tokenizer
+from ..bfalParser.errors import *
+from ..bfInterpreter import Interpreter
+
+
+SWAP = 'MACRO SWAP A B\n  PUSH A\n  SET A B\n  POP B\nENDMACRO\n'
+
+
+class TestPreprocessor(unittest.TestCase):
+  def expand(self, bfal, **kwargs):
+    pp = preprocessor.Preprocessor(**kwargs)
+    return pp.expand(bfal.split('\n'), tokenizer.tokenize(bfal))
+
+  def runBfal(self, parser, bfal):
+    interpreter = Interpreter()
+    interpreter.load(parser.compile(bfal))
+    interpreter.run()
+    return interpreter
+
+
+  def test_preprocessor_substitute(self):
+    self.assertEqual(preprocessor.substitute('ADD a b 5 // a b', {'A': 'R0', 'B': '"b"'}), 'ADD R0 "b" 5 // a b')
+    self.assertEqual(preprocessor.substitute('PRT "a" A', {'A': 'R0'}), 'PRT "a" R0')
+    self.assertEqual(preprocessor.arguments('SWAP r0  "x y"'), ['r0', '"x y"'])
+
+  def test_preprocessor_expand(self):
+    lines, calls = self.expand(SWAP + 'SET R0 1\nswap R0 R1\nSWAP R2 "x"')
+    self.assertEqual(lines, ['SET R0 1', '  PUSH R0', '  SET R0 R1', '  POP R1', '  PUSH R2', '  SET R2 "x"', '  POP "x"'])
+    self.assertEqual(calls, [(1, 4, ('SWAP', ('R0', 'R1'))), (4, 7, ('SWAP', ('R2', '"x"')))])
+
+  def test_preprocessor_expand_nested(self):
+    lines, calls = self.expand(SWAP + 'MACRO ROT A B C\nSWAP A B\nSWAP B C\nENDMACRO\nROT R0 R1 R2')
+    self.assertEqual(len(lines), 6)
+    self.assertEqual(calls, [(0, 3, ('SWAP', ('R0', 'R1'))), (3, 6, ('SWAP', ('R1', 'R2'))), (0, 6, ('ROT', ('R0', 'R1', 'R2')))])
+
+  def test_preprocessor_errors(self):
+    for bfal, error in (('MACRO F A\nINC A', AssemblySyntaxError), ('ENDMACRO', AssemblySyntaxError),
+                        ('MACRO F\nMACRO G\nENDMACRO', AssemblySyntaxError), ('MACRO F A A\nENDMACRO', AssemblyNameError),
+                        ('MACRO F\nENDMACRO\nMACRO F\nENDMACRO', AssemblyNameError), ('MACRO SET\nENDMACRO', AssemblyNameError),
+                        ('MACRO F A\nINC A\nENDMACRO\nF R0 R1', AssemblyTypeError), ('MACRO F\nF\nENDMACRO\nF', AssemblyValueError),
+                        ('INCLUDE foo', AssemblySyntaxError), ('INCLUDE "/nonexistent/foo.bfal"', AssemblyNameError)):
+      with self.assertRaises(error, msg=bfal):
+        self.expand(bfal, reserved={'SET'})
+
+  def test_preprocessor_compile(self):
+    parser = Parser()
+    interpreter = self.runBfal(parser, SWAP + 'SET R0 3\nSET R1 4\nSWAP R0 R1\nSWAP R1 R2')
+    self.assertEqual([interpreter.memory[parser.PROGRAM_CELLS.index(r)] for r in ('R0', 'R1', 'R2')], [4, 0, 3])
+
+  def test_preprocessor_compile_include(self):
+    with tempfile.TemporaryDirectory() as directory:
+      os.mkdir(os.path.join(directory, 'lib'))
+      with open(os.path.join(directory, 'lib', 'swap.bfal'), 'w') as f: f.write(SWAP)
+      with open(os.path.join(directory, 'lib', 'all.bfal'), 'w') as f: f.write('INCLUDE "swap.bfal"\nINC R0')
+      with open(os.path.join(directory, 'main.bfal'), 'w') as f: f.write('INCLUDE "lib/all.bfal"\nINCLUDE "lib/swap.bfal"\nINCLUDE "lib/all.bfal"\nSWAP R0 R1')
+
+      parser = Parser()
+      parser.sourcePath = os.path.join(directory, 'main.bfal')
+      with patch('builtins.open', wraps=open) as opened:
+        interpreter = self.runBfal(parser, 'INCLUDE "main.bfal"')
+
+      self.assertEqual(opened.call_count, 3)           # every file is read once
+      self.assertEqual([interpreter.memory[parser.PROGRAM_CELLS.index(r)] for r in ('R0', 'R1')], [0, 1])
+
+  def test_preprocessor_compile_include_cached(self):
+    with tempfile.TemporaryDirectory() as directory:
+      with open(os.path.join(directory, 'lib.bfal'), 'w') as f: f.write(SWAP + 'SET R0 3\nADD R1 R0 4\nSWAP R0 R1\nMUL R2 R0 R1')
+
+      parser = Parser()
+      parser.sourcePath = os.path.join(directory, 'main.bfal')
+      with patch.object(parser, 'compileLine', wraps=parser.compileLine) as compileLine:
+        first = parser.compile('INCLUDE "lib.bfal"\nOUT R2')
+        compiled = compileLine.call_count
+        second = parser.compile('INCLUDE "lib.bfal"\nOUT R2\nOUT R2')
+
+      self.assertEqual(compiled, 7)
+      self.assertEqual(compileLine.call_count - compiled, 2)          # the included lines are compiled once
+      fresh = Parser()
+      fresh.sourcePath = parser.sourcePath
+      self.assertEqual([first, second], [fresh.compile('INCLUDE "lib.bfal"\nOUT R2'), fresh.compile('INCLUDE "lib.bfal"\nOUT R2\nOUT R2')])
+
+      parser.compile('ARRAY A 4\nINCLUDE "lib.bfal"\nOUT R2')       # the layout changes, so the included lines are compiled again
+      with patch.object(parser, 'compileLine', wraps=parser.compileLine) as compileLine: parser.compile('INCLUDE "lib.bfal"\nOUT R2')
+      self.assertEqual(compileLine.call_count, 7)
+
+      parser.cellBits = fresh.cellBits = 16                            # so do the options
+      with patch.object(parser, 'compileLine', wraps=parser.compileLine) as compileLine: bf = parser.compile('INCLUDE "lib.bfal"\nOUT R2')
+      self.assertEqual(compileLine.call_count, 7)
+      self.assertEqual(bf, fresh.compile('INCLUDE "lib.bfal"\nOUT R2'))
+
+  def test_preprocessor_compile_memoized(self):
+    bfal = SWAP + '\n'.join(['INP R0', 'SWAP R0 R1', 'OUT R1'] * 20)
+    parser = Parser()
+    with patch.object(parser, 'compileLine', wraps=parser.compileLine) as compileLine:
+      bf = parser.compile(bfal)
+
+    self.assertEqual(bf, Parser().compile('\n'.join(parser.preprocess(bfal))))
+    self.assertLessEqual(compileLine.call_count, 20 * 2 + len(parser.EXPANSIONS) * 3)     # each call is compiled once per entry state
+    self.assertLessEqual(len(parser.EXPANSIONS), 2)
+
+  def test_preprocessor_stream(self):
+    bfal = SWAP + 'SET R0 1\nswap R0 R1\nSWAP R2 "x"'
+    pairs = list(preprocessor.Preprocessor().stream(line + '\n' for line in bfal.split('\n')))
+    self.assertEqual([l for lines, calls in pairs for l in lines], self.expand(bfal)[0])
+    self.assertEqual([calls for lines, calls in pairs], [[], [(0, 3, ('SWAP', ('R0', 'R1')))], [(0, 3, ('SWAP', ('R2', '"x"')))]])
+
+    for bfal in ('MACRO F A\nINC A', 'MACRO F\nMACRO G\nENDMACRO'):
+      with self.assertRaises(AssemblySyntaxError, msg=bfal):
+        list(preprocessor.Preprocessor().stream(bfal.split('\n')))
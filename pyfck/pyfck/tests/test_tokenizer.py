@@ -0,0 +1,43 @@
+"""
+Tests for the tokenizer of the bfalParser module
+
+Marius Lambacher, 2018
+"""
+
+import unittest
+
+from ..bfalParser import Parser, tokenizer
+
+
+class TestTokenizer(unittest.TestCase):
+  def test_tokenizer_tokenize_basic(self):
+    lines = tokenizer.tokenize('set r0 5 // five\n\n  // comment\nPRT "Hello World\t!""x" y\nA/B')
+    self.assertEqual(lines, [['SET', 'R0', '5'], [], [], ['PRT', 'Hello World\t!', 'x', 'Y'], ['A/B']])
+
+  def test_tokenizer_tokenize_quotes(self):
+    self.assertEqual(tokenizer.tokenize('PRT "a // b" // c'), [['PRT', 'a // b']])
+    self.assertEqual(tokenizer.tokenize('PRT "" x'), [['PRT', 'X']])
+    self.assertEqual(tokenizer.tokenize('PRT "a\nOUT R0 // "'), [None, ['OUT', 'R0']])
+
+  def test_tokenizer_tokenize_sharesLines(self):
+    lines = tokenizer.tokenize('INC R0\nOUT R0\ninc R0\nINC R0')
+    self.assertIs(lines[0], lines[3])
+    self.assertIs(lines[0][0], lines[2][0])
+
+  def test_tokenizer_literal(self):
+    for token, value in (('5', '5'), ('-3', '-3'), ('+7', '7'), ('0X1F', '31'), ('0b101', '5'), ('0O17', '15'), ('1_000', '1000'), ('0B0B1', '1')):
+      self.assertEqual(tokenizer.literal(token), value)
+
+    for token in ('R0', 'FOO', '0B2', '0x', '5A', '-', '_1', 'Hello World'):
+      self.assertIsNone(tokenizer.literal(token))
+
+  def test_tokenizer_parseCommand_cached(self):
+    parser = Parser()
+    self.assertEqual(parser.parseCommand('SET R0 5')[2:], ('RV', ['R0', '5', None]))
+    self.assertIn('SET R0 5', parser.PARSED)
+
+    parser.ALIASES = {'X': 'R1'}
+    self.assertEqual(parser.parseCommand('SET R0 X')[2:], ('RR', ['R0', 'R1', None]))
+    parser.ALIASES = {'X': '7'}
+    self.assertEqual(parser.parseCommand('SET R0 X')[2:], ('RV', ['R0', '7', None]))
+    self.assertEqual(parser.parseCommand('SET R0 5')[2:], ('RV', ['R0', '5', None]))
@@ -13,7 +13,9 @@ setup(
     author_email     = 'bfaltools@lmbchr.de',
     url              = "",
     packages         = find_packages(exclude=('tests', 'docs')),
+    python_requires  = '>=3.7', #module __getattr__ (PEP 562) in pyfck/__init__.py
     install_requires = [], #external packages as dependencies
+    entry_points     = {'console_scripts': ['pyfck = pyfck.cli:main']},
     test_suite       = 'nose.collector',
     tests_require    = ['nose'],
 )
\ No newline at end of file